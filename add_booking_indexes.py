@@ -0,0 +1,39 @@
+"""
+Migration script to add the booking indexes used by the admin statistics
+queries to an existing database. db.create_all() only creates indexes for
+tables it creates itself.
+"""
+import sqlite3
+import os
+
+INDEXES = {
+    'ix_booking_parking_window': 'booking (parking_timestamp, leaving_timestamp, total_cost)',
+}
+
+def migrate_booking_indexes():
+    """Create any missing booking indexes"""
+    db_path = "instance/parking.db"
+    
+    if not os.path.exists(db_path):
+        print("Database not found!")
+        return
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        for name, definition in INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+            print(f"Ensured index {name}")
+        
+        conn.commit()
+        print("Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_booking_indexes()
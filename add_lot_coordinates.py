@@ -0,0 +1,41 @@
+"""
+Migration script to add the latitude/longitude columns to the parking_lot
+table. Existing lots keep NULL and don't show up in nearest-lot searches
+until an admin sets their location.
+"""
+import sqlite3
+import os
+
+def migrate_parking_lot_table():
+    """Add coordinate columns to parking_lot table"""
+    db_path = "instance/parking.db"
+    
+    if not os.path.exists(db_path):
+        print("Database not found!")
+        return
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("PRAGMA table_info(parking_lot)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        for column in ('latitude', 'longitude'):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE parking_lot ADD COLUMN {column} FLOAT")
+                print(f"Added {column} column")
+            else:
+                print(f"{column} column already exists.")
+        
+        conn.commit()
+        print("Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_parking_lot_table()
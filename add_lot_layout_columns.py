@@ -0,0 +1,40 @@
+"""
+Migration script to add the num_rows/num_cols layout columns to the
+parking_lot table. Existing lots keep NULL and are allocated by spot number.
+"""
+import sqlite3
+import os
+
+def migrate_parking_lot_table():
+    """Add layout columns to parking_lot table"""
+    db_path = "instance/parking.db"
+    
+    if not os.path.exists(db_path):
+        print("Database not found!")
+        return
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("PRAGMA table_info(parking_lot)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        for column in ('num_rows', 'num_cols'):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE parking_lot ADD COLUMN {column} INTEGER")
+                print(f"Added {column} column")
+            else:
+                print(f"{column} column already exists.")
+        
+        conn.commit()
+        print("Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_parking_lot_table()
@@ -5,7 +5,8 @@ import os
 from datetime import datetime, timedelta, timezone
 
 # Import extensions from the extensions file
-from extensions import db, login_manager
+from extensions import db, login_manager, spot_allocator, availability_feed, availability_counters, identity_cache, lot_locator, sql_profiler, metrics
+from services.sqlite_profile import configure_sqlite, install_pragmas, sqlite_pragmas
 # Import Admin model to avoid NameError in logout route
 from models.admin import Admin
 
@@ -37,8 +38,19 @@ def create_app():
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)  # Sessions expire after 30 minutes of inactivity
     
     # Initialize plugins
+    configure_sqlite(app)
     db.init_app(app)
+    with app.app_context():
+        # Pragmas for every new SQLite connection (WAL, busy timeout, caches)
+        install_pragmas(db.engine, sqlite_pragmas(app.config))
     login_manager.init_app(app)
+    spot_allocator.init_app(app)
+    availability_feed.init_app(app)
+    availability_counters.init_app(app)
+    identity_cache.init_app(app)
+    lot_locator.init_app(app)
+    sql_profiler.init_app(app)
+    metrics.init_app(app)
     login_manager.login_view = 'user.login'  # Set login view for redirect to user login by default
     login_manager.login_message = "Please log in to access this page."
     login_manager.login_message_category = "info"
@@ -91,70 +103,13 @@ def create_app():
     
     app.register_blueprint(auth_bp)
     
-    # Create database tables and seed data within app context
-    with app.app_context():
-        # Import models here to avoid circular imports
-        from models.admin import Admin
-        from models.user import User
-        from models.parking_lot import ParkingLot
-        from models.parking_spot import ParkingSpot
-        from models.booking import Booking
-        
-        db.create_all()
-        
-        # Create admin user if not exists
-        admin = Admin.query.filter_by(username='admin').first()
-        if not admin:
-            admin = Admin(username='admin', password='admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin user created successfully")
-        
-        # Create test user if not exists (for development)
-        test_user = User.query.filter_by(username='user').first()
-        if not test_user:
-            test_user = User(
-                username='user',
-                email='user@example.com',
-                password='user123',
-                first_name='Test',
-                last_name='User',
-                phone='1234567890'
-            )
-            db.session.add(test_user)
-            db.session.commit()
-            print("Test user created successfully")
-        
-        # Create sample parking lot if not exists (for development)
-        if not ParkingLot.query.first():
-            # Create a sample parking lot
-            parking_lot = ParkingLot(
-                name='Main Street Parking',
-                address='123 Main Street',
-                pin_code='10001',
-                price=2.50,  # Using price parameter which will set hourly_rate internally
-                total_spots=10,
-                available_spots=10
-            )
-            db.session.add(parking_lot)
-            db.session.commit()
-            
-            # Create sample parking spots
-            for i in range(1, 11):
-                spot_type = 'standard'
-                if i == 1:
-                    spot_type = 'disabled'
-                elif i == 2:
-                    spot_type = 'electric'
-                
-                spot = ParkingSpot(
-                    lot_id=parking_lot.id,
-                    spot_number=i,
-                    spot_type=spot_type
-                )
-                db.session.add(spot)
-            db.session.commit()
-            print("Sample parking lot and spots created successfully")
+    # Register CLI commands (flask init-db, flask seed, flask backfill-user-stats, ...)
+    from commands import register_commands
+    register_commands(app)
+    
+    # No database I/O here: every worker runs this on boot. The schema, search
+    # index, counters and seed data are set up by `flask init-db` / `flask seed`;
+    # the spot allocator and counters load lazily on first use.
     
     # Route redirecting to appropriate dashboard based on user type
     @app.route('/')
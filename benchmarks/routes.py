@@ -0,0 +1,483 @@
+"""
+Route benchmark: latency, queries and memory of every user and admin route.
+
+A synthetic dataset (lots, spots, users with vehicles, booking history and
+currently parked cars) is generated once per size and seed and cached under
+``benchmarks/.data``. Every route then runs in its own process through the
+Flask test client against a copy of it, so the peak RSS reported for a
+route is that route's alone. Queries and database time per request come
+from the SQL profiler's ``Server-Timing`` header.
+
+    python benchmarks/routes.py                       # small dataset, all routes
+    python benchmarks/routes.py --size large --iterations 10 --json bench_routes.json
+    python benchmarks/routes.py --routes book_parking,release --baseline bench_routes.json
+
+With ``--baseline`` a route whose p95 latency grew by more than
+``--tolerance`` (and at least ``--min-delta-ms``), or that runs more queries
+than before, is reported as a regression and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', '.data')
+sys.path.insert(0, PROJECT_ROOT)
+from services.synthetic_data import PRESETS as SIZES  # noqa: E402
+
+BENCH_PASSWORD = 'bench123'
+# Generated user the benchmark logs in as, with their first vehicle
+BENCH_USER = 'user1'
+
+SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+# -- dataset -------------------------------------------------------------
+
+def dataset_path(size, seed):
+    """Cached dataset file for a size and seed at the current schema revision."""
+    sys.path.insert(0, PROJECT_ROOT)
+    from alembic.script import ScriptDirectory
+    from services.schema import alembic_config
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    return os.path.join(DATA_DIR, f'{size}-seed{seed}-rev{head}.db')
+
+
+def build_dataset(path, size, seed):
+    """Create the schema in ``path`` and fill it with the ``size`` preset of the synthetic data generator.
+
+    Runs in its own process: the app reads ``DATABASE_URL`` when it is imported.
+    """
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    sys.path.insert(0, PROJECT_ROOT)
+    from app import create_app
+    from services.synthetic_data import PRESETS, generate_dataset
+
+    app = create_app()
+    # Schema only: the admin account is created on its first login
+    app.test_cli_runner().invoke(args=['init-db'])
+    with app.app_context():
+        generate_dataset(seed=seed, password=BENCH_PASSWORD, **PRESETS[size])
+
+
+# -- routes --------------------------------------------------------------
+
+class Route:
+    """One request to time. ``path``/``data``/``json`` may be callables of ``(ctx, state)``;
+    ``before(ctx, i)`` runs untimed before each request and returns ``state``. Any status
+    outside ``expect`` (default 200 for GET, a redirect for form POSTs) fails the route."""
+
+    def __init__(self, endpoint, method, path, login=None, label=None, data=None, json=None,
+                 before=None, stream=False, expect=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.login = login
+        self.label = label or f'{endpoint} {method}'
+        self.data = data
+        self.json = json
+        self.before = before
+        self.stream = stream
+        self.expect = set(expect or ((200,) if method == 'GET' else (302,)))
+
+
+def _value(value, ctx, state):
+    return value(ctx, state) if callable(value) else value
+
+
+class Context:
+    """Ids and logged in clients for the routes, looked up once per process."""
+
+    def __init__(self, app):
+        from extensions import db
+        from models.user import User
+        from models.vehicle import Vehicle
+        from models.booking import Booking
+        from models.parking_spot import ParkingSpot
+        from models.parking_lot import ParkingLot
+
+        self.app = app
+        with app.app_context():
+            self.user_id = db.session.query(User.id).filter_by(username=BENCH_USER).scalar()
+            vehicle = db.session.query(Vehicle.id, Vehicle.model, Vehicle.license_plate, Vehicle.vehicle_type).filter_by(
+                user_id=self.user_id).order_by(Vehicle.id).first()
+            self.vehicle_id, self.vehicle_model, self.license_plate, self.vehicle_type = vehicle
+            self.lot_id = db.session.query(db.func.min(ParkingLot.id)).scalar()
+            self.last_lot_id = db.session.query(db.func.max(ParkingLot.id)).scalar()
+            self.occupied_spot_id = db.session.query(Booking.parking_spot_id).filter_by(
+                booking_status='active').order_by(Booking.id).limit(1).scalar()
+        self.clients = {}
+
+    def client(self, login):
+        """A test client logged in as ``'user'`` or ``'admin'`` (or anonymous), one per role."""
+        if login not in self.clients:
+            client = self.app.test_client()
+            if login == 'user':
+                client.post('/user/login', data={'email': BENCH_USER, 'password': BENCH_PASSWORD})
+            elif login == 'admin':
+                client.post('/admin/login', data={'username': 'admin', 'password': 'admin123'})
+            self.clients[login] = client
+        return self.clients[login]
+
+    def query(self, fn):
+        with self.app.app_context():
+            return fn()
+
+    def free_spot(self, lot_id=None, spot_type=None):
+        from models.parking_spot import ParkingSpot
+
+        def run():
+            query = ParkingSpot.query.filter_by(parking_lot_id=lot_id or self.lot_id, is_available=True)
+            if spot_type:
+                query = query.filter_by(spot_type=spot_type)
+            return query.order_by(ParkingSpot.spot_number).first().id
+        return self.query(run)
+
+    def insert(self, table_model, **values):
+        from extensions import db
+
+        def run():
+            row_id = db.session.execute(table_model.__table__.insert().values(**values)).inserted_primary_key[0]
+            db.session.commit()
+            return row_id
+        return self.query(run)
+
+
+def _release(ctx, i=None):
+    ctx.client('user').post('/user/release_parking')
+
+
+def _book(ctx, i=None):
+    _release(ctx)
+    spot_id = ctx.free_spot(spot_type=ctx.vehicle_type)
+    ctx.client('user').post('/user/book_parking', data={
+        'spot_id': spot_id, 'vehicle_id': ctx.vehicle_id, 'parking_lot_id': ctx.lot_id})
+
+
+def _book_target(ctx, i):
+    _release(ctx)
+    return {'spot_id': ctx.free_spot(spot_type=ctx.vehicle_type)}
+
+
+def _new_vehicle(ctx, i):
+    from models.vehicle import Vehicle
+    return {'vehicle_id': ctx.insert(Vehicle, user_id=ctx.user_id, model='Spare', license_plate=f'X{os.getpid()}-{i}',
+                                     vehicle_type='standard', color='Red')}
+
+
+def _new_user(ctx, i):
+    from models.user import User
+    return {'user_id': ctx.insert(User, username=f'gone{os.getpid()}-{i}', email=f'gone{os.getpid()}-{i}@example.com',
+                                  password_hash='x')}
+
+
+def _occupy_target(ctx, i):
+    return {'spot_id': ctx.free_spot(ctx.last_lot_id)}
+
+
+def _release_target(ctx, i):
+    spot_id = ctx.free_spot(ctx.last_lot_id)
+    ctx.client('admin').post('/admin/mark_spot_occupied', data={'spot_id': spot_id, 'vehicle_reg': 'BENCH'})
+    return {'spot_id': spot_id}
+
+
+def _login_again(role):
+    def before(ctx, i):
+        ctx.clients.pop(role, None)
+        ctx.client(role)
+    return before
+
+
+def _lot_form(ctx, state):
+    return {
+        'name': 'Bench Lot', 'location': 'Bench', 'address': '1 Bench Road', 'pin_code': '10001',
+        'total_spots': 100, 'hourly_rate': '2.50', 'opening_time': '06:00', 'closing_time': '23:00',
+        'num_rows': 5, 'num_cols': 20
+    }
+
+
+def _import_csv(ctx, state):
+    import io
+    return {'file': (io.BytesIO(b'name,address,pin_code,price,total_spots,electric_spots\n'
+                                b'Imported,2 Bench Road,10002,3.0,100,1-10\n'), 'lots.csv')}
+
+
+ROUTES = [
+    # user blueprint
+    Route('user.login', 'GET', '/user/login'),
+    Route('user.login', 'POST', '/user/login', data={'email': BENCH_USER, 'password': BENCH_PASSWORD}),
+    Route('user.register', 'GET', '/user/register'),
+    Route('user.register', 'POST', '/user/register', data=lambda ctx, state: {
+        'first_name': 'New', 'last_name': 'User', 'email': f'new{state}@example.com', 'phone': '555',
+        'username': f'new{state}', 'password': 'pw', 'confirm_password': 'pw', 'terms': 'y'},
+        before=lambda ctx, i: f'{os.getpid()}-{i}'),
+    Route('user.logout', 'GET', '/user/logout', login='user', before=_login_again('user'), expect=[302]),
+    Route('user.dashboard', 'GET', '/user/dashboard', login='user'),
+    Route('user.vehicles', 'GET', '/user/vehicles', login='user'),
+    Route('user.vehicles', 'POST', '/user/vehicles', login='user', before=lambda ctx, i: f'{os.getpid()}-{i}',
+          data=lambda ctx, state: {'model': 'Added', 'license_plate': f'A{state}', 'vehicle_type': 'standard', 'color': 'Blue'}),
+    # templates/user/edit_vehicle.html does not exist, so the form always renders a 500
+    Route('user.edit_vehicle', 'GET', lambda ctx, state: f'/user/edit_vehicle/{ctx.vehicle_id}', login='user',
+          expect=[500]),
+    Route('user.edit_vehicle', 'POST', lambda ctx, state: f'/user/edit_vehicle/{ctx.vehicle_id}', login='user',
+          data=lambda ctx, state: {'model': ctx.vehicle_model, 'license_plate': ctx.license_plate,
+                                   'vehicle_type': ctx.vehicle_type, 'color': 'Grey'}),
+    Route('user.delete_vehicle', 'POST', lambda ctx, state: f'/user/delete_vehicle/{state["vehicle_id"]}',
+          login='user', before=_new_vehicle),
+    Route('user.book_parking', 'GET', '/user/book_parking', login='user', before=_release),
+    Route('user.book_parking', 'POST', '/user/book_parking', login='user', label='user.book_parking POST find',
+          before=_release, data=lambda ctx, state: {'parking_lot_id': ctx.lot_id, 'vehicle_id': ctx.vehicle_id,
+                                                    'duration': '2', 'entry_time': 'now'},
+          expect=[200]),
+    Route('user.book_parking', 'POST', '/user/book_parking', login='user', label='user.book_parking POST confirm',
+          before=_book_target, data=lambda ctx, state: {'spot_id': state['spot_id'], 'vehicle_id': ctx.vehicle_id,
+                                                        'parking_lot_id': ctx.lot_id}),
+    Route('user.release_parking', 'GET', '/user/release_parking', login='user', before=_book),
+    Route('user.release_parking', 'POST', '/user/release_parking', login='user', before=_book),
+    Route('user.history', 'GET', '/user/history', login='user'),
+    Route('user.summary', 'GET', '/user/summary', login='user'),
+    Route('user.parking_stats', 'GET', '/user/api/parking_stats', login='user'),
+    Route('user.api_history', 'GET', '/user/api/history', login='user'),
+    Route('user.search_parking', 'GET', '/user/search_parking?search=central&search_type=area', login='user'),
+    Route('user.search_parking', 'GET', '/user/search_parking?near=40.7,-74.0&k=10&format=json', login='user',
+          label='user.search_parking GET near'),
+    Route('user.availability_stream', 'GET', '/user/api/availability_stream', login='user', stream=True),
+    # admin blueprint
+    Route('admin.login', 'GET', '/admin/login'),
+    Route('admin.login', 'POST', '/admin/login', data={'username': 'admin', 'password': 'admin123'}),
+    Route('admin.logout', 'GET', '/admin/logout', login='admin', before=_login_again('admin'), expect=[302]),
+    Route('admin.dashboard', 'GET', '/admin/dashboard', login='admin'),
+    Route('admin.statistics', 'GET', '/admin/statistics', login='admin'),
+    Route('admin.view_parking_spots', 'GET', '/admin/view_parking_spots', login='admin'),
+    Route('admin.view_user', 'GET', '/admin/view_user', login='admin'),
+    Route('admin.add_parking_lot', 'GET', '/admin/add_parking_lot', login='admin'),
+    Route('admin.add_parking_lot', 'POST', '/admin/add_parking_lot', login='admin', data=_lot_form),
+    Route('admin.import_parking_lots', 'POST', '/admin/api/import_lots', login='admin', data=_import_csv,
+          expect=[201]),
+    Route('admin.edit_parking_lot', 'POST', lambda ctx, state: f'/admin/edit_parking_lot/{ctx.last_lot_id}',
+          login='admin', data={'name': 'Edited Lot', 'address': '3 Bench Road', 'pin_code': '10003', 'price': '4.0'}),
+    Route('admin.spot_details', 'GET', lambda ctx, state: f'/admin/spot_details/{ctx.occupied_spot_id}', login='admin'),
+    Route('admin.update_spot_status', 'POST', lambda ctx, state: f'/admin/api/spot_status/{state["spot_id"]}',
+          login='admin', before=_occupy_target,
+          json=lambda ctx, state: {'status': 'maintenance'}, expect=[200]),
+    Route('admin.batch_spot_status', 'POST', '/admin/api/spots/batch', login='admin',
+          before=lambda ctx, i: ('maintenance', 'available')[i % 2],
+          json=lambda ctx, state: {'action': state, 'lot_id': ctx.last_lot_id, 'spot_numbers': '1-50'},
+          expect=[200]),
+    Route('admin.mark_spot_occupied', 'POST', '/admin/mark_spot_occupied', login='admin', before=_occupy_target,
+          data=lambda ctx, state: {'spot_id': state['spot_id'], 'vehicle_reg': 'BENCH'}),
+    Route('admin.release_spot', 'POST', '/admin/release_spot', login='admin', before=_release_target,
+          data=lambda ctx, state: {'spot_id': state['spot_id']}),
+    Route('admin.delete_user', 'POST', lambda ctx, state: f'/admin/delete_user/{state["user_id"]}', login='admin',
+          before=_new_user),
+    Route('admin.lot_stats', 'GET', '/admin/api/lot_stats', login='admin'),
+    Route('admin.api_parking_data', 'GET', '/admin/api/parking_data', login='admin'),
+    Route('admin.api_parking_lots', 'GET', '/admin/api/parking_lots', login='admin'),
+    Route('admin.api_users', 'GET', '/admin/api/users', login='admin'),
+    Route('admin.api_spots', 'GET', '/admin/api/spots', login='admin'),
+    Route('admin.api_parking_stats', 'GET', '/admin/api/parking_stats', login='admin'),
+    Route('admin.api_db_settings', 'GET', '/admin/api/db_settings', login='admin'),
+    Route('admin.api_perf', 'GET', '/admin/api/perf', login='admin'),
+]
+
+
+def run_route(label, iterations, warmup):
+    """Time one route in this process; prints its samples as JSON."""
+    sys.path.insert(0, PROJECT_ROOT)
+    from app import create_app
+
+    route = next(route for route in ROUTES if route.label == label)
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    ctx = Context(app)
+    client = ctx.client(route.login)
+
+    samples, queries, db_ms, statuses = [], [], [], {}
+    for i in range(warmup + iterations):
+        state = route.before(ctx, i) if route.before else None
+        path = _value(route.path, ctx, state)
+        kwargs = {}
+        if route.data is not None:
+            kwargs['data'] = _value(route.data, ctx, state)
+        if route.json is not None:
+            kwargs['json'] = _value(route.json, ctx, state)
+        started = time.perf_counter()
+        if route.stream:
+            response = client.open(path, method=route.method, buffered=False)
+            next(iter(response.response))
+            response.close()
+        else:
+            response = client.open(path, method=route.method, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i < warmup:
+            continue
+        samples.append(elapsed)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        timing = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+        if timing:
+            db_ms.append(float(timing.group(1)))
+            queries.append(int(timing.group(2)))
+
+    print(json.dumps({
+        'samples_ms': samples,
+        'queries': queries,
+        'db_ms': db_ms,
+        'statuses': statuses,
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    }))
+
+
+# -- driver --------------------------------------------------------------
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else None
+
+
+def summarize(raw):
+    samples = raw['samples_ms']
+    return {
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'queries': round(statistics.mean(raw['queries']), 1) if raw['queries'] else None,
+        'db_ms_p50': round(statistics.median(raw['db_ms']), 2) if raw['db_ms'] else None,
+        'peak_rss_mb': round(raw['peak_rss_mb'], 1),
+        'statuses': raw['statuses'],
+    }
+
+
+def uncovered_endpoints():
+    """User and admin endpoints no benchmark route exercises."""
+    sys.path.insert(0, PROJECT_ROOT)
+    from app import create_app
+    app = create_app()
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in ('user', 'admin')}
+    return sorted(endpoints - {route.endpoint for route in ROUTES})
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regressions of ``results`` against a ``baseline`` result file."""
+    regressions = []
+    for label, current in results.items():
+        before = baseline.get('routes', {}).get(label)
+        if not before or 'error' in before:
+            continue
+        slower = current['p95_ms'] - before['p95_ms']
+        if slower > min_delta_ms and current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if current['queries'] is not None and before.get('queries') is not None and current['queries'] > before['queries']:
+            regressions.append(f"{label}: queries {before['queries']} -> {current['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='small', help='Dataset size.')
+    parser.add_argument('--seed', type=int, default=1, help='Dataset random seed.')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per route first.')
+    parser.add_argument('--routes', help='Comma separated substrings; only routes whose label matches one run.')
+    parser.add_argument('--json', help='Write the results to this file.')
+    parser.add_argument('--baseline', help='Compare with an earlier --json result.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p95 growth.')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='Ignore p95 growth below this.')
+    parser.add_argument('--rebuild', action='store_true', help='Regenerate the cached dataset.')
+    parser.add_argument('--build-dataset', nargs=3, metavar=('PATH', 'SIZE', 'SEED'), help=argparse.SUPPRESS)
+    parser.add_argument('--child', metavar='LABEL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.build_dataset:
+        path, size, seed = args.build_dataset
+        return build_dataset(path, size, int(seed))
+    if args.child:
+        return run_route(args.child, args.iterations, args.warmup)
+
+    cached = dataset_path(args.size, args.seed)
+    if args.rebuild or not os.path.exists(cached):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        partial = cached + '.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        print(f'Generating the {args.size} dataset ({SIZES[args.size]}) ...', flush=True)
+        started = time.perf_counter()
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--build-dataset', partial, args.size, str(args.seed)],
+                       cwd=PROJECT_ROOT, check=True, stdout=subprocess.DEVNULL)
+        os.replace(partial, cached)
+        print(f'  done in {time.perf_counter() - started:.1f}s', flush=True)
+
+    routes = ROUTES
+    if args.routes:
+        wanted = [part.strip() for part in args.routes.split(',') if part.strip()]
+        routes = [route for route in ROUTES if any(part in route.label for part in wanted)]
+
+    workdir = tempfile.mkdtemp(prefix='parking-routes-')
+    results = {}
+    try:
+        database = os.path.join(workdir, 'parking.db')
+        shutil.copyfile(cached, database)
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', SQL_PROFILER='1')
+        print(f"{'route':<42}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'db ms':>8}{'RSS MB':>8}  status")
+        for route in routes:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', route.label,
+                 '--iterations', str(args.iterations), '--warmup', str(args.warmup)],
+                cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+            )
+            if output.returncode != 0:
+                print(f'{route.label:<42} FAILED: {output.stderr.strip().splitlines()[-1:]}')
+                results[route.label] = {'error': output.stderr[-2000:]}
+                continue
+            result = results[route.label] = summarize(json.loads(output.stdout.strip().splitlines()[-1]))
+            statuses = ','.join(f'{code}x{count}' for code, count in sorted(result['statuses'].items()))
+            # Timings of error pages say nothing about the route; report it as failed instead
+            unexpected = sorted(code for code in result['statuses'] if int(code) not in route.expect)
+            if unexpected:
+                result['error'] = (f"unexpected status {', '.join(unexpected)} "
+                                   f"(expected {', '.join(map(str, sorted(route.expect)))})")
+                print(f"{route.label:<42} FAILED: {result['error']}; {statuses}", flush=True)
+                continue
+            print(f"{route.label:<42}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                  f"{result['queries'] if result['queries'] is not None else '-':>9}"
+                  f"{result['db_ms_p50'] if result['db_ms_p50'] is not None else '-':>8}"
+                  f"{result['peak_rss_mb']:>8.0f}  {statuses}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'size': args.size,
+        'rows': SIZES[args.size],
+        'seed': args.seed,
+        'iterations': args.iterations,
+        'python': sys.version.split()[0],
+        'created': datetime.utcnow().isoformat(timespec='seconds'),
+        'uncovered_endpoints': uncovered_endpoints(),
+        'routes': results,
+    }
+    if report['uncovered_endpoints']:
+        print(f"Not benchmarked: {', '.join(report['uncovered_endpoints'])}")
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+    failed = [label for label, result in results.items() if 'error' in result]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare({label: result for label, result in results.items() if 'error' not in result},
+                                  json.load(handle), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
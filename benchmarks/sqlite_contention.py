@@ -0,0 +1,216 @@
+"""
+Contention benchmark for the SQLite connection profiles.
+
+Several worker processes, each with a few threads (like gunicorn gthread
+workers), hammer one database file with the app's hot paths: booking a free
+spot, releasing it, and the admin statistics aggregate. Every profile runs
+against a fresh copy of the same seeded database; the report shows
+operations per second and how many operations failed with ``database is
+locked``.
+
+    python benchmarks/sqlite_contention.py --seconds 10 --workers 4 --threads 4
+    python benchmarks/sqlite_contention.py --json bench_sqlite.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from services.sqlite_profile import PROFILES, install_pragmas, sqlite_engine_options, sqlite_pragmas  # noqa: E402
+
+LOTS = 20
+SPOTS_PER_LOT = 50
+USERS = 200
+HISTORY_BOOKINGS = 20000
+# Share of operations that are admin statistics reads; the rest book or release
+READ_SHARE = 0.3
+
+
+def seed(path):
+    """Create the app's tables in ``path`` and fill them with lots, spots and booking history."""
+    from extensions import db
+    import models  # noqa: F401 - registers every table
+
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    rnd = random.Random(0)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user (id, username, email, password_hash) VALUES (:id, :name, :email, 'x')"
+        ), [{'id': i, 'name': f'user{i}', 'email': f'user{i}@example.com'} for i in range(1, USERS + 1)])
+        connection.execute(text(
+            "INSERT INTO parking_lot (id, name, address, pin_code, price, total_spots, available_spots) "
+            "VALUES (:id, :name, 'Somewhere', '10001', 2.5, :spots, :spots)"
+        ), [{'id': i, 'name': f'Lot {i}', 'spots': SPOTS_PER_LOT} for i in range(1, LOTS + 1)])
+        connection.execute(text(
+            "INSERT INTO parking_spot (spot_id, spot_number, parking_lot_id, is_available, spot_type) "
+            "VALUES (:spot_id, :number, :lot, 1, 'standard')"
+        ), [{'spot_id': f'L{lot}-S{n}', 'number': n, 'lot': lot}
+            for lot in range(1, LOTS + 1) for n in range(1, SPOTS_PER_LOT + 1)])
+        history = []
+        for _ in range(HISTORY_BOOKINGS):
+            start = now - timedelta(hours=rnd.uniform(1, 24 * 90))
+            history.append({
+                'user': rnd.randint(1, USERS), 'spot': rnd.randint(1, LOTS * SPOTS_PER_LOT),
+                'start': start, 'end': start + timedelta(hours=rnd.uniform(0.5, 8)), 'cost': rnd.uniform(1, 20)
+            })
+        connection.execute(text(
+            "INSERT INTO booking (user_id, parking_spot_id, parking_timestamp, leaving_timestamp, total_cost, "
+            "booking_status) VALUES (:user, :spot, :start, :end, :cost, 'completed')"
+        ), history)
+    engine.dispose()
+
+
+def book(connection, rnd):
+    lot_id = rnd.randint(1, LOTS)
+    spot_id = connection.execute(text(
+        "SELECT id FROM parking_spot WHERE parking_lot_id = :lot AND is_available = 1 LIMIT 1"
+    ), {'lot': lot_id}).scalar()
+    if spot_id is None:
+        return
+    claimed = connection.execute(text(
+        "UPDATE parking_spot SET is_available = 0 WHERE id = :id AND is_available = 1"
+    ), {'id': spot_id}).rowcount
+    if claimed:
+        connection.execute(text(
+            "INSERT INTO booking (user_id, parking_spot_id, parking_timestamp, booking_status) "
+            "VALUES (:user, :spot, :now, 'active')"
+        ), {'user': rnd.randint(1, USERS), 'spot': spot_id, 'now': datetime.utcnow()})
+
+
+def release(connection, rnd):
+    row = connection.execute(text(
+        "SELECT id, parking_spot_id FROM booking WHERE booking_status = 'active' LIMIT 1 OFFSET :skip"
+    ), {'skip': rnd.randint(0, 20)}).first()
+    if row is None:
+        return
+    connection.execute(text(
+        "UPDATE booking SET booking_status = 'completed', leaving_timestamp = :now, total_cost = 2.5 WHERE id = :id"
+    ), {'now': datetime.utcnow(), 'id': row[0]})
+    connection.execute(text("UPDATE parking_spot SET is_available = 1 WHERE id = :id"), {'id': row[1]})
+
+
+def stats(connection, rnd):
+    since = datetime.utcnow() - timedelta(days=rnd.choice([1, 7, 30]))
+    connection.execute(text(
+        "SELECT count(*), sum(total_cost), avg((julianday(leaving_timestamp) - julianday(parking_timestamp)) * 24) "
+        "FROM booking WHERE parking_timestamp >= :since"
+    ), {'since': since}).all()
+
+
+def worker(path, profile, threads, seconds, results):
+    config = {'SQLITE_PROFILE': profile}
+    options = sqlite_engine_options(config)
+    options['pool_size'] = threads
+    engine = create_engine(f'sqlite:///{path}', **options)
+    install_pragmas(engine, sqlite_pragmas(config))
+    counts = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def run(seed_value):
+        rnd = random.Random(seed_value)
+        while time.monotonic() < deadline:
+            is_read = rnd.random() < READ_SHARE
+            operation = stats if is_read else rnd.choice((book, book, release))
+            started = time.perf_counter()
+            try:
+                with engine.begin() as connection:
+                    operation(connection, rnd)
+            except OperationalError as error:
+                if 'locked' not in str(error) and 'busy' not in str(error):
+                    raise
+                with lock:
+                    counts['locked'] += 1
+                continue
+            with lock:
+                counts['reads' if is_read else 'writes'] += 1
+                counts['latencies'].append(time.perf_counter() - started)
+
+    pool = [threading.Thread(target=run, args=(os.getpid() * 100 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    results.put(counts)
+
+
+def run_profile(seed_path, profile, workers, threads, seconds):
+    directory = tempfile.mkdtemp(prefix='sqlite-contention-')
+    path = os.path.join(directory, 'parking.db')
+    shutil.copy(seed_path, path)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(path, profile, threads, seconds, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    latencies = sorted(latency for counts in totals for latency in counts['latencies'])
+    writes = sum(counts['writes'] for counts in totals)
+    reads = sum(counts['reads'] for counts in totals)
+    locked = sum(counts['locked'] for counts in totals)
+
+    def percentile(share):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000, 2) if latencies else None
+
+    return {
+        'profile': profile,
+        'ops_per_second': round((writes + reads) / seconds, 1),
+        'writes': writes,
+        'reads': reads,
+        'locked_errors': locked,
+        'p50_ms': percentile(0.5),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (default 4).')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker (default 4).')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run (default 10).')
+    parser.add_argument('--profiles', default='default,production',
+                        help=f"Comma separated profiles to compare (from: {', '.join(PROFILES)}).")
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file.')
+    args = parser.parse_args()
+
+    seed_directory = tempfile.mkdtemp(prefix='sqlite-contention-seed-')
+    seed_path = os.path.join(seed_directory, 'parking.db')
+    try:
+        seed(seed_path)
+        results = [run_profile(seed_path, profile.strip(), args.workers, args.threads, args.seconds)
+                   for profile in args.profiles.split(',')]
+    finally:
+        shutil.rmtree(seed_directory, ignore_errors=True)
+
+    print(f'{args.workers} workers x {args.threads} threads, {args.seconds:g}s per profile')
+    print(f"{'profile':<12}{'ops/s':>10}{'writes':>10}{'reads':>10}{'locked':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['profile']:<12}{result['ops_per_second']:>10}{result['writes']:>10}{result['reads']:>10}"
+              f"{result['locked_errors']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}")
+    if args.json_path:
+        with open(args.json_path, 'w') as handle:
+            json.dump({'workers': args.workers, 'threads': args.threads, 'seconds': args.seconds,
+                       'results': results}, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Startup benchmark: how long a fresh worker takes to serve its first request.
+
+Every run is a new Python process (like a gunicorn worker on a cold start)
+that measures importing ``app``, ``create_app()``, the first request that
+needs no database (``GET /``) and the first one that does (a user login and
+the dashboard). Runs use a copy of ``instance/parking.db`` so the real
+database is never touched. ``create_app()`` must not open a database
+connection; a run that does is reported as a failure, as is a median above
+one of the ``--max-*-ms`` budgets.
+
+    python benchmarks/startup.py --runs 7
+    python benchmarks/startup.py --json bench_startup.json --max-create-app-ms 300
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DATABASE = os.path.join(PROJECT_ROOT, 'instance', 'parking.db')
+PHASES = ('import_ms', 'create_app_ms', 'first_request_ms', 'first_db_request_ms')
+
+
+def child():
+    """One cold start; prints its timings as JSON."""
+    sys.path.insert(0, PROJECT_ROOT)
+    started = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+
+    from extensions import db
+    with app.app_context():
+        # Connections opened (and returned to the pool) by create_app itself
+        startup_connections = db.engine.pool.checkedin() + db.engine.pool.checkedout()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    response = client.get('/')
+    served = time.perf_counter()
+    assert response.status_code == 200, response.status_code
+    client.post('/user/login', data={'email': 'user', 'password': 'user123'})
+    response = client.get('/user/dashboard')
+    served_db = time.perf_counter()
+    assert response.status_code == 200, response.status_code
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_request_ms': (served - created) * 1000,
+        'first_db_request_ms': (served_db - served) * 1000,
+        'startup_connections': startup_connections,
+    }))
+
+
+def run_once(database):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # The app prints its own messages; the timings are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts to measure.')
+    parser.add_argument('--json', help='Also write the results to this file.')
+    for phase in PHASES:
+        option = '--max-' + phase.replace('_', '-')
+        parser.add_argument(option, type=float, default=None,
+                            help=f'Fail if the median {phase[:-3].replace("_", " ")} time exceeds this.')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    workdir = tempfile.mkdtemp(prefix='parking-startup-')
+    try:
+        database = os.path.join(workdir, 'parking.db')
+        shutil.copyfile(SOURCE_DATABASE, database)
+        runs = [run_once(database) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {'runs': runs, 'median': {}, 'max': {}, 'failures': []}
+    print(f"{'phase':<22}{'median ms':>12}{'max ms':>12}")
+    for phase in PHASES:
+        values = [run[phase] for run in runs]
+        median = results['median'][phase] = statistics.median(values)
+        results['max'][phase] = max(values)
+        print(f"{phase[:-3]:<22}{median:>12.1f}{max(values):>12.1f}")
+        budget = getattr(args, 'max_' + phase)
+        if budget is not None and median > budget:
+            results['failures'].append(f'{phase[:-3]} median {median:.1f} ms is over the {budget:g} ms budget')
+    if any(run['startup_connections'] for run in runs):
+        results['failures'].append('create_app() opened a database connection')
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+    for failure in results['failures']:
+        print(f'FAIL: {failure}')
+    return 1 if results['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
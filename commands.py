@@ -0,0 +1,159 @@
+"""
+Flask CLI commands for maintenance tasks, registered in create_app().
+
+Run them with the app on the path, e.g. ``flask --app wsgi backfill-user-stats``.
+"""
+import click
+from flask.cli import with_appcontext
+
+from extensions import db
+
+
+@click.command('backfill-user-stats')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+@with_appcontext
+def backfill_user_stats_command(user_id):
+    """Rebuild the per-user parking stats tables from completed bookings."""
+    from models.user_stats import rebuild_user_stats
+    users = rebuild_user_stats(user_id)
+    db.session.commit()
+    click.echo(f"Rebuilt parking stats for {users} user(s).")
+
+
+@click.command('rebuild-lot-rollups')
+@click.option('--start', 'start', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M']), required=True,
+              help='First hour to rebuild (UTC).')
+@click.option('--end', 'end', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M']), default=None,
+              help='Rebuild up to, not including, this hour (UTC). Defaults to now.')
+@click.option('--lot-id', type=int, default=None, help='Only rebuild this lot.')
+@with_appcontext
+def rebuild_lot_rollups_command(start, end, lot_id):
+    """Backfill or repair the hourly lot rollups for a time range from raw bookings."""
+    from datetime import datetime, timedelta
+    from models.lot_hourly_stats import rebuild_lot_hourly_stats
+    if end is None:
+        end = datetime.utcnow() + timedelta(hours=1)
+    if end <= start:
+        raise click.BadParameter('--end must be after --start')
+    rows = rebuild_lot_hourly_stats(start, end, lot_id)
+    db.session.commit()
+    click.echo(f"Rebuilt {rows} hourly rollup row(s) from {start} to {end}.")
+
+
+@click.command('rebuild-availability-counters')
+@with_appcontext
+def rebuild_availability_counters_command():
+    """Recount free spots from the database into the shared counters and lot columns."""
+    from extensions import availability_counters
+    from models.parking_lot import ParkingLot
+    from models.parking_spot import ParkingSpot
+    free = db.select(db.func.count(ParkingSpot.id)).where(
+        ParkingSpot.parking_lot_id == ParkingLot.id,
+        ParkingSpot.is_available.is_(True)
+    ).scalar_subquery()
+    lots = db.session.execute(db.update(ParkingLot).values(available_spots=free)).rowcount
+    db.session.commit()
+    availability_counters.rebuild()
+    click.echo(f"Recounted free spots for {lots} lot(s).")
+
+
+@click.command('rebuild-lot-search')
+@with_appcontext
+def rebuild_lot_search_command():
+    """Create the parking lot full-text index if needed and rebuild it from the lots table."""
+    from services.lot_search import install_lot_search
+    if install_lot_search(rebuild=True):
+        click.echo("Rebuilt the parking lot search index.")
+    else:
+        click.echo("FTS5 is not available; lot search uses LIKE matching.")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or migrate the database, install the search index and resync the spot counters.
+
+    The app itself touches no database at startup; run this once per
+    deploy, before the workers start.
+    """
+    from extensions import availability_counters
+    from services.schema import init_database, SchemaError
+    from services.lot_search import install_lot_search
+    try:
+        outcome = init_database()
+    except SchemaError as exc:
+        raise click.ClickException(str(exc))
+    if outcome == 'created':
+        click.echo("Created a new database at the latest schema.")
+    elif outcome == 'upgraded':
+        click.echo("Database schema is at the latest revision.")
+    else:
+        click.echo("Database had no migration history; stamped it as the initial schema "
+                   "and migrated it to the latest revision.")
+    if not install_lot_search():
+        click.echo("FTS5 is not available; lot search uses LIKE matching.")
+    availability_counters.rebuild()
+    click.echo("Loaded the availability counters from the database.")
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Create the admin, the test user and a sample lot if they are missing."""
+    from services.seed import seed_defaults
+    created = seed_defaults()
+    for item in created:
+        click.echo(f"Created {item}.")
+    if not created:
+        click.echo("Nothing to seed; defaults already exist.")
+
+
+@click.command('generate-data')
+@click.option('--preset', type=click.Choice(['small', 'medium', 'large']), default='small', show_default=True,
+              help='Dataset size; the options below override single counts.')
+@click.option('--lots', type=int, default=None, help='Parking lots.')
+@click.option('--spots', type=int, default=None, help='Spots across all lots.')
+@click.option('--users', type=int, default=None, help='Users (user1..userN).')
+@click.option('--bookings', type=int, default=None, help='Bookings over the whole period.')
+@click.option('--days', type=int, default=90, show_default=True, help='Days of booking history.')
+@click.option('--end', 'end', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M']), default=None,
+              help='End of the history (UTC). Defaults to the current hour; fix it for identical output.')
+@click.option('--arrivals', type=click.Choice(['commuter', 'retail', 'flat']), default='commuter', show_default=True,
+              help='Arrival curve over the day and week.')
+@click.option('--durations', type=click.Choice(['lognormal', 'exponential', 'commuter']), default='lognormal',
+              show_default=True, help='Distribution of stay lengths.')
+@click.option('--electric-share', type=float, default=0.08, show_default=True, help='Share of electric spots and vehicles.')
+@click.option('--disabled-share', type=float, default=0.04, show_default=True, help='Share of disabled spots and vehicles.')
+@click.option('--password', default='password123', show_default=True, help='Password of every generated user.')
+@click.option('--seed', type=int, default=1, show_default=True, help='Random seed.')
+@with_appcontext
+def generate_data_command(preset, lots, spots, users, bookings, days, end, arrivals, durations,
+                          electric_share, disabled_share, password, seed):
+    """Fill an empty database with a deterministic synthetic dataset for load tests.
+
+    Run ``init-db`` on a new database first, and ``seed`` afterwards for
+    the admin account.
+    """
+    from services.synthetic_data import PRESETS, DatasetError, generate_dataset
+    sizes = dict(PRESETS[preset])
+    for name, value in (('lots', lots), ('spots', spots), ('users', users), ('bookings', bookings)):
+        if value is not None:
+            sizes[name] = value
+    try:
+        counts = generate_dataset(days=days, seed=seed, arrivals=arrivals, durations=durations, end=end,
+                                  disabled_share=disabled_share, electric_share=electric_share,
+                                  password=password, progress=click.echo, **sizes)
+    except DatasetError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Wrote {counts['rows_written']} rows in {counts['seconds']}s "
+               f"({counts['rows_per_second']} rows/s).")
+
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(backfill_user_stats_command)
+    app.cli.add_command(rebuild_lot_rollups_command)
+    app.cli.add_command(rebuild_availability_counters_command)
+    app.cli.add_command(rebuild_lot_search_command)
+    app.cli.add_command(generate_data_command)
@@ -15,4 +15,34 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 
                                    'instance', 'parking.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # SQLite connection profile (services/sqlite_profile.py): 'production' turns on
+    # WAL, synchronous=NORMAL, a busy timeout and bigger caches; 'default' keeps SQLite's
+    # own defaults
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+    # Individual pragma overrides, e.g. {'busy_timeout': 10000}
+    SQLITE_PRAGMAS = {}
+    # Pooled connections per worker; match gunicorn's --threads
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 16))
+    SQLITE_POOL_OVERFLOW = 4
+    
+    # Live availability streams (SSE) per worker. Each one holds a thread for up to
+    # 5 minutes, so keep this well below gunicorn's --threads; extra clients get a 503
+    AVAILABILITY_MAX_STREAMS = int(os.environ.get('AVAILABILITY_MAX_STREAMS', 8))
+    
+    # Per-request SQL profiling (services/sql_profiler.py): Server-Timing headers,
+    # N+1 warnings and /admin/api/perf. Off unless SQL_PROFILER=1
+    SQL_PROFILER = os.environ.get('SQL_PROFILER', '').lower() in ('1', 'true', 'yes')
+    # Same statement this many times in one request is reported as N+1
+    SQL_PROFILER_N_PLUS_ONE = int(os.environ.get('SQL_PROFILER_N_PLUS_ONE', 5))
+    
+    # Prometheus metrics at /metrics (services/metrics.py); on unless METRICS=0
+    METRICS = os.environ.get('METRICS', '1').lower() not in ('0', 'false', 'no')
+    # Directory the workers share their numbers through; defaults to instance/metrics-<db hash>
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    # Each worker writes its numbers there at most this often (and on exit)
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    # Scrapes must send "Authorization: Bearer <token>"; without a token /metrics
+    # answers 404 except in debug and testing
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
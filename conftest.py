@@ -0,0 +1,45 @@
+"""
+Shared pytest fixtures: an app on a fresh, seeded database per test.
+
+``config.Config`` is read when ``create_app`` runs, so pointing its
+database (and the availability counters file) at a temporary directory is
+enough to keep tests away from ``instance/parking.db``.
+"""
+import pytest
+
+import config
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'parking.db'}")
+    monkeypatch.setattr(config.Config, 'AVAILABILITY_COUNTERS_PATH', str(tmp_path / 'availability.counters'),
+                        raising=False)
+    monkeypatch.setattr(config.Config, 'METRICS_DIR', str(tmp_path / 'metrics'))
+    monkeypatch.setattr(config.Config, 'WTF_CSRF_ENABLED', False, raising=False)
+    monkeypatch.setattr(config.Config, 'TESTING', True, raising=False)
+
+    from app import create_app
+    from extensions import db, spot_allocator
+    app = create_app()
+    runner = app.test_cli_runner()
+    for command in ('init-db', 'seed'):
+        result = runner.invoke(args=[command])
+        assert result.exit_code == 0, result.output
+    with app.app_context():
+        # The allocator is a process-wide singleton; drop lots of earlier tests
+        spot_allocator.rebuild()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def lot_id(app):
+    from models.parking_lot import ParkingLot
+    return ParkingLot.query.first().id
+
+
+@pytest.fixture
+def user_id(app):
+    from models.user import User
+    return User.query.filter_by(username='user').first().id
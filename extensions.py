@@ -1,9 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from services.spot_allocator import SpotAllocator
+from services.availability_feed import AvailabilityFeed
+from services.availability_counters import AvailabilityCounters
+from services.lot_locator import LotLocator
+from services.sql_profiler import SqlProfiler
+from services.metrics import Metrics
+from services.identity_cache import IdentityCache, ADMIN_PREFIX, USER_PREFIX, session_id, parse_session_id
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 # Initialize extensions
 db = SQLAlchemy()
 login_manager = LoginManager()
+spot_allocator = SpotAllocator()
+availability_feed = AvailabilityFeed()
+availability_counters = AvailabilityCounters()
+identity_cache = IdentityCache()
+lot_locator = LotLocator()
+sql_profiler = SqlProfiler()
+metrics = Metrics()
 
 
 @login_manager.user_loader
@@ -11,10 +27,35 @@ def load_user(user_id):
     from models.admin import Admin
     from models.user import User
     
-    # Try loading as admin first
-    admin = Admin.query.get(int(user_id))
-    if admin:
-        return admin
+    # Session ids are typed ("a:1" admin, "u:1" user) so only one table is read.
+    # Untyped ids from older sessions are ambiguous and need a fresh login.
+    prefix, principal_id = parse_session_id(user_id)
+    model = {ADMIN_PREFIX: Admin, USER_PREFIX: User}.get(prefix)
+    if model is None or principal_id is None:
+        return None
     
-    # If not an admin, try loading as regular user
-    return User.query.get(int(user_id))
\ No newline at end of file
+    key = session_id(prefix, principal_id)
+    principal = identity_cache.get(model, key)
+    if principal is None:
+        principal = db.session.get(model, principal_id)
+        if principal is not None:
+            identity_cache.put(key, principal)
+    return principal
+
+
+@event.listens_for(Session, 'after_flush')
+def _forget_changed_principals(session, flush_context):
+    # Drop cached logins of admins/users that were changed (e.g. their password) or deleted
+    keys = [obj.get_id() for obj in list(session.dirty) + list(session.deleted)
+            if getattr(obj, 'is_admin', None) is not None]
+    for key in keys:
+        identity_cache.invalidate(key)
+    if keys:
+        session.info.setdefault('changed_principals', []).extend(keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_committed_principals(session):
+    # Again after commit, in case another request cached the old row in between
+    for key in session.info.pop('changed_principals', ()):
+        identity_cache.invalidate(key)
\ No newline at end of file
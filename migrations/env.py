@@ -0,0 +1,80 @@
+"""
+Alembic environment for the parking database.
+
+The metadata comes straight from the models, so ``alembic revision
+--autogenerate`` compares the database against them. The app itself is not
+created here: ``create_app`` would create tables and seed data before the
+migrations run.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from config import Config
+from extensions import db
+import models  # noqa: F401 - registers every table on db.metadata
+
+config = context.config
+
+# Only configure logging when run from the alembic command, not from inside the app
+if config.config_file_name is not None and 'connection' not in config.attributes:
+    fileConfig(config.config_file_name)
+
+target_metadata = db.metadata
+
+# Tables maintained outside the models (the FTS5 lot search index and its shadow tables)
+EXTERNAL_TABLE_PREFIXES = ('parking_lot_fts',)
+
+
+def database_url():
+    return context.get_x_argument(as_dictionary=True).get('url') or Config.SQLALCHEMY_DATABASE_URI
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == 'table' and name.startswith(EXTERNAL_TABLE_PREFIXES):
+        return False
+    return True
+
+
+def run_migrations_offline():
+    """Emit the migration SQL instead of running it (``alembic upgrade head --sql``)."""
+    context.configure(
+        url=database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={'paramstyle': 'named'},
+        render_as_batch=True,
+        include_object=include_object
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite can't ALTER most things; batch mode copies the table instead
+        render_as_batch=True,
+        include_object=include_object
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # The app passes its own connection (see services.schema)
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        run_migrations(connection)
+        return
+    engine = create_engine(database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,164 @@
+"""Initial schema, matching the models before Alembic was introduced
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 18:36:10.469270
+
+Databases created earlier by ``db.create_all()`` already have these tables;
+mark them as migrated with ``alembic stamp 0001`` instead of upgrading. The
+FTS5 lot search table is not part of the models and is installed by
+``services.lot_search``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('admin',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=100), nullable=False),
+    sa.Column('password_hash', sa.String(length=200), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('availability_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('parking_lot_id', sa.Integer(), nullable=False),
+    sa.Column('spot_type', sa.String(length=50), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('created_on', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('availability_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_availability_event_created_on'), ['created_on'], unique=False)
+
+    op.create_table('parking_lot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('address', sa.String(length=200), nullable=False),
+    sa.Column('pin_code', sa.String(length=20), nullable=False),
+    sa.Column('postcode_level', sa.String(length=50), nullable=True),
+    sa.Column('available_spots', sa.Integer(), nullable=True),
+    sa.Column('created_on', sa.DateTime(), nullable=True),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('total_spots', sa.Integer(), nullable=False),
+    sa.Column('num_rows', sa.Integer(), nullable=True),
+    sa.Column('num_cols', sa.Integer(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=100), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password_hash', sa.String(length=200), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=True),
+    sa.Column('last_name', sa.String(length=50), nullable=True),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('registered_on', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('lot_hourly_stats',
+    sa.Column('parking_lot_id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('bookings_started', sa.Integer(), nullable=False),
+    sa.Column('bookings_ended', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('occupied_seconds', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['parking_lot_id'], ['parking_lot.id'], ),
+    sa.PrimaryKeyConstraint('parking_lot_id', 'hour')
+    )
+    op.create_table('parking_spot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spot_id', sa.String(length=50), nullable=False),
+    sa.Column('spot_number', sa.Integer(), nullable=False),
+    sa.Column('parking_lot_id', sa.Integer(), nullable=False),
+    sa.Column('is_available', sa.Boolean(), nullable=True),
+    sa.Column('spot_type', sa.String(length=50), nullable=True),
+    sa.Column('created_on', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['parking_lot_id'], ['parking_lot.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('spot_id')
+    )
+    op.create_table('user_daily_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('parking_lot_id', sa.Integer(), nullable=False),
+    sa.Column('bookings', sa.Integer(), nullable=False),
+    sa.Column('hours', sa.Float(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['parking_lot_id'], ['parking_lot.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'parking_lot_id')
+    )
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('completed_bookings', sa.Integer(), nullable=False),
+    sa.Column('total_hours', sa.Float(), nullable=False),
+    sa.Column('total_spent', sa.Float(), nullable=False),
+    sa.Column('updated_on', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('vehicle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('license_plate', sa.String(length=20), nullable=False),
+    sa.Column('vehicle_type', sa.String(length=20), nullable=True),
+    sa.Column('color', sa.String(length=20), nullable=True),
+    sa.Column('created_on', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('license_plate')
+    )
+    op.create_table('booking',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('parking_spot_id', sa.Integer(), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=True),
+    sa.Column('vehicle_reg', sa.String(length=20), nullable=True),
+    sa.Column('parking_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('leaving_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('total_cost', sa.Float(), nullable=True),
+    sa.Column('booking_status', sa.String(length=20), nullable=True),
+    sa.Column('created_on', sa.DateTime(), nullable=True),
+    sa.Column('start_time', sa.DateTime(), nullable=True),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['parking_spot_id'], ['parking_spot.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicle.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_parking_window', ['parking_timestamp', 'leaving_timestamp', 'total_cost'], unique=False)
+
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_parking_window')
+
+    op.drop_table('booking')
+    op.drop_table('vehicle')
+    op.drop_table('user_stats')
+    op.drop_table('user_daily_stats')
+    op.drop_table('parking_spot')
+    op.drop_table('lot_hourly_stats')
+    op.drop_table('user')
+    op.drop_table('parking_lot')
+    with op.batch_alter_table('availability_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_availability_event_created_on'))
+
+    op.drop_table('availability_event')
+    op.drop_table('admin')
@@ -0,0 +1,42 @@
+"""Indexes for the hot booking and spot lookups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 18:36:22.365717
+
+Active booking lookups (``current_booking()``, dashboard, booking and
+release pages) and the per-user counts scanned the whole booking table, and
+free spot counts scanned parking_spot. ``parking_timestamp`` needs no index
+of its own: it leads ``ix_booking_parking_window``. Vehicles are only looked
+up by their active booking, so that index is partial and stays small however
+long the booking history grows.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+ACTIVE_BOOKING = sa.text("booking_status = 'active'")
+
+
+def upgrade():
+    op.create_index('ix_booking_user_status', 'booking', ['user_id', 'booking_status'])
+    op.create_index('ix_booking_spot_status', 'booking', ['parking_spot_id', 'booking_status'])
+    op.create_index('ix_booking_leaving_timestamp', 'booking', ['leaving_timestamp'])
+    op.create_index('ix_booking_active_vehicle', 'booking', ['vehicle_id'],
+                    sqlite_where=ACTIVE_BOOKING, postgresql_where=ACTIVE_BOOKING)
+    op.create_index('ix_parking_spot_lot_available_type', 'parking_spot',
+                    ['parking_lot_id', 'is_available', 'spot_type'])
+
+
+def downgrade():
+    op.drop_index('ix_parking_spot_lot_available_type', table_name='parking_spot')
+    op.drop_index('ix_booking_active_vehicle', table_name='booking')
+    op.drop_index('ix_booking_leaving_timestamp', table_name='booking')
+    op.drop_index('ix_booking_spot_status', table_name='booking')
+    op.drop_index('ix_booking_user_status', table_name='booking')
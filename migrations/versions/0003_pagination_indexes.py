@@ -0,0 +1,31 @@
+"""Indexes for the paged history and user lists
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 21:12:48.530194
+
+The history page and ``/user/api/history`` list a user's finished bookings
+newest first, a page at a time, seeking past the last ``(leaving_timestamp,
+id)`` seen; with ``user_id`` leading (and the rowid implied) the index walks
+straight to a page instead of sorting all of the user's bookings. The admin
+user list counts the vehicles of the users on its page, which read the whole
+vehicle table without an index on ``user_id``.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_booking_user_leaving', 'booking', ['user_id', 'leaving_timestamp'])
+    op.create_index('ix_vehicle_user_id', 'vehicle', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_vehicle_user_id', table_name='vehicle')
+    op.drop_index('ix_booking_user_leaving', table_name='booking')
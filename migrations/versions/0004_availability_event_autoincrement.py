@@ -0,0 +1,32 @@
+"""Never reuse availability event ids
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 09:41:07.218635
+
+Availability feeds tail ``availability_event`` by id and the feed prunes
+old rows. With a plain rowid, SQLite hands out ``max(id) + 1``, so once a
+quiet spell pruned every row ids restarted at 1 and feeds waiting for
+``id > last seen`` never saw another change. AUTOINCREMENT keeps ids
+growing past deleted rows; SQLite can only add it by rebuilding the table.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('availability_event', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}):
+        pass
+
+
+def downgrade():
+    with op.batch_alter_table('availability_event', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}):
+        pass
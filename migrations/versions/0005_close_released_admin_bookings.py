@@ -0,0 +1,38 @@
+"""Close admin-marked bookings whose spot was already released
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 14:05:52.630114
+
+Releasing a spot used to end only ``active`` bookings, so a booking made by
+``mark_spot_occupied`` (status ``admin_marked``) stayed open after its spot
+was freed and the occupancy timeline counted it as occupied until now. The
+release time was never recorded, so such bookings are cancelled rather than
+completed: those whose spot is free again, and those followed by a later
+booking of the same spot.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        UPDATE booking SET booking_status = 'cancelled'
+        WHERE booking_status = 'admin_marked' AND leaving_timestamp IS NULL AND (
+            EXISTS (SELECT 1 FROM parking_spot
+                    WHERE parking_spot.id = booking.parking_spot_id AND parking_spot.is_available = 1)
+            OR EXISTS (SELECT 1 FROM booking AS later
+                       WHERE later.parking_spot_id = booking.parking_spot_id AND later.id > booking.id)
+        )
+    """)
+
+
+def downgrade():
+    # Which cancelled bookings were admin marked is not recorded
+    pass
@@ -0,0 +1,32 @@
+"""Cover the parking time in the leaving time index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 15:22:09.471856
+
+The occupancy timeline reads the bookings that ended after its range
+started, ``leaving_timestamp > start AND parking_timestamp < end``. With
+only ``leaving_timestamp`` indexed every match was a table lookup, and the
+single OR query with the open bookings was planned as a scan of everything
+parked before the range ended. ``(leaving_timestamp, parking_timestamp)``
+answers the first half from the index alone; rollups and other leaving time
+ranges use its prefix as before.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_booking_leaving_parking', 'booking', ['leaving_timestamp', 'parking_timestamp'])
+    op.drop_index('ix_booking_leaving_timestamp', table_name='booking')
+
+
+def downgrade():
+    op.create_index('ix_booking_leaving_timestamp', 'booking', ['leaving_timestamp'])
+    op.drop_index('ix_booking_leaving_parking', table_name='booking')
@@ -7,5 +7,8 @@ from models.parking_lot import ParkingLot
 from models.parking_spot import ParkingSpot
 from models.booking import Booking
 from models.vehicle import Vehicle
+from models.user_stats import UserStats, UserDailyStats
+from models.lot_hourly_stats import LotHourlyStats
+from models.availability_event import AvailabilityEvent
 
 # You can add any shared model functionality here if needed
\ No newline at end of file
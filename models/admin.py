@@ -1,6 +1,7 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from extensions import db, login_manager
+from services.identity_cache import ADMIN_PREFIX, session_id
 
 
 class Admin(db.Model, UserMixin):
@@ -10,6 +11,8 @@ class Admin(db.Model, UserMixin):
     username = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
 
+    is_admin = True
+
     def __init__(self, username, password=None):
         self.username = username
         if password:
@@ -23,6 +26,10 @@ class Admin(db.Model, UserMixin):
         """Checks if the provided password matches the stored hash."""
         return check_password_hash(self.password_hash, password)
 
+    def get_id(self):
+        """Session id, typed so it never collides with a user's id."""
+        return session_id(ADMIN_PREFIX, self.id)
+
     def __repr__(self):
         return f'<Admin {self.username}>'
 
@@ -0,0 +1,63 @@
+from extensions import db, availability_counters
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class AvailabilityEvent(db.Model):
+    """Change log of spot availability, read by the live availability feed.
+
+    A row is written in the same transaction as every change of
+    ``ParkingSpot.is_available``, so it only becomes visible once the change
+    itself is committed. Each gunicorn worker tails this table by id, which
+    is how a change made in one worker reaches streams served by the others.
+    Old rows are pruned by the feed.
+    """
+    __tablename__ = 'availability_event'
+    # Ids are never reused once pruned: feeds tail the table by id
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    parking_lot_id = db.Column(db.Integer, nullable=False)
+    spot_type = db.Column(db.String(50), nullable=False, default='standard')
+    delta = db.Column(db.Integer, nullable=False)  # +1 spot freed, -1 spot taken
+    created_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __init__(self, parking_lot_id, spot_type, delta):
+        self.parking_lot_id = parking_lot_id
+        self.spot_type = spot_type or 'standard'
+        self.delta = delta
+
+    def __repr__(self):
+        return f'<AvailabilityEvent Lot {self.parking_lot_id} {self.spot_type} {self.delta:+d}>'
+
+
+def record_availability_change(lot_id, spot_type, delta):
+    """Log a spot becoming free (+1) or taken (-1) in the caller's transaction.
+
+    The shared availability counters pick the change up once the
+    transaction commits; a rollback drops it.
+    """
+    change = AvailabilityEvent(lot_id, spot_type, delta)
+    db.session.add(change)
+    db.session.info.setdefault('availability_changes', []).append((lot_id, change.spot_type, delta, change))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_changes(session):
+    changes = session.info.pop('availability_changes', None)
+    if changes:
+        # The identity survives expire-on-commit, so reading the event id runs no query
+        availability_counters.apply([
+            (lot_id, spot_type, delta, _event_id(change)) for lot_id, spot_type, delta, change in changes
+        ])
+
+
+def _event_id(change):
+    identity = db.inspect(change).identity
+    return identity[0] if identity else None
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_changes(session):
+    session.info.pop('availability_changes', None)
@@ -1,7 +1,26 @@
 from extensions import db
 from datetime import datetime, timezone
 
+# Bookings that still hold their spot: a user's booking, or a spot an admin marked occupied
+OPEN_BOOKING_STATUSES = ('active', 'admin_marked')
+
 class Booking(db.Model):
+    __table_args__ = (
+        # Covers the date-range aggregates of the admin statistics page
+        db.Index('ix_booking_parking_window', 'parking_timestamp', 'leaving_timestamp', 'total_cost'),
+        # A user's or a spot's bookings by status: active booking lookups, per-user counts and history
+        db.Index('ix_booking_user_status', 'user_id', 'booking_status'),
+        db.Index('ix_booking_spot_status', 'parking_spot_id', 'booking_status'),
+        # Bookings that ended in a range (rollups); with the parking time it covers the occupancy timeline
+        db.Index('ix_booking_leaving_parking', 'leaving_timestamp', 'parking_timestamp'),
+        # A user's past bookings, newest first, one page at a time (history)
+        db.Index('ix_booking_user_leaving', 'user_id', 'leaving_timestamp'),
+        # Active booking of a vehicle (partial: only active bookings are indexed)
+        db.Index('ix_booking_active_vehicle', 'vehicle_id',
+                 sqlite_where=db.text("booking_status = 'active'"),
+                 postgresql_where=db.text("booking_status = 'active'")),
+    )
+    
     @property
     def username(self):
         """Return the username of the user who made this booking, or None if not found."""
@@ -33,24 +52,34 @@ class Booking(db.Model):
         self.vehicle_reg = vehicle_reg
         self.booking_status = booking_status
         self.parking_timestamp = datetime.now(timezone.utc)
-        
-        # Update the parking spot availability
+    
+    @classmethod
+    def reserve(cls, user_id, parking_spot_id, lot_id, spot_type=None, vehicle_id=None, vehicle_reg=None,
+                booking_status='active'):
+        """Claim the spot and add a new booking for it to the current transaction.
+
+        Returns the booking, or None if the spot was no longer available (for
+        example because another request booked it first). The caller commits.
+        """
         from models.parking_spot import ParkingSpot
-        spot = ParkingSpot.query.get(parking_spot_id)
-        if spot:
-            # Verify spot is still available before booking
-            if not spot.is_available:
-                raise ValueError("This parking spot is no longer available")
-                
-            spot.is_available = False
-            db.session.add(spot)
-            
-            # Also update the parent lot's available spots
-            from models.parking_lot import ParkingLot
-            lot = ParkingLot.query.get(spot.parking_lot_id)
-            if lot:
-                lot.available_spots = max(0, lot.available_spots - 1)
-                db.session.add(lot)
+        if not ParkingSpot.claim(parking_spot_id, lot_id, spot_type):
+            from extensions import metrics
+            metrics.inc('parking_booking_conflicts_total')
+            return None
+        booking = cls(
+            user_id=user_id,
+            parking_spot_id=parking_spot_id,
+            vehicle_id=vehicle_id,
+            vehicle_reg=vehicle_reg,
+            booking_status=booking_status
+        )
+        db.session.add(booking)
+        
+        from models.lot_hourly_stats import record_booking_started
+        from services.metrics import count_on_commit
+        record_booking_started(lot_id, booking.parking_timestamp)
+        count_on_commit('parking_bookings_total')
+        return booking
     
     def cancel_booking(self):
         """Cancel this booking and update the parking spot availability"""
@@ -60,46 +89,48 @@ class Booking(db.Model):
         from models.parking_spot import ParkingSpot
         spot = ParkingSpot.query.get(self.parking_spot_id)
         if spot:
-            spot.is_available = True
+            spot.mark_available()
             db.session.add(spot)
     
     def end_booking(self):
-        """End this booking, calculate cost and mark the spot as available"""
-        from datetime import datetime, timezone
-        self.leaving_timestamp = datetime.now(timezone.utc)
+        """End this booking, calculate cost and mark the spot as available.
+
+        The booking is completed by a conditional UPDATE, so when two requests
+        release it at once only one of them charges it and adds it to the
+        stats. Returns False, changing nothing, if it was no longer open.
+        """
+        leaving_timestamp = datetime.now(timezone.utc)
+        result = db.session.execute(
+            db.update(Booking)
+            .where(Booking.id == self.id, Booking.booking_status.in_(OPEN_BOOKING_STATUSES))
+            .values(booking_status='completed', leaving_timestamp=leaving_timestamp),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount != 1:
+            return False
+        self.leaving_timestamp = leaving_timestamp
         self.booking_status = 'completed'
         
         # Calculate total cost
-        if self.parking_timestamp and self.leaving_timestamp:
-            parking_time = self.parking_timestamp
-            if parking_time.tzinfo is None or parking_time.tzinfo.utcoffset(parking_time) is None:
-                parking_time = parking_time.replace(tzinfo=timezone.utc)
-            duration_hours = (self.leaving_timestamp - parking_time).total_seconds() / 3600
+        self.calculate_total_cost(first_charge=True)
         
-        # Get parking rate from the lot
+        # Already in the session's identity map after calculating the cost
         from models.parking_spot import ParkingSpot
-        from models.parking_lot import ParkingLot
-        
         spot = ParkingSpot.query.get(self.parking_spot_id)
         if spot:
-            lot = ParkingLot.query.get(spot.parking_lot_id)
-            if lot and hasattr(lot, 'price'):
-                self.total_cost = round(duration_hours * lot.price, 2)
-            else:
-                # Default rate if lot price not available
-                self.total_cost = round(duration_hours * 2.50, 2)
-            
-            # Mark spot as available
-            spot.is_available = True
+            # Mark spot as available (also updates the lot's available spots)
+            spot.mark_available()
             db.session.add(spot)
-            
-            # Update the lot's available spots
-            if lot:
-                lot.available_spots = lot.available_spots + 1
-                db.session.add(lot)
+        return True
     
-    def calculate_total_cost(self):
-        """Calculate and set the total cost for this booking based on duration and lot price."""
+    def calculate_total_cost(self, first_charge=False):
+        """Calculate and set the total cost for this booking based on duration and lot price.
+
+        With ``first_charge`` (only ``end_booking`` passes it, once it has
+        completed the booking) the booking is also added to the user's parking
+        stats and the lot's hourly rollups; recalculating a charged booking
+        only corrects the spend.
+        """
         if not self.parking_timestamp or not self.leaving_timestamp:
             self.total_cost = 0.0
             return
@@ -112,17 +143,28 @@ class Booking(db.Model):
         if leaving_time.tzinfo is None or leaving_time.tzinfo.utcoffset(leaving_time) is None:
             leaving_time = leaving_time.replace(tzinfo=timezone.utc)
         duration_hours = (leaving_time - parking_time).total_seconds() / 3600
+        previous_cost = self.total_cost
         from models.parking_spot import ParkingSpot
-        from models.parking_lot import ParkingLot
         spot = ParkingSpot.query.get(self.parking_spot_id)
-        if spot:
-            lot = ParkingLot.query.get(spot.parking_lot_id)
-            if lot and hasattr(lot, 'price'):
-                self.total_cost = round(duration_hours * lot.price, 2)
-            else:
-                self.total_cost = round(duration_hours * 2.50, 2)
+        lot = spot.parking_lot if spot else None
+        if lot and hasattr(lot, 'price'):
+            self.total_cost = round(duration_hours * lot.price, 2)
         else:
             self.total_cost = round(duration_hours * 2.50, 2)
+        
+        if spot:
+            from models.user_stats import record_booking_stats
+            from models.lot_hourly_stats import record_booking_ended, record_revenue_correction
+            if first_charge:
+                record_booking_stats(self.user_id, spot.parking_lot_id, parking_time.date(),
+                                     duration_hours, self.total_cost)
+                record_booking_ended(spot.parking_lot_id, parking_time, leaving_time, self.total_cost)
+                from services.metrics import count_on_commit
+                count_on_commit('parking_releases_total')
+            elif previous_cost is not None:
+                record_booking_stats(self.user_id, spot.parking_lot_id, parking_time.date(),
+                                     0.0, self.total_cost - previous_cost, bookings=0)
+                record_revenue_correction(spot.parking_lot_id, leaving_time, self.total_cost - previous_cost)
 
     def __repr__(self):
         return f'<Booking {self.id} for User {self.user_id}>'
\ No newline at end of file
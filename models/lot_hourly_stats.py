@@ -0,0 +1,175 @@
+from extensions import db
+from datetime import datetime, timedelta, timezone
+
+
+class LotHourlyStats(db.Model):
+    """Booking activity per lot per hour (UTC), maintained as bookings start and end.
+
+    Starts are counted in the hour the booking started; ends, revenue and
+    occupied spot-seconds once the booking is charged, with the occupied time
+    spread over every hour the booking covered. Bookings that are still
+    active are not in the occupied time yet.
+    """
+    __tablename__ = 'lot_hourly_stats'
+
+    parking_lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    bookings_started = db.Column(db.Integer, default=0, nullable=False)
+    bookings_ended = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    occupied_seconds = db.Column(db.Float, default=0.0, nullable=False)
+
+    def __init__(self, parking_lot_id, hour):
+        self.parking_lot_id = parking_lot_id
+        self.hour = hour
+        self.bookings_started = 0
+        self.bookings_ended = 0
+        self.revenue = 0.0
+        self.occupied_seconds = 0.0
+
+    def __repr__(self):
+        return f'<LotHourlyStats Lot {self.parking_lot_id} {self.hour}>'
+
+
+def _utc_naive(timestamp):
+    """Timestamps are stored as naive UTC; normalise aware ones to match."""
+    if timestamp.tzinfo is not None and timestamp.tzinfo.utcoffset(timestamp) is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def hour_start(timestamp):
+    return _utc_naive(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+def hourly_overlap(start, end):
+    """Yield (hour, seconds) for every hour the interval [start, end) covers."""
+    start, end = _utc_naive(start), _utc_naive(end)
+    hour = hour_start(start)
+    while hour < end:
+        next_hour = hour + timedelta(hours=1)
+        yield hour, (min(end, next_hour) - max(start, hour)).total_seconds()
+        hour = next_hour
+
+
+def _hourly_row(lot_id, hour, rows=None):
+    key = (lot_id, hour)
+    if rows is not None and key in rows:
+        return rows[key]
+    row = db.session.get(LotHourlyStats, key)
+    if row is None:
+        row = LotHourlyStats(lot_id, hour)
+        db.session.add(row)
+    if rows is not None:
+        rows[key] = row
+    return row
+
+
+def record_booking_started(lot_id, parking_timestamp):
+    """Count a new booking in its lot's hourly rollup (caller's transaction)."""
+    _hourly_row(lot_id, hour_start(parking_timestamp)).bookings_started += 1
+
+
+def record_booking_ended(lot_id, parking_timestamp, leaving_timestamp, revenue, rows=None):
+    """Add a finished booking's end, revenue and occupied time to the rollups.
+
+    Call it once per booking, only after the conditional UPDATE that moved
+    the booking from active to completed changed its row; otherwise two
+    concurrent releases would both count it. Callers ending many bookings at
+    once pass the same ``rows`` dict to every call so each hourly row is
+    looked up only once.
+    """
+    end_row = _hourly_row(lot_id, hour_start(leaving_timestamp), rows)
+    end_row.bookings_ended += 1
+    end_row.revenue += revenue
+    for hour, seconds in hourly_overlap(parking_timestamp, leaving_timestamp):
+        _hourly_row(lot_id, hour, rows).occupied_seconds += seconds
+
+
+def record_revenue_correction(lot_id, leaving_timestamp, amount):
+    _hourly_row(lot_id, hour_start(leaving_timestamp)).revenue += amount
+
+
+def rebuild_lot_hourly_stats(start, end, lot_id=None):
+    """Recompute the rollups for the hours in [start, end) from raw bookings.
+
+    Existing rows in the range are replaced, so this both backfills and
+    repairs drift. ``start`` and ``end`` are naive UTC datetimes. The caller
+    commits. Returns the number of rows written.
+    """
+    from models.booking import Booking
+    from models.parking_spot import ParkingSpot
+
+    start, end = hour_start(start), hour_start(end)
+    stale = LotHourlyStats.query.filter(LotHourlyStats.hour >= start, LotHourlyStats.hour < end)
+    if lot_id is not None:
+        stale = stale.filter(LotHourlyStats.parking_lot_id == lot_id)
+    stale.delete(synchronize_session=False)
+
+    rows = {}
+    hour_key = '%Y-%m-%d %H:00:00'
+
+    def lot_query(*columns):
+        query = db.session.query(ParkingSpot.parking_lot_id, *columns).join(
+            Booking, Booking.parking_spot_id == ParkingSpot.id
+        )
+        if lot_id is not None:
+            query = query.filter(ParkingSpot.parking_lot_id == lot_id)
+        return query
+
+    started_hour = db.func.strftime(hour_key, Booking.parking_timestamp)
+    started = lot_query(started_hour, db.func.count(Booking.id)).filter(
+        Booking.parking_timestamp >= start, Booking.parking_timestamp < end
+    ).group_by(ParkingSpot.parking_lot_id, started_hour)
+    for row_lot_id, hour, count in started:
+        _hourly_row(row_lot_id, datetime.strptime(hour, '%Y-%m-%d %H:%M:%S'), rows).bookings_started = count
+
+    ended_hour = db.func.strftime(hour_key, Booking.leaving_timestamp)
+    ended = lot_query(
+        ended_hour,
+        db.func.count(Booking.id),
+        db.func.coalesce(db.func.sum(Booking.total_cost), 0)
+    ).filter(
+        Booking.leaving_timestamp >= start, Booking.leaving_timestamp < end
+    ).group_by(ParkingSpot.parking_lot_id, ended_hour)
+    for row_lot_id, hour, count, revenue in ended:
+        row = _hourly_row(row_lot_id, datetime.strptime(hour, '%Y-%m-%d %H:%M:%S'), rows)
+        row.bookings_ended = count
+        row.revenue = revenue
+
+    # Occupied time of finished bookings overlapping the range, clipped to it
+    intervals = lot_query(Booking.parking_timestamp, Booking.leaving_timestamp).filter(
+        Booking.leaving_timestamp.isnot(None),
+        Booking.parking_timestamp < end,
+        Booking.leaving_timestamp > start
+    ).yield_per(1000)
+    for row_lot_id, parked, left in intervals:
+        for hour, seconds in hourly_overlap(max(parked, start), min(left, end)):
+            _hourly_row(row_lot_id, hour, rows).occupied_seconds += seconds
+
+    return len(rows)
+
+
+def lot_hourly_totals(start, end, bucket_format='%Y-%m-%d', lot_id=None):
+    """Sum the rollups in [start, end) into buckets keyed by strftime(bucket_format)."""
+    bucket = db.func.strftime(bucket_format, LotHourlyStats.hour)
+    query = db.session.query(
+        bucket,
+        db.func.sum(LotHourlyStats.bookings_started),
+        db.func.sum(LotHourlyStats.bookings_ended),
+        db.func.sum(LotHourlyStats.revenue),
+        db.func.sum(LotHourlyStats.occupied_seconds)
+    ).filter(
+        LotHourlyStats.hour >= hour_start(start),
+        LotHourlyStats.hour < _utc_naive(end)
+    )
+    if lot_id is not None:
+        query = query.filter(LotHourlyStats.parking_lot_id == lot_id)
+    return {
+        key: {
+            'bookings_started': started,
+            'bookings_ended': ended,
+            'revenue': revenue,
+            'occupied_seconds': occupied
+        } for key, started, ended, revenue, occupied in query.group_by(bucket)
+    }
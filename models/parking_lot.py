@@ -1,5 +1,7 @@
-from extensions import db
+from extensions import db, lot_locator
 from datetime import datetime, timezone
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 
 class ParkingLot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,10 +15,19 @@ class ParkingLot(db.Model):
     price = db.Column(db.Float, default=2.50, nullable=False)
     total_spots = db.Column(db.Integer, default=0, nullable=False)
     
+    # Grid layout the spots were generated from (row-major, entrance at spot 1)
+    num_rows = db.Column(db.Integer, nullable=True)
+    num_cols = db.Column(db.Integer, nullable=True)
+    
+    # Location for nearest-lot search (WGS84 degrees); lots without one are not indexed
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    
     # Relationships
     parking_spots = db.relationship('ParkingSpot', backref='parking_lot', lazy=True, cascade="all, delete-orphan")
     
-    def __init__(self, name, address, pin_code, price=2.50, available_spots=0, total_spots=0, postcode_level=None):
+    def __init__(self, name, address, pin_code, price=2.50, available_spots=0, total_spots=0, postcode_level=None,
+                 num_rows=None, num_cols=None, latitude=None, longitude=None):
         self.name = name
         self.address = address
         self.pin_code = pin_code
@@ -24,6 +35,10 @@ class ParkingLot(db.Model):
         self.price = price
         self.available_spots = available_spots
         self.total_spots = total_spots
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.latitude = latitude
+        self.longitude = longitude
     
     # Removed property/setter for price and total_spots. Use only real columns.
     
@@ -48,10 +63,61 @@ class ParkingLot(db.Model):
         """Get the current count of available spots"""
         return self.available_spots
     
+    @property
+    def free_spots(self):
+        """Free spots from the counters shared by all workers (no database query)"""
+        from extensions import availability_counters
+        return availability_counters.free_spots(self.id)
+    
+    @classmethod
+    def adjust_available_spots(cls, lot_id, delta):
+        """Add ``delta`` to a lot's available_spots, clamped to 0..total_spots, in one UPDATE.
+
+        The new value is computed by the database, so concurrent changes to the
+        same lot are never lost the way a read-modify-write would lose them.
+        Nothing is committed here.
+        """
+        available = db.func.max(0, db.func.coalesce(cls.available_spots, 0) + delta)
+        db.session.execute(
+            db.update(cls).where(cls.id == lot_id).values(
+                available_spots=db.case((cls.total_spots > 0, db.func.min(available, cls.total_spots)), else_=available)
+            ),
+            execution_options={'synchronize_session': False}
+        )
+
     def occupied_spots_count(self):
         """Get the current count of occupied spots"""
         from models.parking_spot import ParkingSpot
         return ParkingSpot.query.filter_by(parking_lot_id=self.id, is_available=False).count()
     
     def __repr__(self):
-        return f'<ParkingLot {self.name}>'
\ No newline at end of file
+        return f'<ParkingLot {self.name}>'
+
+
+# Columns copied into the nearest-lot index; other changes (e.g. free spot counts) don't affect it
+LOCATOR_COLUMNS = ('name', 'address', 'pin_code', 'price', 'latitude', 'longitude')
+
+
+def _changes_locator(lot):
+    attrs = inspect(lot).attrs
+    return any(attrs[name].history.has_changes() for name in LOCATOR_COLUMNS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_changed_lots(session, flush_context):
+    lots = [obj for obj in list(session.new) + list(session.deleted) if isinstance(obj, ParkingLot)]
+    lots += [obj for obj in session.dirty if isinstance(obj, ParkingLot) and _changes_locator(obj)]
+    if lots:
+        session.info['lots_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _reindex_changed_lots(session):
+    # Lots were added, edited or removed: rebuild the nearest-lot index on next use
+    if session.info.pop('lots_changed', False):
+        lot_locator.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_changed_lots(session):
+    session.info.pop('lots_changed', None)
@@ -1,8 +1,13 @@
-from extensions import db
+from extensions import db, spot_allocator
 from datetime import datetime, timezone, timezone
 
 
 class ParkingSpot(db.Model):
+    __table_args__ = (
+        # Free spots of a lot by type: allocator reloads, claims and inventory counts
+        db.Index('ix_parking_spot_lot_available_type', 'parking_lot_id', 'is_available', 'spot_type'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.String(50), nullable=False, unique=True)
     spot_number = db.Column(db.Integer, nullable=False)  # New: store the spot number as integer
@@ -26,10 +31,51 @@ class ParkingSpot(db.Model):
         return 'A' if self.is_available else 'O'
 
     def mark_occupied(self):
+        if self.is_available is not False:
+            self._availability_changed(-1)
         self.is_available = False
+        spot_allocator.discard(self.parking_lot_id, self.id)
 
     def mark_available(self):
+        if not self.is_available:
+            self._availability_changed(+1)
         self.is_available = True
+        spot_allocator.release(self)
+
+    def _availability_changed(self, delta):
+        """Keep the lot's available_spots column and the change log in step with is_available."""
+        from models.parking_lot import ParkingLot
+        from models.availability_event import record_availability_change
+        ParkingLot.adjust_available_spots(self.parking_lot_id, delta)
+        record_availability_change(self.parking_lot_id, self.spot_type, delta)
+    
+    @classmethod
+    def claim(cls, spot_id, lot_id, spot_type=None):
+        """Atomically mark a free spot as occupied and take it off the lot's counter.
+
+        The spot is only claimed if it is still available (and of ``spot_type``
+        when given), checked by the UPDATE itself rather than a prior read, so
+        two concurrent bookings can never both win. Returns False when the spot
+        was already taken. Nothing is committed here.
+        """
+        from models.parking_lot import ParkingLot
+        from models.availability_event import record_availability_change
+        conditions = [cls.id == spot_id, cls.parking_lot_id == lot_id, cls.is_available.is_(True)]
+        if spot_type is not None:
+            conditions.append(cls.spot_type == spot_type)
+        result = db.session.execute(db.update(cls).where(*conditions).values(is_available=False))
+        if result.rowcount != 1:
+            return False
+        db.session.execute(
+            db.update(ParkingLot)
+            .where(ParkingLot.id == lot_id, ParkingLot.available_spots > 0)
+            .values(available_spots=ParkingLot.available_spots - 1)
+        )
+        if spot_type is None:
+            spot_type = db.session.query(cls.spot_type).filter(cls.id == spot_id).scalar()
+        record_availability_change(lot_id, spot_type, -1)
+        spot_allocator.discard(lot_id, spot_id)
+        return True
     
     # Compatibility property for lot_id
     @property
@@ -41,22 +87,17 @@ class ParkingSpot(db.Model):
     
     def update_availability(self, is_available):
         """Update the availability of this parking spot and parent lot's available count."""
-        self.is_available = is_available
-        from models.parking_lot import ParkingLot
-        parking_lot = ParkingLot.query.get(self.parking_lot_id)
-        if parking_lot:
-            if is_available:
-                parking_lot.available_spots = min(parking_lot.available_spots + 1, len(parking_lot.parking_spots))
-            else:
-                parking_lot.available_spots = max(0, parking_lot.available_spots - 1)
-            db.session.add(parking_lot)
+        if is_available:
+            self.mark_available()
+        else:
+            self.mark_occupied()
     
     def current_booking(self):
-        """Get the current active booking for this spot if any. Returns None if no active booking exists."""
-        from models.booking import Booking
-        booking = Booking.query.filter_by(
-            parking_spot_id=self.id,
-            booking_status='active'
+        """Get the current open booking (active or admin marked) for this spot if any, else None."""
+        from models.booking import Booking, OPEN_BOOKING_STATUSES
+        booking = Booking.query.filter(
+            Booking.parking_spot_id == self.id,
+            Booking.booking_status.in_(OPEN_BOOKING_STATUSES)
         ).first()
         return booking if booking else None
     
@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 
 # Import db from extensions instead of from app
 from extensions import db, login_manager
+from services.identity_cache import USER_PREFIX, session_id
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,6 +19,10 @@ class User(db.Model, UserMixin):
     # Relationships
     bookings = db.relationship('Booking', backref='user', lazy=True, cascade="all, delete-orphan")
     vehicles = db.relationship('Vehicle', backref='owner', lazy=True, cascade="all, delete-orphan")
+    stats = db.relationship('UserStats', uselist=False, lazy=True, cascade="all, delete-orphan")
+    daily_stats = db.relationship('UserDailyStats', lazy=True, cascade="all, delete-orphan")
+    
+    is_admin = False
     
     def __init__(self, username, email, password, first_name=None, last_name=None, phone=None):
         self.username = username
@@ -38,5 +43,9 @@ class User(db.Model, UserMixin):
     def verify_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def get_id(self):
+        """Session id, typed so it never collides with an admin's id."""
+        return session_id(USER_PREFIX, self.id)
+    
     def __repr__(self):
         return f'<User {self.username}>'
\ No newline at end of file
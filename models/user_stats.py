@@ -0,0 +1,129 @@
+from extensions import db
+from datetime import datetime, timezone
+
+
+class UserStats(db.Model):
+    """Running parking totals per user, maintained as bookings are charged."""
+    __tablename__ = 'user_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    completed_bookings = db.Column(db.Integer, default=0, nullable=False)
+    total_hours = db.Column(db.Float, default=0.0, nullable=False)
+    total_spent = db.Column(db.Float, default=0.0, nullable=False)
+    updated_on = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.completed_bookings = 0
+        self.total_hours = 0.0
+        self.total_spent = 0.0
+
+    @property
+    def average_hours(self):
+        return self.total_hours / self.completed_bookings if self.completed_bookings else 0
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Stats row for a user, or an empty unsaved one if they have none yet."""
+        return db.session.get(cls, user_id) or cls(user_id)
+
+    def __repr__(self):
+        return f'<UserStats for User {self.user_id}>'
+
+
+class UserDailyStats(db.Model):
+    """Completed bookings per user, per lot and per day the parking started."""
+    __tablename__ = 'user_daily_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    parking_lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    bookings = db.Column(db.Integer, default=0, nullable=False)
+    hours = db.Column(db.Float, default=0.0, nullable=False)
+    cost = db.Column(db.Float, default=0.0, nullable=False)
+
+    def __init__(self, user_id, day, parking_lot_id):
+        self.user_id = user_id
+        self.day = day
+        self.parking_lot_id = parking_lot_id
+        self.bookings = 0
+        self.hours = 0.0
+        self.cost = 0.0
+
+    def __repr__(self):
+        return f'<UserDailyStats {self.user_id} {self.day} Lot {self.parking_lot_id}>'
+
+
+def record_booking_stats(user_id, parking_lot_id, day, hours, cost, bookings=1):
+    """Add a charged booking (or a correction to one) to both stats tables.
+
+    Runs in the caller's transaction so the totals commit or roll back
+    together with the booking itself.
+    """
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id)
+        db.session.add(stats)
+    stats.completed_bookings += bookings
+    stats.total_hours += hours
+    stats.total_spent += cost
+
+    daily = db.session.get(UserDailyStats, (user_id, day, parking_lot_id))
+    if daily is None:
+        daily = UserDailyStats(user_id, day, parking_lot_id)
+        db.session.add(daily)
+    daily.bookings += bookings
+    daily.hours += hours
+    daily.cost += cost
+
+
+def rebuild_user_stats(user_id=None):
+    """Recompute both stats tables from completed bookings.
+
+    Used to backfill existing data and to repair drift. Pass a user id to
+    rebuild a single user. The caller commits.
+    """
+    from models.booking import Booking
+    from models.parking_spot import ParkingSpot
+
+    daily_query = UserDailyStats.query
+    stats_query = UserStats.query
+    if user_id is not None:
+        daily_query = daily_query.filter_by(user_id=user_id)
+        stats_query = stats_query.filter_by(user_id=user_id)
+    daily_query.delete(synchronize_session=False)
+    stats_query.delete(synchronize_session=False)
+
+    day = db.func.date(Booking.parking_timestamp)
+    hours = (db.func.julianday(Booking.leaving_timestamp) - db.func.julianday(Booking.parking_timestamp)) * 24
+    rows = db.session.query(
+        Booking.user_id,
+        day,
+        ParkingSpot.parking_lot_id,
+        db.func.count(Booking.id),
+        db.func.sum(hours),
+        db.func.sum(db.func.coalesce(Booking.total_cost, 0))
+    ).join(
+        ParkingSpot, Booking.parking_spot_id == ParkingSpot.id
+    ).filter(
+        Booking.leaving_timestamp.isnot(None)
+    )
+    if user_id is not None:
+        rows = rows.filter(Booking.user_id == user_id)
+    rows = rows.group_by(Booking.user_id, day, ParkingSpot.parking_lot_id)
+
+    totals = {}
+    for row_user_id, row_day, lot_id, bookings, row_hours, cost in rows:
+        daily = UserDailyStats(row_user_id, datetime.strptime(row_day, '%Y-%m-%d').date(), lot_id)
+        daily.bookings, daily.hours, daily.cost = bookings, row_hours or 0.0, cost or 0.0
+        db.session.add(daily)
+
+        stats = totals.get(row_user_id)
+        if stats is None:
+            stats = totals[row_user_id] = UserStats(row_user_id)
+            db.session.add(stats)
+        stats.completed_bookings += daily.bookings
+        stats.total_hours += daily.hours
+        stats.total_spent += daily.cost
+    return len(totals)
@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 
 class Vehicle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     model = db.Column(db.String(100), nullable=False)
     license_plate = db.Column(db.String(20), nullable=False, unique=True)
     vehicle_type = db.Column(db.String(20), default='standard')  # standard, compact, SUV, electric, etc.
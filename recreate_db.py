@@ -21,6 +21,8 @@ def recreate_database():
         # Create all tables
         print("Creating all tables with current schema...")
         db.create_all()
+        from services.schema import stamp_head
+        stamp_head()
         
         # Import models to ensure they're loaded
         from models.admin import Admin
@@ -84,6 +86,10 @@ def recreate_database():
         
         db.session.commit()
         
+        # The app no longer resyncs the shared spot counters on startup
+        from extensions import availability_counters
+        availability_counters.rebuild()
+        
         print("Database recreated successfully!")
         print("Admin credentials: admin / admin123")
         print("User credentials: user@example.com / user123")
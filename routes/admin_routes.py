@@ -1,15 +1,26 @@
 # Imports (always first)
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, Response, stream_with_context, current_app
 from flask_login import login_required, login_user, logout_user, current_user
-from extensions import db
+from extensions import db, availability_counters, sql_profiler
 from models.admin import Admin
 from models.user import User
 from models.parking_lot import ParkingLot
 from models.parking_spot import ParkingSpot
 from models.booking import Booking
 from models.vehicle import Vehicle
+from models.lot_hourly_stats import lot_hourly_totals
+from services.occupancy import occupancy_timeline
+from services.lot_inventory import inventory_for
+from services.lot_locator import parse_point
+from services.sqlite_profile import sqlite_pragmas, effective_settings
+from services.lot_import import insert_spots, import_lots, LotImportAborted
+from services.spot_batch import resolve_spots, apply_spot_batch, sync_allocator, SpotBatchError
+from services.pagination import keyset_page, page_size, CursorError
 from datetime import datetime, timedelta, timezone
 from functools import wraps
+import csv
+import io
+import json
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, DecimalField, IntegerField, BooleanField, SubmitField, SelectField, TextAreaField
@@ -27,13 +38,9 @@ def admin_required(f):
             flash('Please login to access this page.', 'warning')
             return redirect(url_for('admin.login'))
 
-        if not isinstance(current_user._get_current_object(), Admin):
+        # The loaded principal already knows its type; no query needed
+        if not current_user.is_admin:
             if current_user.username == 'admin':
-                admin = Admin.query.filter_by(username='admin').first()
-                if not admin:
-                    admin = Admin(username='admin', password='admin123')
-                    db.session.add(admin)
-                    db.session.commit()
                 logout_user()
                 flash('Please login as admin again.', 'warning')
                 return redirect(url_for('admin.login'))
@@ -54,6 +61,19 @@ def edit_parking_lot(lot_id):
     lot.address = request.form.get('address')
     lot.pin_code = request.form.get('pin_code')
     lot.price = float(request.form.get('price', 0))
+    
+    # Location is optional; both blank clears it
+    latitude = request.form.get('latitude', '').strip()
+    longitude = request.form.get('longitude', '').strip()
+    if latitude or longitude:
+        point = parse_point(f'{latitude},{longitude}')
+        if point is None:
+            db.session.rollback()
+            flash('Enter a valid latitude (-90 to 90) and longitude (-180 to 180), or leave both blank.', 'danger')
+            return redirect(url_for('admin.view_parking_spots'))
+        lot.latitude, lot.longitude = point
+    else:
+        lot.latitude = lot.longitude = None
     db.session.commit()
     flash('Parking lot updated successfully!', 'success')
     return redirect(url_for('admin.view_parking_spots'))
@@ -106,6 +126,8 @@ class ParkingLotForm(FlaskForm):
     is_active = BooleanField('Active', default=True)
     num_rows = IntegerField('Number of Rows', validators=[DataRequired(), NumberRange(min=1)])
     num_cols = IntegerField('Spots per Row', validators=[DataRequired(), NumberRange(min=1)])
+    latitude = DecimalField('Latitude', places=6, validators=[Optional(), NumberRange(min=-90, max=90)])
+    longitude = DecimalField('Longitude', places=6, validators=[Optional(), NumberRange(min=-180, max=180)])
     submit = SubmitField('Add Parking Lot')
 
 # Admin login
@@ -166,9 +188,11 @@ def logout():
 def dashboard():
     # Count metrics for the dashboard
     parking_lot_count = ParkingLot.query.count()
-    total_spots = ParkingSpot.query.count()
-    available_spots = ParkingSpot.query.filter_by(is_available=True).count()
-    occupied_spots = ParkingSpot.query.filter_by(is_available=False).count()
+    # Spot counts come from the counters shared by all workers
+    inventory = availability_counters.inventory().values()
+    total_spots = sum(counts['total'] for counts in inventory)
+    available_spots = sum(counts['available'] for counts in inventory)
+    occupied_spots = sum(counts['occupied'] for counts in inventory)
     
     # Get recent activities (bookings)
     recent_activities = []
@@ -205,22 +229,18 @@ def dashboard():
         
         parking_spots.append(spot_data)
     
-    # Get charts data
-    dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7, 0, -1)]
-    
-    # Occupancy rates per day (last 7 days)
-    occupancy_rates = []
-    for date in dates:
-        # Simulate occupancy rate for now
-        # In a real application, you would calculate this from booking data
-        import random
-        occupancy_rates.append(random.randint(50, 90))
-    
-    # Revenue per day (last 7 days)
-    daily_revenue = []
-    for date in dates:
-        # Simulate daily revenue for now
-        daily_revenue.append(random.randint(500, 2000))
+    # Get charts data for the last 7 full days (UTC)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    chart_start = today - timedelta(days=7)
+    
+    # Occupancy rates per day from the booking timeline
+    timeline = occupancy_timeline(chart_start, today, bucket=timedelta(days=1))
+    dates = [day.strftime('%Y-%m-%d') for day in timeline['buckets']]
+    occupancy_rates = [round(rate, 1) for rate in timeline['occupancy_rate']]
+    
+    # Revenue per day from the hourly lot rollups
+    revenue_by_day = lot_hourly_totals(chart_start, today, '%Y-%m-%d')
+    daily_revenue = [round(revenue_by_day.get(date, {}).get('revenue') or 0, 2) for date in dates]
                       
     # Get list of users
     users = User.query.all()
@@ -267,6 +287,11 @@ def add_parking_lot():
         description = form.description.data if hasattr(form, 'description') else ''
         is_active = form.is_active.data if hasattr(form, 'is_active') else True
         postcode_level = None
+        latitude = float(form.latitude.data) if form.latitude.data is not None else None
+        longitude = float(form.longitude.data) if form.longitude.data is not None else None
+        if (latitude is None) != (longitude is None):
+            flash('Enter both latitude and longitude, or neither.', 'danger')
+            return render_template('admin/add_parking_lot.html', form=form)
         # Create the parking lot
         lot = ParkingLot(
             name=name,
@@ -275,31 +300,85 @@ def add_parking_lot():
             price=price,
             total_spots=total_spots,
             available_spots=total_spots,
-            postcode_level=postcode_level
+            postcode_level=postcode_level,
+            num_rows=num_rows,
+            num_cols=num_cols,
+            latitude=latitude,
+            longitude=longitude
         )
         db.session.add(lot)
+        db.session.flush()
+        # Generate parking spots for the lot in bulk, in the same transaction
+        insert_spots(lot.id, min(total_spots, num_rows * num_cols))
         db.session.commit()
-        # Generate parking spots for the lot
-        spot_count = 1
-        for row in range(1, num_rows + 1):
-            for col in range(1, num_cols + 1):
-                if spot_count > total_spots:
-                    break
-                spot_type = 'standard'
-                spot = ParkingSpot(
-                    lot_id=lot.id,
-                    spot_number=spot_count,
-                    spot_type=spot_type,
-                    is_available=True
-                )
-                db.session.add(spot)
-                spot_count += 1
-        db.session.commit()
+        availability_counters.reload_lots([lot.id])
         flash('Parking lot added successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/add_parking_lot.html', form=form)
 
 
+def _import_rows():
+    """Lot rows of an import request, read lazily from the upload or body.
+
+    Accepts a CSV or JSON file uploaded as ``file``, or a ``text/csv``,
+    ``application/x-ndjson`` or ``application/json`` body (a list of lots,
+    or ``{"lots": [...]}``).
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        kind = upload.filename.rsplit('.', 1)[-1].lower() if '.' in (upload.filename or '') else 'csv'
+        stream = upload.stream
+    else:
+        kind = {'application/json': 'json', 'application/x-ndjson': 'ndjson'}.get(request.mimetype, 'csv')
+        stream = request.stream
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if kind in ('ndjson', 'jsonl'):
+        return (json.loads(line) for line in text if line.strip())
+    if kind == 'json':
+        data = json.load(text)
+        return data.get('lots', []) if isinstance(data, dict) else data
+    return csv.DictReader(text)
+
+
+# Import many parking lots with their spot layouts at once
+@admin_bp.route('/api/import_lots', methods=['POST'])
+@login_required
+@admin_required
+def import_parking_lots():
+    """Create lots from CSV or JSON, one row per lot.
+
+    Columns: name, address, pin_code, price, total_spots (or num_rows and
+    num_cols), optional latitude/longitude, and ``<type>_spots`` ranges such
+    as ``disabled_spots=1-4`` or ``electric_spots=5-12,40``. Invalid rows are
+    skipped and listed in ``errors``; the rest are committed in chunks. If
+    the file turns unreadable part way, the 400 response still lists the
+    lots committed before that in ``created``.
+    """
+    try:
+        created, errors = import_lots(_import_rows())
+    except LotImportAborted as error:
+        # Unreadable part way through; the chunks committed before it are kept
+        return jsonify({
+            'status': 'error',
+            'error': f'Could not read the import: {error}',
+            'created_count': len(error.created),
+            'spot_count': sum(lot['spots'] for lot in error.created),
+            'created': error.created
+        }), 400
+    except (ValueError, csv.Error) as error:
+        # Unreadable from the start (bad encoding or JSON); nothing was created
+        db.session.rollback()
+        return jsonify({'status': 'error', 'error': f'Could not read the import: {error}'}), 400
+    
+    return jsonify({
+        'status': 'success' if not errors else 'partial',
+        'created_count': len(created),
+        'spot_count': sum(lot['spots'] for lot in created),
+        'created': created,
+        'errors': errors
+    }), 201 if created else 400
+
+
 # View all parking spots
 @admin_bp.route('/view_parking_spots')
 @login_required
@@ -307,18 +386,40 @@ def add_parking_lot():
 def view_parking_spots():
     # Get all parking lots
     lots = ParkingLot.query.all()
-    
-    # Get filter parameters
     lot_id = request.args.get('lot_id', type=int)
-    status = request.args.get('status')
-    spot_type = request.args.get('type')
+    
+    query = _filtered_spots(request.args)
+    try:
+        spots = _spot_page(query, request.args)
+    except CursorError:
+        flash('That page link is no longer valid; showing the first page.', 'warning')
+        spots = _spot_page(query, {})
+    
+    # Calculate stats over every matching spot, not just this page
+    total_spots, available_spots = _spot_summary(query)
+    occupied_spots = total_spots - available_spots
+    
+    return render_template('admin/view_parking_spots.html', 
+                          lots=lots,
+                          spots=spots,
+                          total_spots=total_spots,
+                          available_spots=available_spots,
+                          occupied_spots=occupied_spots,
+                          selected_lot_id=lot_id)
+
+
+def _filtered_spots(args):
+    """Spots matching the lot, status and type filters of the spot list."""
+    lot_id = args.get('lot_id', type=int)
+    status = args.get('status')
+    spot_type = args.get('type')
     
     # Base query
     query = ParkingSpot.query
     
     # Apply filters
     if lot_id:
-        query = query.filter_by(lot_id=lot_id)
+        query = query.filter(ParkingSpot.parking_lot_id == lot_id)
     
     if status:
         if status == 'available':
@@ -329,30 +430,29 @@ def view_parking_spots():
     if spot_type and spot_type != 'all':
         query = query.filter_by(spot_type=spot_type)
     
-    # Get spots with applied filters
-    spots = query.all()
-    
-    # Calculate stats
-    total_spots = len(spots)
-    available_spots = sum(1 for spot in spots if spot.is_available)
-    occupied_spots = total_spots - available_spots
-    
-    return render_template('admin/view_parking_spots.html', 
-                          lots=lots,
-                          spots=spots,
-                          total_spots=total_spots,
-                          available_spots=available_spots,
-                          occupied_spots=occupied_spots,
-                          selected_lot_id=lot_id)
+    return query
+
+
+def _spot_page(query, args):
+    """One page of ``query`` in id order, with each spot's lot loaded alongside."""
+    return keyset_page(query.options(db.joinedload(ParkingSpot.parking_lot)), [ParkingSpot.id],
+                       after=args.get('after'), before=args.get('before'),
+                       limit=page_size(args.get('limit')))
+
+
+def _spot_summary(query):
+    """``(total, available)`` counts of the spots matched by ``query``."""
+    total, available = query.with_entities(
+        db.func.count(ParkingSpot.id),
+        db.func.coalesce(db.func.sum(db.case((ParkingSpot.is_available, 1), else_=0)), 0)
+    ).one()
+    return total, available
 
 # View statistics
 @admin_bp.route('/statistics')
 @login_required
 @admin_required
 def statistics():
-    # Get all bookings
-    bookings = Booking.query.all()
-    
     # Get date range parameters
     start_date_str = request.args.get('start_date')
     end_date_str = request.args.get('end_date')
@@ -369,31 +469,31 @@ def statistics():
         start_date = datetime.now() - timedelta(days=30)
         end_date = datetime.now()
     
-    # Filter bookings by date range
-    filtered_bookings = [b for b in bookings if start_date <= b.parking_timestamp <= end_date]
-    
-    # Calculate statistics
-    total_bookings = len(filtered_bookings)
-    total_revenue = sum(b.total_cost or 0 for b in filtered_bookings if b.total_cost)
+    # Occupied hours of each booking, clipped to the selected range
+    # (active bookings count as occupied until the end of the range)
+    check_in = db.func.max(db.func.julianday(Booking.parking_timestamp), db.func.julianday(start_date))
+    check_out = db.func.min(
+        db.func.julianday(db.func.coalesce(Booking.leaving_timestamp, end_date)),
+        db.func.julianday(end_date)
+    )
+    occupied = db.func.max(check_out - check_in, 0) * 24
+    
+    # Calculate statistics for bookings started in the range, using the
+    # parking_timestamp index instead of loading every booking
+    total_bookings, total_revenue, occupied_hours = db.session.query(
+        db.func.count(Booking.id),
+        db.func.coalesce(db.func.sum(Booking.total_cost), 0),
+        db.func.coalesce(db.func.sum(occupied), 0)
+    ).filter(
+        Booking.parking_timestamp >= start_date,
+        Booking.parking_timestamp <= end_date
+    ).one()
     
     # Calculate occupancy rate based on filtered bookings
     total_spots = ParkingSpot.query.count()
-    if total_spots > 0 and filtered_bookings:
+    if total_spots > 0 and total_bookings:
         # Calculate total hours in the selected period
         total_hours = (end_date - start_date).total_seconds() / 3600
-        # Calculate total occupied hours from bookings
-        occupied_hours = 0
-        for b in filtered_bookings:
-            check_in = b.parking_timestamp
-            check_out = b.leaving_timestamp or end_date
-            # Only count overlap within the selected range
-            if check_in < start_date:
-                check_in = start_date
-            if check_out > end_date:
-                check_out = end_date
-            duration = (check_out - check_in).total_seconds() / 3600
-            if duration > 0:
-                occupied_hours += duration
         # Average occupancy = (total occupied hours) / (total spots * total hours) * 100
         average_occupancy = (occupied_hours / (total_spots * total_hours)) * 100 if total_hours > 0 else 0
     else:
@@ -411,9 +511,34 @@ def statistics():
 @login_required
 @admin_required
 def view_user():
-    users = User.query.all()
+    try:
+        users = _user_page(request.args)
+    except CursorError:
+        flash('That page link is no longer valid; showing the first page.', 'warning')
+        users = _user_page({})
     # Flask-WTF automatically adds csrf_token to template context when using render_template
-    return render_template('admin/view_user.html', users=users)
+    return render_template('admin/view_user.html', users=users,
+                           vehicle_counts=_vehicle_counts(users))
+
+
+def _user_page(args):
+    """One page of registered users in id order."""
+    return keyset_page(User.query, [User.id],
+                       after=args.get('after'), before=args.get('before'),
+                       limit=page_size(args.get('limit')))
+
+
+def _vehicle_counts(users):
+    """Vehicles per user for ``users``, counted in one grouped query."""
+    user_ids = [user.id for user in users]
+    if not user_ids:
+        return {}
+    return dict(db.session.query(
+        Vehicle.user_id,
+        db.func.count(Vehicle.id)
+    ).filter(
+        Vehicle.user_id.in_(user_ids)
+    ).group_by(Vehicle.user_id).all())
 
 # Delete user
 @admin_bp.route('/delete_user/<int:user_id>', methods=['POST'])
@@ -442,14 +567,16 @@ def delete_user(user_id):
 @admin_required
 def lot_stats():
     lots = ParkingLot.query.all()
+    inventory = availability_counters.inventory()
     stats = []
     
     for lot in lots:
+        counts = inventory_for(inventory, lot.id)
         stats.append({
             'name': lot.name,
             'total': lot.total_spots,
-            'available': lot.available_spots,
-            'occupied': lot.occupied_spots_count()
+            'available': counts['available'],
+            'occupied': counts['occupied']
         })
     
     return jsonify(stats)
@@ -470,8 +597,7 @@ def update_spot_status(spot_id):
                 if booking:
                     return jsonify({'success': False, 'message': 'Cannot set to maintenance. Spot is occupied.'})
             
-            spot.status = 'M'  # Maintenance
-            spot.is_available = False
+            spot.mark_occupied()
         elif data['status'] == 'available':
             # Can only set to available if not occupied
             if not spot.is_available:
@@ -479,18 +605,53 @@ def update_spot_status(spot_id):
                 if booking:
                     return jsonify({'success': False, 'message': 'Cannot set to available. Spot is occupied.'})
             
-            spot.status = 'A'  # Available
-            spot.is_available = True
+            spot.mark_available()
         
         db.session.commit()
         
-        # Update parent lot's available spots count
-        spot.parking_lot.update_available_spots()
-        
         return jsonify({'success': True})
     
     return jsonify({'success': False, 'message': 'Invalid data'})
 
+# Change the status of many spots in one transaction
+@admin_bp.route('/api/spots/batch', methods=['POST'])
+@login_required
+@admin_required
+def batch_spot_status():
+    """Release, take into maintenance or reopen many spots at once.
+
+    JSON body: ``action`` (``release``, ``maintenance`` or ``available``)
+    and either ``spot_ids`` or a ``lot_id`` with optional ``spot_numbers``
+    ranges (``"1-100,250"``) and ``spot_type``. Spots follow the rules of
+    the single-spot endpoints; each one is reported as changed, unchanged
+    or refused.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        rows = resolve_spots(
+            spot_ids=data.get('spot_ids'),
+            lot_id=data.get('lot_id'),
+            spot_numbers=data.get('spot_numbers'),
+            spot_type=data.get('spot_type')
+        )
+        results = apply_spot_batch(data.get('action'), rows)
+    except SpotBatchError as error:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(error)}), 400
+    db.session.commit()
+    sync_allocator(data['action'], rows, results)
+
+    summary = {outcome: 0 for outcome in ('changed', 'unchanged', 'refused')}
+    for result in results:
+        summary[result['result']] += 1
+    return jsonify({
+        'success': True,
+        'action': data['action'],
+        'summary': summary,
+        'total_cost': round(sum(result.get('total_cost', 0) for result in results), 2),
+        'results': results
+    })
+
 # Manually mark spot as occupied
 @admin_bp.route('/mark_spot_occupied', methods=['POST'])
 @login_required
@@ -512,18 +673,18 @@ def mark_spot_occupied():
         return redirect(url_for('admin.view_parking_spots'))
     
     # Create a manual booking (without user)
-    booking = Booking(
+    booking = Booking.reserve(
         user_id=1,  # Admin user ID or system user
         parking_spot_id=spot.id,
+        lot_id=spot.parking_lot_id,
         vehicle_reg=vehicle_reg,
         booking_status='admin_marked'
     )
     
-    db.session.add(booking)
-    
-    # Update spot status
-    spot.is_available = False
-    db.session.add(spot)
+    if not booking:
+        db.session.rollback()
+        flash('This spot is already occupied.', 'danger')
+        return redirect(url_for('admin.view_parking_spots'))
     
     db.session.commit()
     
@@ -549,42 +710,169 @@ def release_spot():
         flash('This spot is already available.', 'danger')
         return redirect(url_for('admin.view_parking_spots'))
     
-    # Find any active booking for this spot
-    booking = Booking.query.filter_by(
-        parking_spot_id=spot.id, 
-        booking_status='active'
-    ).first()
+    # Find the booking holding this spot, including one from mark_spot_occupied
+    booking = spot.current_booking()
     
     if booking:
-        # End the booking
-        booking.leaving_timestamp = datetime.now(timezone.utc)
-        booking.booking_status = 'completed'
-        booking.calculate_total_cost()
-        db.session.add(booking)
-    
-    # Update spot status
-    spot.is_available = True
-    db.session.add(spot)
+        # Ends the booking and frees the spot, unless another request just did
+        if not booking.end_booking():
+            db.session.rollback()
+            flash('This spot was already released.', 'warning')
+            return redirect(url_for('admin.view_parking_spots'))
+    else:
+        spot.mark_available()
+        db.session.add(spot)
     
     db.session.commit()
     
     flash(f'Spot {spot.spot_number} has been released and is now available.', 'success')
     return redirect(url_for('admin.view_parking_spots'))
 
+# Rows fetched from the database at a time when exporting parking data
+EXPORT_CHUNK_SIZE = 1000
+# Largest page size accepted by the keyset-paginated JSON form
+MAX_PAGE_SIZE = 1000
+
+PARKING_DATA_CSV_FIELDS = [
+    'id', 'status', 'user_id', 'user_name', 'user_email',
+    'vehicle_id', 'vehicle_model', 'license_plate', 'vehicle_type',
+    'spot_id', 'spot_number', 'lot_id', 'lot_name',
+    'check_in', 'check_out', 'duration_hours', 'amount'
+]
+
+
+def _parking_data_record(row):
+    """Format one row of the joined parking data query like the JSON API does."""
+    # Calculate duration and format timestamps
+    if row.leaving_timestamp:
+        duration_seconds = (row.leaving_timestamp - row.parking_timestamp).total_seconds()
+        duration_hours = round(duration_seconds / 3600, 2)
+    else:
+        duration_hours = None
+    
+    return {
+        'id': row.id,
+        'user': {
+            'id': row.user_id,
+            'name': f"{row.first_name} {row.last_name}" if row.user_id else None,
+            'email': row.email
+        },
+        'vehicle': {
+            'id': row.vehicle_id,
+            'model': row.model,
+            'license_plate': row.license_plate if row.vehicle_id else row.vehicle_reg,
+            'vehicle_type': row.vehicle_type
+        },
+        'parking': {
+            'spot_id': row.spot_id,
+            'spot_number': row.spot_number,
+            'lot_id': row.lot_id,
+            'lot_name': row.lot_name
+        },
+        'timestamps': {
+            'check_in': row.parking_timestamp.isoformat() if row.parking_timestamp else None,
+            'check_out': row.leaving_timestamp.isoformat() if row.leaving_timestamp else None,
+            'duration_hours': duration_hours
+        },
+        'payment': {
+            'amount': row.total_cost,
+            'status': None
+        },
+        'status': row.booking_status
+    }
+
+
+def _parking_data_csv_row(record):
+    return [
+        record['id'], record['status'],
+        record['user']['id'], record['user']['name'], record['user']['email'],
+        record['vehicle']['id'], record['vehicle']['model'],
+        record['vehicle']['license_plate'], record['vehicle']['vehicle_type'],
+        record['parking']['spot_id'], record['parking']['spot_number'],
+        record['parking']['lot_id'], record['parking']['lot_name'],
+        record['timestamps']['check_in'], record['timestamps']['check_out'],
+        record['timestamps']['duration_hours'], record['payment']['amount']
+    ]
+
+
+def _stream_parking_data(query, export_format):
+    """Yield the export body chunk by chunk while the rows are read from the database."""
+    rows = query.yield_per(EXPORT_CHUNK_SIZE)
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(PARKING_DATA_CSV_FIELDS)
+        for i, row in enumerate(rows, 1):
+            writer.writerow(_parking_data_csv_row(_parking_data_record(row)))
+            if i % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(_parking_data_record(row)))
+            if len(lines) == EXPORT_CHUNK_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
 # API endpoints for accessing parking data programmatically
 @admin_bp.route('/api/parking_data', methods=['GET'])
 @login_required
 @admin_required
 def api_parking_data():
-    """API endpoint for getting parking data."""
+    """API endpoint for getting parking data.
+
+    ``format=json`` (default) returns one JSON document; with ``limit`` it
+    returns a page of bookings after ``cursor`` (a booking id) plus the
+    ``next_cursor`` to continue from. ``format=ndjson`` and ``format=csv``
+    stream every matching booking.
+    """
     
     # Get query parameters
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     lot_id = request.args.get('lot_id')
-    
-    # Base query for bookings
-    query = db.session.query(Booking)
+    export_format = request.args.get('format', 'json')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    
+    if export_format not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': 'Invalid format. Use json, ndjson or csv'}), 400
+    
+    # One joined query instead of a lookup per booking for spot, lot, user and vehicle
+    query = db.session.query(
+        Booking.id,
+        Booking.vehicle_reg,
+        Booking.parking_timestamp,
+        Booking.leaving_timestamp,
+        Booking.total_cost,
+        Booking.booking_status,
+        User.id.label('user_id'),
+        User.first_name,
+        User.last_name,
+        User.email,
+        Vehicle.id.label('vehicle_id'),
+        Vehicle.model,
+        Vehicle.license_plate,
+        Vehicle.vehicle_type,
+        ParkingSpot.id.label('spot_id'),
+        ParkingSpot.spot_number,
+        ParkingLot.id.label('lot_id'),
+        ParkingLot.name.label('lot_name')
+    ).outerjoin(
+        User, Booking.user_id == User.id
+    ).outerjoin(
+        Vehicle, Booking.vehicle_id == Vehicle.id
+    ).outerjoin(
+        ParkingSpot, Booking.parking_spot_id == ParkingSpot.id
+    ).outerjoin(
+        ParkingLot, ParkingSpot.parking_lot_id == ParkingLot.id
+    )
     
     # Apply filters if provided
     if start_date:
@@ -606,76 +894,63 @@ def api_parking_data():
     if lot_id:
         try:
             lot_id = int(lot_id)
-            # Join with parking spot to filter by lot_id
-            query = query.join(ParkingSpot, Booking.parking_spot_id == ParkingSpot.id)\
-                         .filter(ParkingSpot.lot_id == lot_id)
+            query = query.filter(ParkingSpot.parking_lot_id == lot_id)
         except ValueError:
             return jsonify({'error': 'Invalid lot_id. Must be an integer'}), 400
     
-    # Execute query
-    bookings = query.all()
+    query = query.order_by(Booking.id)
+    
+    if export_format != 'json':
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        response = Response(stream_with_context(_stream_parking_data(query, export_format)), mimetype=mimetype)
+        if export_format == 'csv':
+            response.headers['Content-Disposition'] = 'attachment; filename=parking_data.csv'
+        return response
+    
+    if limit is None and cursor is None:
+        result = [_parking_data_record(row) for row in query.yield_per(EXPORT_CHUNK_SIZE)]
+        return jsonify({
+            'status': 'success',
+            'count': len(result),
+            'data': result
+        })
     
-    # Format results
-    result = []
-    for booking in bookings:
-        spot = ParkingSpot.query.get(booking.parking_spot_id) if booking.parking_spot_id else None
-        lot = ParkingLot.query.get(spot.lot_id) if spot else None
-        user = User.query.get(booking.user_id)
-        vehicle = Vehicle.query.get(booking.vehicle_id) if booking.vehicle_id else None
-        
-        # Calculate duration and format timestamps
-        if booking.leaving_timestamp:
-            duration_seconds = (booking.leaving_timestamp - booking.parking_timestamp).total_seconds()
-            duration_hours = round(duration_seconds / 3600, 2)
-        else:
-            duration_hours = None
-        
-        booking_data = {
-            'id': booking.id,
-            'user': {
-                'id': user.id if user else None,
-                'name': f"{user.first_name} {user.last_name}" if user else None,
-                'email': user.email if user else None
-            },
-            'vehicle': {
-                'id': vehicle.id if vehicle else None,
-                'model': vehicle.model if vehicle else None,
-                'license_plate': vehicle.license_plate if vehicle else booking.vehicle_reg,
-                'vehicle_type': vehicle.vehicle_type if vehicle else None
-            },
-            'parking': {
-                'spot_id': spot.id if spot else None,
-                'spot_number': spot.spot_number if spot else None,
-                'lot_id': lot.id if lot else None,
-                'lot_name': lot.name if lot else None
-            },
-            'timestamps': {
-                'check_in': booking.parking_timestamp.isoformat() if booking.parking_timestamp else None,
-                'check_out': booking.leaving_timestamp.isoformat() if booking.leaving_timestamp else None,
-                'duration_hours': duration_hours
-            },
-            'payment': {
-                'amount': booking.total_cost,
-                'status': booking.payment_status if hasattr(booking, 'payment_status') else None
-            },
-            'status': booking.booking_status
-        }
-        result.append(booking_data)
+    # Keyset pagination: seek past the last booking id of the previous page
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+        cursor = int(cursor) if cursor is not None else 0
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f'Invalid cursor or limit. limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
     
+    result = [_parking_data_record(row) for row in query.filter(Booking.id > cursor).limit(limit)]
     return jsonify({
         'status': 'success',
         'count': len(result),
-        'data': result
+        'data': result,
+        'next_cursor': result[-1]['id'] if len(result) == limit else None
     })
 
+# strftime format of the trend buckets and the trends key, per period
+STATS_PERIODS = {
+    'hour': ('%Y-%m-%d %H:00', 'hourly'),
+    'day': ('%Y-%m-%d', 'daily'),
+    'week': ('%Y-W%W', 'weekly'),
+    'month': ('%Y-%m', 'monthly')
+}
+
 @admin_bp.route('/api/parking_stats', methods=['GET'])
 @login_required
 @admin_required
 def api_parking_stats():
-    """API endpoint for getting parking statistics."""
+    """API endpoint for getting parking statistics.
+
+    ``period`` picks the trend buckets: hour, day, week or month.
+    """
     
     # Get query parameters
-    period = request.args.get('period', 'day')  # day, week, month
+    period = request.args.get('period', 'day')  # hour, day, week, month
     days = request.args.get('days', '30')
     lot_id = request.args.get('lot_id')
     
@@ -690,8 +965,22 @@ def api_parking_stats():
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    # Base query
-    query = db.session.query(Booking)
+    # Bucket key format and trends key for each period (anything else is monthly)
+    bucket_format, trends_key = STATS_PERIODS.get(period, STATS_PERIODS['month'])
+    bucket = db.func.strftime(bucket_format, Booking.parking_timestamp)
+    duration = (db.func.julianday(Booking.leaving_timestamp) - db.func.julianday(Booking.parking_timestamp)) * 86400
+    
+    # One aggregate query: per-bucket counts and sums, the summary adds them up
+    query = db.session.query(
+        bucket.label('bucket'),
+        db.func.count(Booking.id).label('bookings'),
+        db.func.coalesce(db.func.sum(Booking.total_cost), 0).label('revenue'),
+        db.func.sum(db.case((Booking.booking_status == 'completed', 1), else_=0)).label('completed'),
+        db.func.sum(db.case((Booking.booking_status == 'cancelled', 1), else_=0)).label('cancelled'),
+        db.func.sum(db.case((Booking.booking_status == 'active', 1), else_=0)).label('active'),
+        db.func.count(Booking.leaving_timestamp).label('finished'),
+        db.func.coalesce(db.func.sum(duration), 0).label('duration')
+    )
     
     # Filter by date range
     query = query.filter(Booking.parking_timestamp >= start_date, 
@@ -702,12 +991,12 @@ def api_parking_stats():
         try:
             lot_id = int(lot_id)
             query = query.join(ParkingSpot, Booking.parking_spot_id == ParkingSpot.id)\
-                         .filter(ParkingSpot.lot_id == lot_id)
+                         .filter(ParkingSpot.parking_lot_id == lot_id)
         except ValueError:
             return jsonify({'error': 'Invalid lot_id. Must be an integer'}), 400
     
     # Execute query
-    bookings = query.all()
+    buckets = query.group_by(bucket).order_by(bucket).all()
     
     # Initialize statistics
     stats = {
@@ -717,89 +1006,31 @@ def api_parking_stats():
             'days': days
         },
         'summary': {
-            'total_bookings': len(bookings),
-            'total_revenue': sum(booking.total_cost or 0 for booking in bookings),
-            'completed_bookings': len([b for b in bookings if b.booking_status == 'completed']),
-            'cancelled_bookings': len([b for b in bookings if b.booking_status == 'cancelled']),
-            'active_bookings': len([b for b in bookings if b.booking_status == 'active']),
+            'total_bookings': sum(b.bookings for b in buckets),
+            'total_revenue': sum(b.revenue for b in buckets),
+            'completed_bookings': sum(b.completed for b in buckets),
+            'cancelled_bookings': sum(b.cancelled for b in buckets),
+            'active_bookings': sum(b.active for b in buckets),
             'avg_booking_duration': 0
         },
         'trends': {}
     }
     
     # Calculate average duration
-    completed_bookings = [b for b in bookings if b.leaving_timestamp]
-    if completed_bookings:
-        total_duration = sum((b.leaving_timestamp - b.parking_timestamp).total_seconds() 
-                            for b in completed_bookings)
-        avg_duration_hours = (total_duration / len(completed_bookings)) / 3600
+    finished = sum(b.finished for b in buckets)
+    if finished:
+        avg_duration_hours = (sum(b.duration for b in buckets) / finished) / 3600
         stats['summary']['avg_booking_duration'] = round(avg_duration_hours, 2)
     
     # Generate time-based statistics
-    date_format = '%Y-%m-%d'
-    if period == 'day':
-        # Daily stats
-        daily_stats = {}
-        for booking in bookings:
-            day_key = booking.parking_timestamp.strftime(date_format)
-            if day_key not in daily_stats:
-                daily_stats[day_key] = {
-                    'bookings': 0,
-                    'revenue': 0,
-                    'completed': 0,
-                    'cancelled': 0
-                }
-            daily_stats[day_key]['bookings'] += 1
-            daily_stats[day_key]['revenue'] += booking.total_cost or 0
-            if booking.booking_status == 'completed':
-                daily_stats[day_key]['completed'] += 1
-            elif booking.booking_status == 'cancelled':
-                daily_stats[day_key]['cancelled'] += 1
-        
-        stats['trends']['daily'] = daily_stats
-    
-    elif period == 'week':
-        # Weekly stats
-        weekly_stats = {}
-        for booking in bookings:
-            # Get the week number and year
-            week_key = f"{booking.parking_timestamp.strftime('%Y-W%W')}"
-            if week_key not in weekly_stats:
-                weekly_stats[week_key] = {
-                    'bookings': 0,
-                    'revenue': 0,
-                    'completed': 0,
-                    'cancelled': 0
-                }
-            weekly_stats[week_key]['bookings'] += 1
-            weekly_stats[week_key]['revenue'] += booking.total_cost or 0
-            if booking.booking_status == 'completed':
-                weekly_stats[week_key]['completed'] += 1
-            elif booking.booking_status == 'cancelled':
-                weekly_stats[week_key]['cancelled'] += 1
-        
-        stats['trends']['weekly'] = weekly_stats
-    
-    else:  # month
-        # Monthly stats
-        monthly_stats = {}
-        for booking in bookings:
-            month_key = booking.parking_timestamp.strftime('%Y-%m')
-            if month_key not in monthly_stats:
-                monthly_stats[month_key] = {
-                    'bookings': 0,
-                    'revenue': 0,
-                    'completed': 0,
-                    'cancelled': 0
-                }
-            monthly_stats[month_key]['bookings'] += 1
-            monthly_stats[month_key]['revenue'] += booking.total_cost or 0
-            if booking.booking_status == 'completed':
-                monthly_stats[month_key]['completed'] += 1
-            elif booking.booking_status == 'cancelled':
-                monthly_stats[month_key]['cancelled'] += 1
-        
-        stats['trends']['monthly'] = monthly_stats
+    stats['trends'][trends_key] = {
+        b.bucket: {
+            'bookings': b.bookings,
+            'revenue': b.revenue,
+            'completed': b.completed,
+            'cancelled': b.cancelled
+        } for b in buckets
+    }
     
     # Additional statistics
     if lot_id:
@@ -807,7 +1038,7 @@ def api_parking_stats():
         lot = ParkingLot.query.get(lot_id)
         if lot:
             total_spots = lot.total_spots
-            available_spots = lot.available_spots
+            available_spots = lot.free_spots
             occupancy_rate = ((total_spots - available_spots) / total_spots * 100) if total_spots > 0 else 0
             
             stats['lot_stats'] = {
@@ -827,18 +1058,18 @@ def api_parking_stats():
 def api_parking_lots():
     """API endpoint for getting parking lot information."""
     
-    # Get all parking lots
+    # Get all parking lots and their spot counts (from the shared counters)
     parking_lots = ParkingLot.query.all()
+    inventory = availability_counters.inventory()
     
     result = []
     for lot in parking_lots:
-        # Count spots by type
-        standard_spots = ParkingSpot.query.filter_by(lot_id=lot.id, spot_type='standard').count()
-        disabled_spots = ParkingSpot.query.filter_by(lot_id=lot.id, spot_type='disabled').count()
-        electric_spots = ParkingSpot.query.filter_by(lot_id=lot.id, spot_type='electric').count()
+        counts = inventory_for(inventory, lot.id)
+        available_spots = counts['available']
         
-        # Count available spots
-        available_spots = ParkingSpot.query.filter_by(lot_id=lot.id, is_available=True).count()
+        # Count spots by type, keeping the usual types even when a lot has none
+        spot_types = dict.fromkeys(('standard', 'disabled', 'electric'), 0)
+        spot_types.update({spot_type: type_counts['total'] for spot_type, type_counts in counts['by_type'].items()})
         
         lot_data = {
             'id': lot.id,
@@ -851,10 +1082,9 @@ def api_parking_lots():
             'occupancy_rate': round(((lot.total_spots - available_spots) / lot.total_spots * 100) 
                                    if lot.total_spots > 0 else 0, 2),
             'price': lot.price,
-            'spot_types': {
-                'standard': standard_spots,
-                'disabled': disabled_spots,
-                'electric': electric_spots
+            'spot_types': spot_types,
+            'available_by_type': {
+                spot_type: type_counts['available'] for spot_type, type_counts in counts['by_type'].items()
             }
         }
         result.append(lot_data)
@@ -863,4 +1093,101 @@ def api_parking_lots():
         'status': 'success',
         'count': len(result),
         'data': result
-    })
\ No newline at end of file
+    })
+
+@admin_bp.route('/api/users', methods=['GET'])
+@login_required
+@admin_required
+def api_users():
+    """API endpoint for the registered users, one page at a time."""
+    try:
+        users = _user_page(request.args)
+    except CursorError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    
+    vehicle_counts = _vehicle_counts(users)
+    result = [{
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'phone': user.phone,
+        'registered_on': user.registered_on.isoformat() if user.registered_on else None,
+        'vehicle_count': vehicle_counts.get(user.id, 0)
+    } for user in users]
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(result),
+        'data': result,
+        'next_cursor': users.next_cursor,
+        'prev_cursor': users.prev_cursor
+    })
+
+@admin_bp.route('/api/spots', methods=['GET'])
+@login_required
+@admin_required
+def api_spots():
+    """API endpoint for the parking spots matching the spot list filters, one page at a time."""
+    query = _filtered_spots(request.args)
+    try:
+        spots = _spot_page(query, request.args)
+    except CursorError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    
+    total_spots, available_spots = _spot_summary(query)
+    result = [{
+        'id': spot.id,
+        'parking_lot_id': spot.parking_lot_id,
+        'parking_lot': spot.parking_lot.name if spot.parking_lot else None,
+        'spot_number': spot.spot_number,
+        'spot_type': spot.spot_type,
+        'is_available': spot.is_available
+    } for spot in spots]
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(result),
+        'data': result,
+        'summary': {
+            'total_spots': total_spots,
+            'available_spots': available_spots,
+            'occupied_spots': total_spots - available_spots
+        },
+        'next_cursor': spots.next_cursor,
+        'prev_cursor': spots.prev_cursor
+    })
+
+@admin_bp.route('/api/db_settings', methods=['GET'])
+@login_required
+@admin_required
+def api_db_settings():
+    """Connection profile the database actually runs with (pragmas read back from a pooled connection)."""
+    return jsonify({
+        'status': 'success',
+        'profile': current_app.config.get('SQLITE_PROFILE'),
+        'configured': sqlite_pragmas(current_app.config),
+        'effective': effective_settings(db.engine)
+    })
+
+
+# Slowest routes by database work, from the SQL profiler
+@admin_bp.route('/api/perf', methods=['GET'])
+@login_required
+@admin_required
+def api_perf():
+    """Per-endpoint query counts and database time of this worker, worst first.
+
+    ``sort`` is one of ``SqlProfiler.SORT_KEYS`` (default ``avg_db_ms``);
+    ``recent_n_plus_one`` lists the latest requests that repeated a statement.
+    Needs ``SQL_PROFILER=1``.
+    """
+    limit = min(request.args.get('limit', 20, type=int) or 20, 200)
+    try:
+        report = sql_profiler.report(request.args.get('sort', 'avg_db_ms'), limit)
+    except ValueError as error:
+        return jsonify({'status': 'error', 'error': str(error)}), 400
+    if not report['enabled']:
+        report['message'] = 'SQL profiler is off; start the app with SQL_PROFILER=1'
+    return jsonify({'status': 'success', **report})
@@ -1,13 +1,20 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, Response
 from flask_login import login_required, login_user, logout_user, current_user
-from extensions import db
+from extensions import db, spot_allocator, availability_feed, availability_counters, lot_locator, metrics
 from models.user import User
 from models.parking_lot import ParkingLot
 from models.parking_spot import ParkingSpot
 from models.booking import Booking
 from models.vehicle import Vehicle
-from datetime import datetime, timezone
+from models.user_stats import UserStats, UserDailyStats
+from services.lot_search import search_lots
+from services.lot_locator import parse_point
+from services.pagination import keyset_page, page_size, CursorError
+from datetime import datetime, timedelta, timezone
 from functools import wraps
+import json
+import queue
+import time
 # Using Flask-WTF for CSRF protection and Flask integration
 
 from flask_wtf import FlaskForm
@@ -19,8 +26,7 @@ def user_required(f):
     from functools import wraps
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        from models.admin import Admin
-        if isinstance(current_user, Admin):
+        if getattr(current_user, 'is_admin', False):
             flash('This feature is only for regular users.', 'danger')
             return redirect(url_for('admin.dashboard'))
         return f(*args, **kwargs)
@@ -28,6 +34,34 @@ def user_required(f):
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
+# Number of bookings shown in the dashboard's history tab
+DASHBOARD_HISTORY_LIMIT = 20
+# Stale allocator suggestions dropped one by one before the lot is reloaded instead
+STALE_SPOT_ATTEMPTS = 5
+
+
+def _closest_available_spot(lot_id, spot_type):
+    """Return the free spot of this type closest to the lot entrance, or None.
+
+    The allocator is per worker and may be behind the database, so the spot it
+    suggests is checked; a stale one (taken by another worker) is dropped and
+    the next one tried. Only after several stale spots in a row is the whole
+    lot reloaded.
+    """
+    for attempt in range(STALE_SPOT_ATTEMPTS + 1):
+        if attempt:
+            metrics.inc('parking_lock_retries_total', lock='spot_allocator')
+        if attempt == STALE_SPOT_ATTEMPTS:
+            spot_allocator.rebuild(lot_id)
+        spot_id = spot_allocator.best_spot(lot_id, spot_type)
+        if spot_id is None:
+            return None
+        spot = ParkingSpot.query.get(spot_id)
+        if spot and spot.is_available and spot.spot_type == spot_type:
+            return spot
+        spot_allocator.discard(lot_id, spot_id)
+    return None
+
 # Form classes
 class RegistrationForm(FlaskForm):
     first_name = StringField('First Name', validators=[DataRequired()])
@@ -208,113 +242,85 @@ def logout():
 @login_required
 @user_required
 def dashboard():
-    # Get current active booking if any
-    active_booking = Booking.query.filter_by(
+    # Get current active booking if any, with its spot and lot for the fee
+    active_booking = Booking.query.options(
+        db.joinedload(Booking.spot).joinedload(ParkingSpot.parking_lot)
+    ).filter_by(
         user_id=current_user.id, 
         booking_status='active'
     ).first()
     
-    # Get past bookings for this user
-    past_bookings = Booking.query.filter(
-        Booking.user_id == current_user.id,
-        Booking.leaving_timestamp.isnot(None)
-    ).order_by(Booking.leaving_timestamp.desc()).limit(5).all()
-    
-    # Calculate total bookings, spent, average duration and preferred location
+    # Totals come from the user's incrementally maintained stats
     total_bookings = Booking.query.filter_by(user_id=current_user.id).count()
-    
-    # Get all completed bookings
-    completed_bookings = Booking.query.filter(
-        Booking.user_id == current_user.id,
-        Booking.total_cost.isnot(None)
-    ).all()
-    
-    total_spent = sum(booking.total_cost or 0 for booking in completed_bookings)
+    stats = UserStats.for_user(current_user.id)
+    total_spent = stats.total_spent
     
     # Calculate average duration in hours
-    if completed_bookings:
-        total_hours = sum((booking.leaving_timestamp - booking.parking_timestamp).total_seconds() / 3600 
-                         for booking in completed_bookings if booking.leaving_timestamp)
-        average_duration = f"{total_hours / len(completed_bookings):.1f} hours" if completed_bookings else "0 hours"
+    if stats.completed_bookings:
+        average_duration = f"{stats.average_hours:.1f} hours"
     else:
         average_duration = "0 hours"
     
-    # Find the most used parking lot
-    lot_usage = {}
-    for booking in completed_bookings:
-        spot = ParkingSpot.query.get(booking.parking_spot_id)
-        if spot:
-            lot_id = spot.lot_id
-            lot_usage[lot_id] = lot_usage.get(lot_id, 0) + 1
-    
-    preferred_location = "None"
-    if lot_usage:
-        max_used_lot_id = max(lot_usage, key=lot_usage.get, default=None)
-        if max_used_lot_id:
-            lot = ParkingLot.query.get(max_used_lot_id)
-            if lot:
-                preferred_location = lot.name
+    # Find the most used parking lot among completed bookings
+    preferred_lot = db.session.query(ParkingLot.name).join(
+        UserDailyStats, UserDailyStats.parking_lot_id == ParkingLot.id
+    ).filter(
+        UserDailyStats.user_id == current_user.id
+    ).group_by(ParkingLot.id).order_by(
+        db.func.sum(UserDailyStats.bookings).desc(),
+        ParkingLot.id
+    ).first()
+    preferred_location = preferred_lot.name if preferred_lot else "None"
     
     # Calculate current fee for active booking
     current_fee = 0
-    if active_booking:
-        spot = ParkingSpot.query.get(active_booking.parking_spot_id)
-        if spot:
-            lot = ParkingLot.query.get(spot.lot_id)
-            if lot:
-                now = datetime.now(timezone.utc)
-                parking_time = active_booking.parking_timestamp
-                # Make both datetimes timezone-aware or naive
-                if parking_time.tzinfo is None:
-                    parking_time = parking_time.replace(tzinfo=timezone.utc)
-                duration = (now - parking_time).total_seconds() / 3600
-                current_fee = round(duration * lot.price, 2)
+    if active_booking and active_booking.spot and active_booking.spot.parking_lot:
+        lot = active_booking.spot.parking_lot
+        now = datetime.now(timezone.utc)
+        parking_time = active_booking.parking_timestamp
+        # Make both datetimes timezone-aware or naive
+        if parking_time.tzinfo is None:
+            parking_time = parking_time.replace(tzinfo=timezone.utc)
+        duration = (now - parking_time).total_seconds() / 3600
+        current_fee = round(duration * lot.price, 2)
     
     # Get user's vehicles
     vehicles = Vehicle.query.filter_by(user_id=current_user.id).all()
     
-    # Get available parking lots
-    parking_lots = ParkingLot.query.all()
-    
     # Create a booking form for the Book Parking tab
     form = BookingForm()
     
-    # Get all user's bookings for history tab
-    all_bookings = Booking.query.filter_by(user_id=current_user.id).order_by(Booking.parking_timestamp.desc()).all()
+    # Most recent bookings for the history tab; the full list lives on the history page
+    recent_bookings = Booking.query.options(
+        db.joinedload(Booking.spot).joinedload(ParkingSpot.parking_lot)
+    ).filter_by(user_id=current_user.id).order_by(
+        Booking.parking_timestamp.desc()
+    ).limit(DASHBOARD_HISTORY_LIMIT).all()
     
     # Prepare chart data (last 6 months)
-    chart_labels = []
-    chart_data = []
-    current_date = datetime.now(timezone.utc)
+    month_starts = []
+    month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     for i in range(6):
-        month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if i > 0:
-            if month_start.month == 1:
-                month_start = month_start.replace(year=month_start.year - 1, month=12)
-            else:
-                month_start = month_start.replace(month=month_start.month - 1)
-        
-        month_end = month_start
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1)
+        month_starts.insert(0, month_start)
+        if month_start.month == 1:
+            month_start = month_start.replace(year=month_start.year - 1, month=12)
         else:
-            month_end = month_start.replace(month=month_start.month + 1)
-        
-        monthly_bookings = Booking.query.filter(
-            Booking.user_id == current_user.id,
-            Booking.parking_timestamp >= month_start,
-            Booking.parking_timestamp < month_end
-        ).count()
-        
-        chart_labels.insert(0, month_start.strftime('%b %Y'))
-        chart_data.insert(0, monthly_bookings)
-        current_date = month_start
+            month_start = month_start.replace(month=month_start.month - 1)
+    
+    month_key = db.func.strftime('%Y-%m', Booking.parking_timestamp)
+    monthly_counts = dict(db.session.query(month_key, db.func.count(Booking.id)).filter(
+        Booking.user_id == current_user.id,
+        Booking.parking_timestamp >= month_starts[0].replace(tzinfo=None)
+    ).group_by(month_key).all())
+    
+    chart_labels = [m.strftime('%b %Y') for m in month_starts]
+    chart_data = [monthly_counts.get(m.strftime('%Y-%m'), 0) for m in month_starts]
     
     return render_template('user/user_dashboard.html', 
                           current_booking=active_booking,
-                          bookings=all_bookings,
+                          bookings=recent_bookings,
+                          has_more_bookings=len(recent_bookings) < total_bookings,
                           vehicles=vehicles,
-                          parking_lots=parking_lots,
                           form=form,
                           total_bookings=total_bookings,
                           total_spent=round(total_spent, 2),
@@ -334,7 +340,7 @@ def book_parking():
     
     # Get all parking lots for the dropdown
     parking_lots = ParkingLot.query.all()
-    form.parking_lot_id.choices = [(lot.id, f"{lot.name} ({lot.available_spots} spots available)") for lot in parking_lots]
+    form.parking_lot_id.choices = [(lot.id, f"{lot.name} ({lot.free_spots} spots available)") for lot in parking_lots]
 
     # Get user's vehicles for the dropdown
     user_vehicles = Vehicle.query.filter_by(user_id=current_user.id).all()
@@ -356,12 +362,9 @@ def book_parking():
         if 'spot_id' not in request.form and form.validate_on_submit():
             lot_id = form.parking_lot_id.data
             vehicle = Vehicle.query.get(form.vehicle_id.data)
-            # Filter available spots by vehicle type
-            available_spots = ParkingSpot.query.filter_by(
-                parking_lot_id=lot_id,
-                is_available=True,
-                spot_type=vehicle.vehicle_type
-            ).all()
+            # Offer the free spot for this vehicle type closest to the entrance
+            spot = _closest_available_spot(lot_id, vehicle.vehicle_type)
+            available_spots = [spot] if spot else []
 
             if not available_spots:
                 flash('No spots available in the selected parking lot for your vehicle type.', 'danger')
@@ -398,11 +401,8 @@ def book_parking():
                 if selected_lot_id and selected_vehicle_id:
                     try:
                         vehicle = Vehicle.query.get(int(selected_vehicle_id))
-                        available_spots = ParkingSpot.query.filter_by(
-                            parking_lot_id=int(selected_lot_id),
-                            is_available=True,
-                            spot_type=vehicle.vehicle_type if vehicle else None
-                        ).all() if vehicle else []
+                        spot = _closest_available_spot(int(selected_lot_id), vehicle.vehicle_type) if vehicle else None
+                        available_spots = [spot] if spot else []
                     except Exception:
                         available_spots = []
                 flash(error, 'danger')
@@ -416,21 +416,10 @@ def book_parking():
                                       selected_vehicle_id=selected_vehicle_id)
 
             try:
-                spot = ParkingSpot.query.get(spot_id)
-                vehicle = Vehicle.query.get(vehicle_id)
+                # The user's vehicles are already loaded for the form
+                vehicle = next((v for v in user_vehicles if v.id == vehicle_id), None)
 
-                if not spot or not spot.is_available:
-                    flash('Selected parking spot is not available.', 'danger')
-                    return render_template('user/book_parking.html',
-                                          form=form,
-                                          confirmation_form=confirmation_form,
-                                          parking_lots=parking_lots,
-                                          user_vehicles=user_vehicles,
-                                          available_spots=[],
-                                          selected_lot_id=lot_id,
-                                          selected_vehicle_id=vehicle_id)
-
-                if not vehicle or vehicle.user_id != current_user.id:
+                if not vehicle:
                     flash('Invalid vehicle selected.', 'danger')
                     return render_template('user/book_parking.html',
                                           form=form,
@@ -441,9 +430,19 @@ def book_parking():
                                           selected_lot_id=lot_id,
                                           selected_vehicle_id=vehicle_id)
 
-                # Backend check for spot compatibility
-                if spot.spot_type != vehicle.vehicle_type:
-                    flash('Selected spot is not compatible with your vehicle type.', 'danger')
+                # Claims the spot only if it is still free and matches the vehicle type
+                booking = Booking.reserve(
+                    user_id=current_user.id,
+                    parking_spot_id=spot_id,
+                    lot_id=lot_id,
+                    spot_type=vehicle.vehicle_type,
+                    vehicle_id=vehicle.id,
+                    vehicle_reg=vehicle.license_plate
+                )
+
+                if not booking:
+                    db.session.rollback()
+                    flash('Selected parking spot is not available.', 'danger')
                     return render_template('user/book_parking.html',
                                           form=form,
                                           confirmation_form=confirmation_form,
@@ -453,21 +452,6 @@ def book_parking():
                                           selected_lot_id=lot_id,
                                           selected_vehicle_id=vehicle_id)
 
-                booking = Booking(
-                    user_id=current_user.id,
-                    parking_spot_id=spot.id,
-                    vehicle_id=vehicle.id,
-                    vehicle_reg=vehicle.license_plate
-                )
-                spot.is_available = False
-
-                lot = ParkingLot.query.get(spot.parking_lot_id)
-                if lot:
-                    lot.available_spots = max(0, lot.available_spots - 1)
-                    db.session.add(lot)
-
-                db.session.add(booking)
-                db.session.add(spot)
                 db.session.commit()
 
                 flash('Parking spot booked successfully!', 'success')
@@ -509,7 +493,10 @@ def release_parking():
     if request.method == 'POST':
         # CSRF protection (if using Flask-WTF, this is handled automatically)
         try:
-            booking.end_booking()
+            if not booking.end_booking():
+                db.session.rollback()
+                flash('This parking was already released.', 'warning')
+                return redirect(url_for('user.dashboard'))
             db.session.commit()
             flash(f'Parking spot released successfully. Your total cost was ${booking.total_cost:.2f}', 'success')
             return redirect(url_for('user.dashboard'))
@@ -550,54 +537,77 @@ def release_parking():
 @login_required
 @user_required
 def history():
-    # Get all past bookings
-    bookings = Booking.query.filter(
-        Booking.user_id == current_user.id,
-        Booking.leaving_timestamp.isnot(None)
-    ).order_by(Booking.leaving_timestamp.desc()).all()
+    try:
+        bookings = _history_page(request.args)
+    except CursorError:
+        flash('That page link is no longer valid; showing your latest bookings.', 'warning')
+        bookings = _history_page({key: value for key, value in request.args.items()
+                                  if key not in ('after', 'before')})
     
     return render_template('user/history.html', bookings=bookings)
 
+
+def _history_page(args):
+    """One page of the current user's past bookings, newest first, as a ``Page``."""
+    # Filters from the history form; malformed dates are ignored
+    query = Booking.query.filter(
+        Booking.user_id == current_user.id,
+        Booking.leaving_timestamp.isnot(None)
+    )
+    try:
+        if args.get('start_date'):
+            query = query.filter(Booking.leaving_timestamp >= datetime.strptime(args['start_date'], '%Y-%m-%d'))
+        if args.get('end_date'):
+            end_date = datetime.strptime(args['end_date'], '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(Booking.leaving_timestamp < end_date)
+    except ValueError:
+        pass
+    if args.get('status') in ('completed', 'cancelled'):
+        query = query.filter(Booking.booking_status == args['status'])
+    
+    # Lot, spot and vehicle of every row come in the same query
+    query = query.options(
+        db.joinedload(Booking.spot).joinedload(ParkingSpot.parking_lot),
+        db.joinedload(Booking.vehicle)
+    )
+    # id breaks ties between bookings that ended in the same instant
+    return keyset_page(query, [Booking.leaving_timestamp, Booking.id],
+                       after=args.get('after'), before=args.get('before'),
+                       limit=page_size(args.get('limit')), descending=True)
+
 # View parking summary
 @user_bp.route('/summary')
 @login_required
 @user_required
 def summary():
-    # Get all completed bookings
-    completed_bookings = Booking.query.filter(
-        Booking.user_id == current_user.id,
-        Booking.leaving_timestamp.isnot(None)
-    ).all()
-    
-    # Calculate total bookings, hours, and spending
-    total_bookings = len(completed_bookings)
-    total_hours = sum((booking.leaving_timestamp - booking.parking_timestamp).total_seconds() / 3600 
-                     for booking in completed_bookings)
-    total_spent = sum(booking.total_cost or 0 for booking in completed_bookings)
-    avg_duration = total_hours / total_bookings if total_bookings > 0 else 0
+    # Totals and per-day/per-lot buckets are maintained as bookings complete
+    stats = UserStats.for_user(current_user.id)
+    total_bookings = stats.completed_bookings
+    total_hours = stats.total_hours
+    total_spent = stats.total_spent
+    avg_duration = stats.average_hours
     
     # Generate data for charts
     parking_data = {}
-    for booking in completed_bookings:
-        date_key = booking.parking_timestamp.strftime('%Y-%m-%d')
-        if date_key not in parking_data:
-            parking_data[date_key] = {'hours': 0, 'cost': 0}
-        
-        hours = (booking.leaving_timestamp - booking.parking_timestamp).total_seconds() / 3600
-        parking_data[date_key]['hours'] += hours
-        parking_data[date_key]['cost'] += booking.total_cost or 0
+    daily_rows = db.session.query(
+        UserDailyStats.day,
+        db.func.sum(UserDailyStats.hours),
+        db.func.sum(UserDailyStats.cost)
+    ).filter(
+        UserDailyStats.user_id == current_user.id
+    ).group_by(UserDailyStats.day).order_by(UserDailyStats.day).all()
+    for day, hours, cost in daily_rows:
+        parking_data[day.strftime('%Y-%m-%d')] = {'hours': hours, 'cost': cost}
     
     # Get area usage statistics
-    area_usage = {}
-    for booking in completed_bookings:
-        spot = ParkingSpot.query.get(booking.parking_spot_id)
-        if spot:
-            lot = ParkingLot.query.get(spot.lot_id)
-            if lot:
-                area_key = lot.name
-                if area_key not in area_usage:
-                    area_usage[area_key] = 0
-                area_usage[area_key] += 1
+    area_usage = dict(db.session.query(
+        ParkingLot.name,
+        db.func.sum(UserDailyStats.bookings)
+    ).join(
+        UserDailyStats, UserDailyStats.parking_lot_id == ParkingLot.id
+    ).filter(
+        UserDailyStats.user_id == current_user.id
+    ).group_by(ParkingLot.id).order_by(ParkingLot.id).all())
     
     return render_template('user/summary.html',
                           total_bookings=total_bookings,
@@ -612,43 +622,87 @@ def summary():
 @login_required
 @user_required
 def parking_stats():
-    # Get user's bookings grouped by month
-    bookings = Booking.query.filter(
-        Booking.user_id == current_user.id,
-        Booking.leaving_timestamp.isnot(None)
-    ).order_by(Booking.parking_timestamp).all()
-    
-    # Prepare data for chart
-    months = {}
-    for booking in bookings:
-        month_key = booking.parking_timestamp.strftime('%Y-%m')
-        if month_key not in months:
-            months[month_key] = {
-                'label': booking.parking_timestamp.strftime('%b %Y'),
-                'count': 0,
-                'total_cost': 0
-            }
-        months[month_key]['count'] += 1
-        months[month_key]['total_cost'] += booking.total_cost or 0
+    # Monthly totals from the user's daily stats
+    month_key = db.func.strftime('%Y-%m', UserDailyStats.day)
+    months = db.session.query(
+        month_key,
+        db.func.sum(UserDailyStats.bookings),
+        db.func.sum(UserDailyStats.cost)
+    ).filter(
+        UserDailyStats.user_id == current_user.id
+    ).group_by(month_key).order_by(month_key).all()
     
     # Convert to list for JSON response
     stats = [
         {
-            'month': data['label'],
-            'count': data['count'],
-            'total_cost': round(data['total_cost'], 2)
-        } for month_key, data in months.items()
+            'month': datetime.strptime(month, '%Y-%m').strftime('%b %Y'),
+            'count': count,
+            'total_cost': round(total_cost, 2)
+        } for month, count, total_cost in months
     ]
     
     return jsonify(stats)
 
 
+# API endpoint for the user's booking history, one page at a time
+@user_bp.route('/api/history')
+@login_required
+@user_required
+def api_history():
+    try:
+        page = _history_page(request.args)
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    bookings = []
+    for booking in page:
+        spot = booking.spot
+        vehicle = booking.vehicle
+        bookings.append({
+            'id': booking.id,
+            'parking_lot': spot.parking_lot.name if spot and spot.parking_lot else None,
+            'spot_number': spot.spot_number if spot else None,
+            'vehicle': vehicle.license_plate if vehicle else booking.vehicle_reg,
+            'check_in': booking.parking_timestamp.isoformat() if booking.parking_timestamp else None,
+            'check_out': booking.leaving_timestamp.isoformat(),
+            'total_cost': round(booking.total_cost, 2) if booking.total_cost is not None else None,
+            'status': booking.booking_status
+        })
+    
+    return jsonify({
+        'bookings': bookings,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
+
 
 
 
     # ...existing code...
 
 # Search parking lots
+# Lots returned by one nearest-lot search at most
+NEAREST_LOTS_MAX = 50
+
+
+def _nearest_lots(latitude, longitude, k, spot_type):
+    """Nearest lots with a free spot of ``spot_type`` (any type if None), as ``(LotPoint, km, counts)``."""
+    inventory = availability_counters.inventory()
+    
+    def has_free_spot(lot_id):
+        counts = inventory.get(lot_id)
+        if counts is None:
+            return False
+        if spot_type is None:
+            return counts['available'] > 0
+        type_counts = counts['by_type'].get(spot_type)
+        return type_counts is not None and type_counts['available'] > 0
+    
+    return [(point, distance, inventory[point.lot_id])
+            for point, distance in lot_locator.nearest(latitude, longitude, k, has_free_spot)]
+
+
 @user_bp.route('/search_parking')
 @login_required
 @user_required
@@ -656,24 +710,137 @@ def search_parking():
     # Get search parameters
     search_term = request.args.get('search', '')
     search_type = request.args.get('type', 'area')  # 'area' or 'pincode'
-    
-    # Perform search
+    near = request.args.get('near')
+    wants_json = request.args.get('format') == 'json'
+    
+    # Nearest lots with a free spot for the caller's vehicle: ?near=lat,lon&k=10
+    if near is not None:
+        point = parse_point(near)
+        if point is None:
+            if wants_json:
+                return jsonify({'error': 'near must be "latitude,longitude"'}), 400
+            flash('Invalid location. Use latitude,longitude.', 'danger')
+            return redirect(url_for('user.search_parking'))
+        k = max(1, min(request.args.get('k', 10, type=int) or 10, NEAREST_LOTS_MAX))
+        
+        # Spot type from the chosen vehicle (or the user's first one); no vehicle means any type
+        vehicles = Vehicle.query.filter_by(user_id=current_user.id)
+        vehicle_id = request.args.get('vehicle_id', type=int)
+        if vehicle_id is not None:
+            vehicles = vehicles.filter_by(id=vehicle_id)
+        vehicle = vehicles.order_by(Vehicle.id).first()
+        spot_type = vehicle.vehicle_type if vehicle else None
+        
+        nearest = _nearest_lots(point[0], point[1], k, spot_type)
+        if wants_json:
+            return jsonify({
+                'near': {'latitude': point[0], 'longitude': point[1]},
+                'spot_type': spot_type,
+                'lots': [{
+                    'id': lot.lot_id,
+                    'name': lot.name,
+                    'address': lot.address,
+                    'pin_code': lot.pin_code,
+                    'price': lot.price,
+                    'latitude': lot.latitude,
+                    'longitude': lot.longitude,
+                    'distance_km': round(distance, 3),
+                    'available': counts['available'],
+                    'available_by_type': {t: c['available'] for t, c in counts['by_type'].items()}
+                } for lot, distance, counts in nearest]
+            })
+        
+        lots_by_id = {lot.id: lot for lot in ParkingLot.query.filter(
+            ParkingLot.id.in_([lot.lot_id for lot, _, _ in nearest]))}
+        parking_lots = [lots_by_id[lot.lot_id] for lot, _, _ in nearest if lot.lot_id in lots_by_id]
+        return render_template('user/search_parking.html',
+                              parking_lots=parking_lots,
+                              inventory={lot.lot_id: counts for lot, _, counts in nearest},
+                              distances={lot.lot_id: distance for lot, distance, _ in nearest},
+                              near=near,
+                              spot_type=spot_type,
+                              search_term=search_term,
+                              search_type=search_type)
+    
+    # Perform search (full-text index, best matches first)
     if search_term:
-        if search_type == 'pincode':
-            parking_lots = ParkingLot.query.filter(ParkingLot.pin_code.ilike(f'%{search_term}%')).all()
-        else:  # default to area search
-            parking_lots = ParkingLot.query.filter(ParkingLot.name.ilike(f'%{search_term}%') | 
-                                                 ParkingLot.address.ilike(f'%{search_term}%')).all()
+        parking_lots = search_lots(search_term, 'pincode' if search_type == 'pincode' else 'area')
     else:
         # If no search term, return all lots
         parking_lots = ParkingLot.query.all()
     
-
-
-
-
+    # Free spots per type, kept current on the page by the availability stream
+    inventory = availability_counters.inventory([lot.id for lot in parking_lots])
     
     return render_template('user/search_parking.html', 
                           parking_lots=parking_lots,
+                          inventory=inventory,
+                          distances={},
+                          near=None,
                           search_term=search_term,
-                          search_type=search_type)
\ No newline at end of file
+                          search_type=search_type)
+
+
+# Seconds between keep-alive comments on an idle availability stream
+AVAILABILITY_KEEPALIVE_SECONDS = 15
+# Streams are closed after this long so worker threads get recycled;
+# EventSource reconnects on its own and receives a fresh snapshot
+AVAILABILITY_STREAM_SECONDS = 300
+# Clients turned away because the worker has no stream slot left retry after this long
+AVAILABILITY_BUSY_RETRY_SECONDS = 30
+
+
+def _sse(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# Live lot availability (Server-Sent Events), used by users and admins
+@user_bp.route('/api/availability_stream')
+@login_required
+def availability_stream():
+    """Stream per-lot, per-type free spot counts as they change.
+
+    Sends a ``snapshot`` event with every lot on connect, then an
+    ``availability`` event with the changed lots whenever spots are booked,
+    released or changed by an admin in any worker.
+    """
+    subscription = availability_feed.subscribe()
+    if subscription is None:
+        # Every stream slot of this worker is taken; the page keeps its
+        # rendered counts and the client tries again later
+        response = Response(f'retry: {AVAILABILITY_BUSY_RETRY_SECONDS * 1000}\n\n',
+                            status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(AVAILABILITY_BUSY_RETRY_SECONDS)
+        return response
+    try:
+        snapshot = availability_feed.snapshot()
+    except Exception:
+        availability_feed.unsubscribe(subscription)
+        raise
+    
+    def events():
+        deadline = time.monotonic() + AVAILABILITY_STREAM_SECONDS
+        try:
+            yield 'retry: 3000\n\n'
+            yield _sse('snapshot', snapshot)
+            while time.monotonic() < deadline:
+                try:
+                    item = subscription.get(timeout=AVAILABILITY_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if item is None:
+                    break
+                event_id, messages = item
+                yield _sse('availability', messages, event_id)
+        finally:
+            availability_feed.unsubscribe(subscription)
+    
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
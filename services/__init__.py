@@ -0,0 +1,2 @@
+# Application services that sit between the routes and the models.
+# Keep these free of request handling so they can be reused from scripts.
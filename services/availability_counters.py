@@ -0,0 +1,379 @@
+"""
+Spot counters shared by every worker process.
+
+Free and total spots per lot and spot type live in a small memory-mapped
+file next to the database, so all gunicorn workers on a host read and
+update the same numbers. Reads never touch the database: each process
+parses the table once per version and reuses the result until a writer
+bumps the version. Writers are serialised with a file lock and bump the
+version to an odd number while they write (a seqlock), so a reader never
+uses a half-written table.
+
+Changes are applied after the database transaction that made them commits
+(see ``record_availability_change``), so rolled back bookings never touch
+the counters. Every change carries the id of its availability event, and
+each slot remembers the newest event its database counts already include,
+so a change committed just before a reload is not counted twice. The
+database stays the source of truth: ``flask rebuild-availability-counters``
+reloads everything from it. The file grows when more lots need a slot.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from types import MappingProxyType
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MAGIC = b'PKAV'
+FORMAT_VERSION = 2
+# magic, format version, sequence (odd while a writer is busy), slots in use.
+# An unusable table only loses its magic: the sequence keeps growing across resets
+HEADER = struct.Struct('<4sIQI')
+HEADER_SIZE = 64
+# lot id, spot type (as long as ParkingSpot.spot_type allows), total spots, free spots,
+# id of the newest availability event the counts were loaded with
+SLOT = struct.Struct('<q56sqqq')
+SLOT_SIZE = SLOT.size
+# Reads retried while a writer is busy before the table is considered stuck
+READ_ATTEMPTS = 10000
+# Spot type of the slot kept for a lot without spots, so it is never looked up again
+EMPTY_LOT = ''
+
+
+class AvailabilityCounters:
+    def __init__(self, app=None, capacity=4096):
+        # Slots the file starts with; it grows past this when needed
+        self.capacity = capacity
+        self.path = None
+        self._mmap = None
+        self._file = None
+        self._pid = None
+        self._lock = threading.RLock()
+        # (sequence, parsed table) and (sequence, per-lot inventory) of this process,
+        # each swapped in as one tuple so threads never pair a version with other data
+        self._cache = (None, {})
+        self._inventory = (None, {})
+        # (sequence, lot ids that are not in the database) as of that sequence
+        self._absent = (None, frozenset())
+        self._logger = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Pick the counters file for this app's database; nothing is opened yet."""
+        self.capacity = app.config.get('AVAILABILITY_COUNTERS_CAPACITY', self.capacity)
+        path = app.config.get('AVAILABILITY_COUNTERS_PATH')
+        if not path:
+            # One file per database, so apps on different databases never share counters
+            database = str(app.config.get('SQLALCHEMY_DATABASE_URI', ''))
+            digest = hashlib.sha1(database.encode()).hexdigest()[:10]
+            path = os.path.join(app.instance_path, f'availability-{digest}.counters')
+        if path != self.path:
+            self._close()
+            self.path = path
+        self._logger = app.logger
+        app.extensions['availability_counters'] = self
+
+    def _close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._file.close()
+            self._mmap = self._file = None
+            self._cache = self._inventory = (None, {})
+
+    def _map(self, slots=0):
+        """The counters file mapped into memory, with room for at least ``slots`` slots.
+
+        A map smaller than that is replaced by a new one of the file's current
+        size, growing the file if needed. Replaced maps are not closed: threads
+        still reading them keep a valid (older) view.
+        """
+        if self._pid != os.getpid():
+            # Opened before a fork: flock only excludes separate opens, so
+            # every process needs its own handle on the file
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._mmap = self._file = None
+                    self._cache = self._inventory = (None, {})
+                    self._pid = os.getpid()
+        needed = HEADER_SIZE + max(slots, 0) * SLOT_SIZE
+        mm = self._mmap
+        if mm is None or len(mm) < needed:
+            with self._lock:
+                mm = self._mmap
+                if mm is None or len(mm) < needed:
+                    if self._file is None:
+                        self._file = open(self.path, 'a+b')
+                    current = os.fstat(self._file.fileno()).st_size
+                    size = max(current, needed, HEADER_SIZE + self.capacity * SLOT_SIZE)
+                    if current < size:
+                        self._file.truncate(size)
+                    mm = self._mmap = mmap.mmap(self._file.fileno(), size)
+        return mm
+
+    @staticmethod
+    def _capacity(mm):
+        return (len(mm) - HEADER_SIZE) // SLOT_SIZE
+
+    @staticmethod
+    def _header(mm):
+        """(sequence, slots in use), or (None, 0) while the file has never been loaded."""
+        magic, version, seq, used = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return None, 0
+        return seq, used
+
+    @staticmethod
+    def _sequence(mm):
+        """The sequence number, kept even while the table is unusable."""
+        return HEADER.unpack_from(mm, 0)[2]
+
+    @classmethod
+    def _invalidate(cls, mm):
+        """Mark the table unusable so the next read reloads it from the database."""
+        HEADER.pack_into(mm, 0, b'\0' * 4, 0, cls._sequence(mm), 0)
+
+    @staticmethod
+    def _parse(raw):
+        """``{(lot_id, spot_type): (total, free, loaded_event_id)}``"""
+        slots = {}
+        for offset in range(0, len(raw), SLOT_SIZE):
+            lot_id, spot_type, total, free, loaded = SLOT.unpack_from(raw, offset)
+            slots[(lot_id, spot_type.rstrip(b'\0').decode())] = (total, free, loaded)
+        return slots
+
+    # -- reading -------------------------------------------------------
+
+    def _read(self):
+        """Slots as ``{(lot_id, spot_type): (total, free, loaded_event_id)}``, or None if not loaded."""
+        mm = self._map()
+        for attempt in range(READ_ATTEMPTS):
+            seq, used = self._header(mm)
+            if seq is None:
+                return None
+            cached_seq, cached = self._cache
+            if seq == cached_seq:
+                return cached
+            if seq % 2:
+                # Let the writer run instead of spinning on its lock
+                time.sleep(0)
+                continue
+            if used > self._capacity(mm):
+                # Another process grew the file
+                mm = self._map(used)
+                continue
+            raw = mm[HEADER_SIZE:HEADER_SIZE + used * SLOT_SIZE]
+            if self._header(mm)[0] != seq:
+                time.sleep(0)
+                continue
+            slots = self._parse(raw)
+            self._cache = (seq, slots)
+            if attempt:
+                self._count_retries(attempt)
+            return slots
+        # A writer died half way through; reload from the database
+        self._count_retries(READ_ATTEMPTS)
+        return None
+
+    @staticmethod
+    def _count_retries(retries):
+        from extensions import metrics
+        metrics.inc('parking_lock_retries_total', retries, lock='availability_counters')
+
+    def version(self):
+        """Monotonically increasing version; changes whenever any counter changes."""
+        return self._sequence(self._map())
+
+    def _all_lots(self):
+        slots = self._read()
+        if slots is None:
+            self.rebuild()
+            slots = self._read() or {}
+        built_from, inventory = self._inventory
+        if built_from is not slots:
+            inventory = {}
+            for (lot_id, spot_type), (total, free, _loaded) in slots.items():
+                lot = inventory.setdefault(lot_id, {'total': 0, 'available': 0, 'occupied': 0, 'by_type': {}})
+                if spot_type == EMPTY_LOT:
+                    continue
+                lot['by_type'][spot_type] = {'total': total, 'available': free, 'occupied': total - free}
+                lot['total'] += total
+                lot['available'] += free
+                lot['occupied'] += total - free
+            self._inventory = (slots, inventory)
+        return inventory
+
+    def inventory(self, lot_ids=None):
+        """Spot counts keyed by lot id, in the same shape as ``lot_inventory``.
+
+        Lots the counters do not know yet are loaded from the database once;
+        lots without spots are kept with zero counts, and ids of lots that do
+        not exist are remembered until the counters next change. The returned
+        counts are shared; do not modify them. Without ``lot_ids`` a read-only
+        view of every lot is returned without copying. If the counters file
+        cannot be used, the counts come from the database instead.
+        """
+        from services.lot_inventory import lot_inventory
+        if self.path is None:
+            return lot_inventory(lot_ids)
+        try:
+            return self._inventory_from_file(lot_ids)
+        except (OSError, ValueError):
+            self._logger.exception('Availability counters unusable; counting spots in the database')
+            return lot_inventory(lot_ids)
+
+    def _inventory_from_file(self, lot_ids):
+        inventory = self._all_lots()
+        if lot_ids is None:
+            return MappingProxyType(inventory)
+        lot_ids = set(lot_ids)
+        missing = lot_ids - inventory.keys()
+        absent_seq, absent = self._absent
+        if missing and not (missing <= absent and absent_seq == self.version()):
+            self.reload_lots(missing)
+            inventory = self._all_lots()
+            self._absent = (self.version(), frozenset(lot_ids - inventory.keys()))
+        return {lot_id: inventory[lot_id] for lot_id in lot_ids if lot_id in inventory}
+
+    def free_spots(self, lot_id):
+        """Free spots of one lot, from the shared counters."""
+        counts = self.inventory([lot_id]).get(lot_id)
+        return counts['available'] if counts else 0
+
+    # -- writing -------------------------------------------------------
+
+    def _update(self, change, reset=False):
+        """Apply ``change(slots)`` to the table under the write lock.
+
+        ``slots`` is a mutable ``{(lot_id, spot_type): [total, free, loaded_event_id]}``. With
+        ``reset`` the change starts from an empty table; otherwise nothing is
+        done if the table was never loaded or a writer died mid-update, and
+        the next read reloads it from the database instead. ``change`` runs
+        under the lock, so database reads made there cannot miss a delta that
+        another writer applies meanwhile; readers keep using the old table
+        until it returns.
+        """
+        mm = self._map()
+        with _FileLock(self._lock, self._file if fcntl else None):
+            seq, used = self._header(mm)
+            intact = seq is not None and seq % 2 == 0
+            if not intact and not reset:
+                self._invalidate(mm)
+                return
+            if used > self._capacity(mm):
+                mm = self._map(used)
+            slots = {} if reset else {
+                key: list(value) for key, value in self._parse(mm[HEADER_SIZE:HEADER_SIZE + used * SLOT_SIZE]).items()
+            }
+            change(slots)
+            items = [(key, counts) for key, counts in slots.items() if counts[0] or key[1] == EMPTY_LOT]
+            if len(items) > self._capacity(mm):
+                # Room to spare, so adding lots one by one does not grow the file every time
+                mm = self._map(max(len(items), 2 * self._capacity(mm)))
+            # Odd sequence: readers wait until the new table is complete. It
+            # continues from the last one even after a reset, so no version repeats
+            busy = self._sequence(mm) + 1
+            busy += 1 - busy % 2
+            HEADER.pack_into(mm, 0, MAGIC, FORMAT_VERSION, busy, used)
+            for index, ((lot_id, spot_type), (total, free, loaded)) in enumerate(items):
+                SLOT.pack_into(mm, HEADER_SIZE + index * SLOT_SIZE, lot_id, spot_type.encode(), total, free, loaded)
+            HEADER.pack_into(mm, 0, MAGIC, FORMAT_VERSION, busy + 1, len(items))
+
+    def apply(self, deltas):
+        """Add committed ``(lot_id, spot_type, delta, event_id)`` changes to the free counts.
+
+        Changes whose event a slot's counts were loaded with are skipped.
+        Runs after commit, so it never raises: if the file cannot be updated
+        the table is dropped and reloaded from the database on the next read.
+        """
+        if self.path is None:
+            return
+
+        def change(slots):
+            for lot_id, spot_type, delta, event_id in deltas:
+                counts = slots.get((lot_id, spot_type))
+                if counts is not None and (event_id is None or event_id > counts[2]):
+                    counts[1] = max(0, min(counts[0], counts[1] + delta))
+
+        try:
+            self._update(change)
+        except Exception:
+            self._logger.exception('Could not apply availability changes; counters will be reloaded')
+            try:
+                self._invalidate(self._map())
+            except Exception:
+                pass
+
+    def reload_lots(self, lot_ids):
+        """Reload some lots from the database, e.g. after spots were added or removed."""
+        lot_ids = set(lot_ids)
+
+        def change(slots):
+            for key in [key for key in slots if key[0] in lot_ids]:
+                del slots[key]
+            _fill(slots, lot_ids)
+
+        self._update(change)
+
+    def rebuild(self):
+        """Reload every lot from the database."""
+        self._update(lambda slots: _fill(slots), reset=True)
+
+
+def _fill(slots, lot_ids=None):
+    """Add the database counts of ``lot_ids`` (every lot if None) to ``slots``."""
+    from extensions import db
+    from models.parking_lot import ParkingLot
+    from models.parking_spot import ParkingSpot
+    from models.availability_event import AvailabilityEvent
+
+    # Counts and the newest event id from one statement, i.e. one snapshot:
+    # SQLite hands out event ids in commit order, so every change with a
+    # higher id is missing from these counts and every other one is in them
+    latest_event = db.select(db.func.coalesce(db.func.max(AvailabilityEvent.id), 0)).scalar_subquery()
+    spot_type = db.func.coalesce(ParkingSpot.spot_type, 'standard')
+    query = db.session.query(
+        ParkingSpot.parking_lot_id,
+        spot_type,
+        db.func.count(ParkingSpot.id),
+        db.func.sum(db.case((db.func.coalesce(ParkingSpot.is_available, True), 1), else_=0)),
+        latest_event
+    )
+    if lot_ids is not None:
+        query = query.filter(ParkingSpot.parking_lot_id.in_(list(lot_ids)))
+    filled = set()
+    for lot_id, row_type, total, free, loaded in query.group_by(ParkingSpot.parking_lot_id, spot_type):
+        slots[(lot_id, row_type)] = [total, free, loaded]
+        filled.add(lot_id)
+    lots = db.session.query(ParkingLot.id)
+    if lot_ids is not None:
+        lots = lots.filter(ParkingLot.id.in_(list(lot_ids)))
+    for lot_id, in lots:
+        if lot_id not in filled:
+            slots[(lot_id, EMPTY_LOT)] = [0, 0, 0]
+
+
+class _FileLock:
+    """Thread lock plus an exclusive lock on the counters file."""
+
+    def __init__(self, lock, handle):
+        self._lock = lock
+        self._handle = handle
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._handle is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._handle is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
@@ -0,0 +1,168 @@
+"""
+Live lot availability feed.
+
+Each worker process runs one background thread that tails the
+``availability_event`` change log and fans new changes out to the
+Server-Sent Events streams connected to that worker. Changes committed by
+any worker show up in every worker's feed within one poll interval, without
+a message broker. Messages carry the lot's current counts next to the
+deltas, so a client that missed a message is corrected by the next one.
+"""
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class AvailabilityFeed:
+    def __init__(self, app=None, poll_interval=1.0, retention=timedelta(minutes=10), max_queue=100, max_streams=8):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.max_queue = max_queue
+        self.max_streams = max_streams
+        self._app = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+        self._last_prune = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.poll_interval = app.config.get('AVAILABILITY_FEED_POLL_SECONDS', self.poll_interval)
+        self.max_streams = app.config.get('AVAILABILITY_MAX_STREAMS', self.max_streams)
+        app.extensions['availability_feed'] = self
+
+    def subscribe(self):
+        """Register a stream and return the queue its messages are put on.
+
+        Call this before taking the snapshot sent to the new stream, so no
+        change committed in between is missed. A ``None`` on the queue means
+        the stream fell too far behind and should be closed. Returns None
+        instead of a queue when this worker already serves ``max_streams``
+        streams: each one holds a worker thread for its whole lifetime.
+        """
+        subscription = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_streams:
+                return None
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                # Start tailing the log from its current end
+                self._last_id = self._latest_event_id()
+                self._thread = threading.Thread(target=self._run, name='availability-feed', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @staticmethod
+    def _latest_event_id():
+        from extensions import db
+        from models.availability_event import AvailabilityEvent
+        return db.session.query(db.func.max(AvailabilityEvent.id)).scalar() or 0
+
+    def snapshot(self):
+        """Current counts of every lot, in the same shape as feed messages."""
+        from extensions import db, availability_counters
+        from models.parking_lot import ParkingLot
+        from services.lot_inventory import inventory_for
+
+        inventory = availability_counters.inventory()
+        return [self._lot_message(lot_id, inventory_for(inventory, lot_id))
+                for lot_id, in db.session.query(ParkingLot.id)]
+
+    @staticmethod
+    def _lot_message(lot_id, counts, changes=None):
+        message = {
+            'lot_id': lot_id,
+            'available': counts['available'],
+            'total': counts['total'],
+            'by_type': {spot_type: type_counts['available'] for spot_type, type_counts in counts['by_type'].items()}
+        }
+        if changes is not None:
+            message['changes'] = changes
+        return message
+
+    def poll(self):
+        """Read new change log rows and build one message per changed lot.
+
+        Returns ``(last_event_id, messages)``; messages is empty when nothing
+        changed. Needs an application context.
+        """
+        from extensions import db
+        from models.availability_event import AvailabilityEvent
+        from services.lot_inventory import lot_inventory, inventory_for
+
+        if self._last_id is None:
+            self._last_id = self._latest_event_id()
+            return self._last_id, []
+
+        rows = db.session.query(
+            AvailabilityEvent.id,
+            AvailabilityEvent.parking_lot_id,
+            AvailabilityEvent.spot_type,
+            AvailabilityEvent.delta
+        ).filter(AvailabilityEvent.id > self._last_id).order_by(AvailabilityEvent.id).all()
+        if not rows:
+            return self._last_id, []
+
+        changes = {}
+        for event_id, lot_id, spot_type, delta in rows:
+            lot_changes = changes.setdefault(lot_id, {})
+            lot_changes[spot_type] = lot_changes.get(spot_type, 0) + delta
+        self._last_id = rows[-1][0]
+
+        inventory = lot_inventory(changes)
+        messages = [
+            self._lot_message(lot_id, inventory_for(inventory, lot_id), lot_changes)
+            for lot_id, lot_changes in changes.items()
+        ]
+        return self._last_id, messages
+
+    def prune(self):
+        """Drop change log rows older than the retention period."""
+        from extensions import db
+        from models.availability_event import AvailabilityEvent
+
+        cutoff = datetime.utcnow() - self.retention
+        AvailabilityEvent.query.filter(AvailabilityEvent.created_on < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+
+    def publish(self, event_id, messages):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event_id, messages))
+            except queue.Full:
+                # The client stopped reading; end its stream so it reconnects
+                # and starts again from a fresh snapshot
+                self.unsubscribe(subscription)
+                while not subscription.empty():
+                    subscription.get_nowait()
+                subscription.put_nowait(None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self._last_id = None
+                    return
+            try:
+                with self._app.app_context():
+                    event_id, messages = self.poll()
+                    if time.monotonic() - self._last_prune > self.retention.total_seconds():
+                        self._last_prune = time.monotonic()
+                        self.prune()
+            except Exception:
+                self._app.logger.exception('Availability feed poll failed')
+                continue
+            if messages:
+                self.publish(event_id, messages)
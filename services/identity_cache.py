@@ -0,0 +1,79 @@
+"""
+Short-lived cache of logged-in principals for the Flask-Login user loader.
+
+Session ids carry the principal type (``a:<id>`` for admins, ``u:<id>`` for
+users), so the loader knows which table to read. The column values of each
+loaded principal are kept here for a few seconds and turned back into a
+session-bound instance without a query. Entries are dropped when the row is
+changed or deleted through the ORM in this process; other workers notice
+the change once their entry expires (``LOGIN_CACHE_SECONDS``).
+"""
+import threading
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+
+ADMIN_PREFIX = 'a'
+USER_PREFIX = 'u'
+
+
+class IdentityCache:
+    def __init__(self, app=None, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LOGIN_CACHE_SECONDS', self.ttl)
+        app.extensions['identity_cache'] = self
+
+    def get(self, model, key):
+        """A session-bound ``model`` instance for the cached key, or None on a miss."""
+        from extensions import db
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, values = entry
+        if expires < time.monotonic():
+            self.invalidate(key)
+            return None
+        instance = inspect(model).class_manager.new_instance()
+        for name, value in values.items():
+            set_committed_value(instance, name, value)
+        make_transient_to_detached(instance)
+        return db.session.merge(instance, load=False)
+
+    def put(self, key, instance):
+        if not self.ttl:
+            return
+        values = {column.key: getattr(instance, column.key) for column in inspect(type(instance)).column_attrs}
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def session_id(prefix, principal_id):
+    return f'{prefix}:{principal_id}'
+
+
+def parse_session_id(value):
+    """Split ``a:1`` / ``u:1`` into (prefix, id); plain ids from older sessions give (None, id)."""
+    prefix, _, principal_id = str(value).rpartition(':')
+    try:
+        return prefix or None, int(principal_id)
+    except ValueError:
+        return None, None
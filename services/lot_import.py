@@ -0,0 +1,205 @@
+"""
+Bulk creation of parking lots and their spots.
+
+Spots are written with one Core ``executemany`` INSERT per batch instead of
+one ORM object each, so a multi-storey lot with thousands of spots is a few
+statements in a single transaction. ``import_lots`` creates many lots from
+CSV or JSON rows in one pass, committing every few thousand spots so memory
+and transaction size stay flat however large the file is.
+
+A spot layout is the lot's spot count plus optional typed ranges, e.g.
+``{'disabled': '1-4', 'electric': '5-12,40'}``; every other spot is standard.
+"""
+import csv
+from datetime import datetime, timezone
+
+# Rows per executemany batch when inserting spots
+SPOT_INSERT_BATCH = 5000
+# An import commits once this many spots (or lots) are pending
+IMPORT_COMMIT_SPOTS = 20000
+IMPORT_COMMIT_LOTS = 200
+MAX_SPOTS_PER_LOT = 100000
+
+# Import columns named ``<type>_spots`` hold the spot ranges of that type
+TYPED_RANGE_SUFFIX = '_spots'
+NOT_SPOT_TYPES = ('total', 'available')
+
+
+class LotImportError(ValueError):
+    """A lot row that can't be imported; the message is shown to the admin."""
+
+
+class LotImportAborted(ValueError):
+    """The rows stopped being readable part way (bad encoding, CSV or JSON line).
+
+    Lots from earlier chunks are already committed and listed in ``created``;
+    the chunk being read when it failed is rolled back.
+    """
+
+    def __init__(self, error, created):
+        super().__init__(str(error))
+        self.created = created
+
+
+def parse_spot_ranges(value, total_spots):
+    """Spot numbers in ``"1-4,9"`` (or a list of numbers and ranges), checked against the lot size."""
+    if value is None or value == '':
+        return set()
+    parts = value if isinstance(value, (list, tuple)) else str(value).replace(';', ',').split(',')
+    numbers = set()
+    for part in parts:
+        text = str(part).strip()
+        if not text:
+            continue
+        try:
+            if '-' in text:
+                first, last = (int(bound) for bound in text.split('-', 1))
+            else:
+                first = last = int(text)
+        except ValueError:
+            raise LotImportError(f'Invalid spot range {text!r}')
+        if first < 1 or last > total_spots or first > last:
+            raise LotImportError(f'Spot range {text!r} is outside 1-{total_spots}')
+        numbers.update(range(first, last + 1))
+    return numbers
+
+
+def spot_layout(total_spots, typed_ranges=None):
+    """``{spot_number: spot_type}`` for the non-standard spots of a lot."""
+    types = {}
+    for spot_type, ranges in (typed_ranges or {}).items():
+        if not spot_type or len(spot_type) > 50:
+            raise LotImportError(f'Invalid spot type {spot_type!r}')
+        for number in parse_spot_ranges(ranges, total_spots):
+            if number in types:
+                raise LotImportError(f'Spot {number} is both {types[number]} and {spot_type}')
+            types[number] = spot_type
+    return types
+
+
+def insert_spots(lot_id, total_spots, spot_types=None, batch_size=SPOT_INSERT_BATCH):
+    """Insert spots 1..total_spots of a lot in the current transaction.
+
+    ``spot_types`` maps spot numbers to their type (see ``spot_layout``).
+    Nothing is committed here.
+    """
+    from extensions import db
+    from models.parking_spot import ParkingSpot
+
+    spot_types = spot_types or {}
+    table = ParkingSpot.__table__
+    created_on = datetime.now(timezone.utc)
+    for start in range(1, total_spots + 1, batch_size):
+        numbers = range(start, min(start + batch_size, total_spots + 1))
+        db.session.execute(table.insert(), [{
+            'spot_id': f'L{lot_id}-S{number}',
+            'spot_number': number,
+            'parking_lot_id': lot_id,
+            'is_available': True,
+            'spot_type': spot_types.get(number, 'standard'),
+            'created_on': created_on
+        } for number in numbers])
+
+
+def _number(row, key, cast, default=None, minimum=None):
+    value = row.get(key)
+    if value is None or str(value).strip() == '':
+        return default
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise LotImportError(f'{key} must be a number')
+    if minimum is not None and value < minimum:
+        raise LotImportError(f'{key} must be at least {minimum}')
+    return value
+
+
+def parse_lot_row(row):
+    """Validated lot fields and spot layout from one import row (a dict of strings or JSON values)."""
+    from services.lot_locator import parse_point
+
+    if not isinstance(row, dict):
+        raise LotImportError('Each lot must be an object with named fields')
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    lot = {}
+    for key in ('name', 'address', 'pin_code'):
+        value = str(row.get(key) or '').strip()
+        if not value:
+            raise LotImportError(f'{key} is required')
+        lot[key] = value
+
+    lot['price'] = _number(row, 'price', float, default=2.50, minimum=0)
+    lot['num_rows'] = _number(row, 'num_rows', int, minimum=1)
+    lot['num_cols'] = _number(row, 'num_cols', int, minimum=1)
+    grid = lot['num_rows'] * lot['num_cols'] if lot['num_rows'] and lot['num_cols'] else None
+    total_spots = _number(row, 'total_spots', int, default=grid, minimum=1)
+    if total_spots is None:
+        raise LotImportError('total_spots (or num_rows and num_cols) is required')
+    if total_spots > MAX_SPOTS_PER_LOT:
+        raise LotImportError(f'total_spots is larger than {MAX_SPOTS_PER_LOT}')
+    if grid is not None and total_spots > grid:
+        raise LotImportError(f'{total_spots} spots do not fit a {lot["num_rows"]}x{lot["num_cols"]} layout')
+    lot['total_spots'] = lot['available_spots'] = total_spots
+
+    latitude, longitude = row.get('latitude'), row.get('longitude')
+    if latitude not in (None, '') or longitude not in (None, ''):
+        point = parse_point(f'{latitude},{longitude}')
+        if point is None:
+            raise LotImportError('latitude/longitude must both be given and valid')
+        lot['latitude'], lot['longitude'] = point
+
+    typed_ranges = {
+        key[:-len(TYPED_RANGE_SUFFIX)]: value for key, value in row.items()
+        if key.endswith(TYPED_RANGE_SUFFIX) and key[:-len(TYPED_RANGE_SUFFIX)] not in NOT_SPOT_TYPES
+    }
+    # JSON rows can also group them: {"spot_types": {"disabled": "1-4"}}
+    if isinstance(row.get('spot_types'), dict):
+        typed_ranges.update(row['spot_types'])
+    return lot, spot_layout(total_spots, typed_ranges)
+
+
+def import_lots(rows):
+    """Create a lot with its spots for every valid row of ``rows``.
+
+    Rows are consumed one at a time, so a CSV reader over an upload is
+    never held in memory. Invalid rows are skipped and reported; valid ones
+    are committed in chunks. Returns ``(created, errors)`` where created
+    holds ``{'row', 'id', 'name', 'spots'}`` and errors ``{'row', 'error'}``,
+    rows numbered from 1. If reading the rows fails part way,
+    ``LotImportAborted`` is raised with the lots committed so far.
+    """
+    from extensions import db, availability_counters
+    from models.parking_lot import ParkingLot
+
+    created, errors = [], []
+    pending_lots, pending_spots = [], 0
+
+    def commit():
+        db.session.commit()
+        availability_counters.reload_lots(pending_lots)
+        pending_lots.clear()
+
+    try:
+        for number, row in enumerate(rows, start=1):
+            try:
+                fields, spot_types = parse_lot_row(row)
+            except LotImportError as error:
+                errors.append({'row': number, 'error': str(error)})
+                continue
+            lot = ParkingLot(**fields)
+            db.session.add(lot)
+            db.session.flush()
+            insert_spots(lot.id, lot.total_spots, spot_types)
+            created.append({'row': number, 'id': lot.id, 'name': lot.name, 'spots': lot.total_spots})
+            pending_lots.append(lot.id)
+            pending_spots += lot.total_spots
+            if pending_spots >= IMPORT_COMMIT_SPOTS or len(pending_lots) >= IMPORT_COMMIT_LOTS:
+                commit()
+                pending_spots = 0
+    except (ValueError, csv.Error) as error:
+        db.session.rollback()
+        uncommitted = set(pending_lots)
+        raise LotImportAborted(error, [lot for lot in created if lot['id'] not in uncommitted]) from error
+    if pending_lots:
+        commit()
+    return created, errors
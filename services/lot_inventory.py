@@ -0,0 +1,50 @@
+"""
+Spot inventory per lot.
+
+Counts every lot's spots by type and by state with a single grouped query,
+so listing endpoints cost the same whether there are 3 lots or 300. Spot
+types are whatever is stored in the table; nothing here is hard-coded.
+"""
+from extensions import db
+
+
+def _empty_inventory():
+    return {'total': 0, 'available': 0, 'occupied': 0, 'by_type': {}}
+
+
+def lot_inventory(lot_ids=None):
+    """Spot counts keyed by lot id.
+
+    Each value looks like ``{'total', 'available', 'occupied', 'by_type'}``
+    where ``by_type`` maps a spot type to its own ``{'total', 'available',
+    'occupied'}`` counts. Lots without spots are absent; use
+    ``inventory_for`` to get an empty entry for them.
+    """
+    from models.parking_spot import ParkingSpot
+
+    spot_type = db.func.coalesce(ParkingSpot.spot_type, 'standard')
+    is_available = db.func.coalesce(ParkingSpot.is_available, True)
+    query = db.session.query(
+        ParkingSpot.parking_lot_id,
+        spot_type,
+        is_available,
+        db.func.count(ParkingSpot.id)
+    )
+    if lot_ids is not None:
+        query = query.filter(ParkingSpot.parking_lot_id.in_(list(lot_ids)))
+    query = query.group_by(ParkingSpot.parking_lot_id, spot_type, is_available)
+
+    inventory = {}
+    for lot_id, row_type, available, count in query:
+        state = 'available' if available else 'occupied'
+        lot = inventory.setdefault(lot_id, _empty_inventory())
+        counts = lot['by_type'].setdefault(row_type, {'total': 0, 'available': 0, 'occupied': 0})
+        for totals in (lot, counts):
+            totals['total'] += count
+            totals[state] += count
+    return inventory
+
+
+def inventory_for(inventory, lot_id):
+    """Counts of one lot from ``lot_inventory``, all zero if it has no spots."""
+    return inventory.get(lot_id) or _empty_inventory()
@@ -0,0 +1,162 @@
+"""
+Nearest parking lots to a point.
+
+Lots with coordinates are kept in memory in a KD-tree over points on the
+unit sphere: straight-line (chord) distance between those points orders
+lots exactly like great-circle distance, without the wrap-around problems
+of plain latitude/longitude. A query walks the tree and skips lots a filter
+rejects, e.g. lots without a free spot of the caller's vehicle type, so no
+database query is needed per search.
+
+The tree is rebuilt lazily after lots are created, edited or deleted in
+this process (see the session hooks in ``models.parking_lot``); other
+workers pick such changes up once their copy is older than
+``LOT_LOCATOR_MAX_AGE_SECONDS``.
+"""
+import heapq
+import math
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def unit_vector(latitude, longitude):
+    """Point on the unit sphere for a latitude/longitude in degrees."""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(squared_chord):
+    """Great-circle distance in km for a squared chord length between unit vectors."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+def parse_point(value):
+    """``"lat,lon"`` as a (latitude, longitude) pair, or None if it is not a valid point."""
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+class LotPoint:
+    """What the index keeps about a lot: enough to answer a search without the database."""
+    __slots__ = ('lot_id', 'name', 'address', 'pin_code', 'price', 'latitude', 'longitude', 'vector')
+
+    def __init__(self, lot_id, name, address, pin_code, price, latitude, longitude):
+        self.lot_id = lot_id
+        self.name = name
+        self.address = address
+        self.pin_code = pin_code
+        self.price = price
+        self.latitude = latitude
+        self.longitude = longitude
+        self.vector = unit_vector(latitude, longitude)
+
+
+def _build(points, depth=0):
+    """KD-tree node ``(x, y, z, split, axis, point, left, right)`` over ``points``, or None."""
+    if not points:
+        return None
+    axis = depth % 3
+    points.sort(key=lambda point: point.vector[axis])
+    middle = len(points) // 2
+    point = points[middle]
+    return (
+        *point.vector,
+        point.vector[axis],
+        axis,
+        point,
+        _build(points[:middle], depth + 1),
+        _build(points[middle + 1:], depth + 1)
+    )
+
+
+class LotLocator:
+    def __init__(self, app=None, max_age=60):
+        self.max_age = max_age
+        self._tree = None
+        self._size = 0
+        self._built_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_age = app.config.get('LOT_LOCATOR_MAX_AGE_SECONDS', self.max_age)
+        app.extensions['lot_locator'] = self
+
+    def __len__(self):
+        return self._size
+
+    def invalidate(self):
+        """Rebuild the tree on the next search, e.g. after lots were added or moved."""
+        self._built_at = None
+
+    def rebuild(self):
+        """Reload every lot with coordinates from the database."""
+        from extensions import db
+        from models.parking_lot import ParkingLot
+
+        rows = db.session.query(
+            ParkingLot.id, ParkingLot.name, ParkingLot.address, ParkingLot.pin_code,
+            ParkingLot.price, ParkingLot.latitude, ParkingLot.longitude
+        ).filter(ParkingLot.latitude.isnot(None), ParkingLot.longitude.isnot(None)).all()
+        points = [LotPoint(*row) for row in rows]
+        tree = _build(points)
+        with self._lock:
+            self._tree, self._size = tree, len(points)
+            self._built_at = time.monotonic()
+
+    def _current_tree(self):
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > self.max_age:
+            self.rebuild()
+        return self._tree
+
+    def nearest(self, latitude, longitude, k=10, accept=None):
+        """Up to ``k`` ``(LotPoint, distance_km)`` pairs, closest first.
+
+        ``accept(lot_id)`` can reject lots (e.g. full ones); the walk keeps
+        going until ``k`` accepted lots are found or the tree is exhausted.
+        """
+        tree = self._current_tree()
+        if tree is None or k <= 0:
+            return []
+        qx, qy, qz = target = unit_vector(latitude, longitude)
+        # Max-heap (negated squared chord) of the best k lots so far
+        best = []
+        stack = [tree]
+        # Depth-first walk; far branches are deferred with the distance to
+        # their splitting plane and skipped once they cannot hold a closer lot
+        while stack:
+            node = stack.pop()
+            if isinstance(node, float):
+                # Plane distance marker pushed before a far branch
+                plane, far = node, stack.pop()
+                if len(best) == k and plane >= -best[0][0]:
+                    continue
+                node = far
+            while node is not None:
+                px, py, pz, split, axis, point, left, right = node
+                squared = (qx - px) * (qx - px) + (qy - py) * (qy - py) + (qz - pz) * (qz - pz)
+                if (len(best) < k or squared < -best[0][0]) and (accept is None or accept(point.lot_id)):
+                    entry = (-squared, point.lot_id, point)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    else:
+                        heapq.heapreplace(best, entry)
+                diff = target[axis] - split
+                near, far = (left, right) if diff < 0 else (right, left)
+                if far is not None:
+                    stack.append(far)
+                    stack.append(diff * diff)
+                node = near
+        best.sort(reverse=True)
+        return [(point, chord_to_km(-negated)) for negated, _, point in best]
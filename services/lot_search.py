@@ -0,0 +1,130 @@
+"""
+Full-text search over parking lots.
+
+On SQLite builds with FTS5 the lots are mirrored into an external-content
+``parking_lot_fts`` table that triggers keep in sync with ``parking_lot``,
+so every insert, update or delete is indexed, whatever code made it.
+Searches match every word of the query as a token prefix and are ranked
+with BM25, with the name weighted above the address. Without FTS5 (or on
+another database) search falls back to ``LIKE`` matching.
+"""
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# Lots returned by one search
+SEARCH_RESULT_LIMIT = 50
+# BM25 weights of the indexed columns: name, address, pin_code
+BM25_WEIGHTS = (10.0, 4.0, 2.0)
+
+FTS_TABLE = 'parking_lot_fts'
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, address, pin_code, content='parking_lot', content_rowid='id', "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+)
+FTS_TRIGGERS = {
+    'parking_lot_fts_ai': (
+        f"CREATE TRIGGER IF NOT EXISTS parking_lot_fts_ai AFTER INSERT ON parking_lot BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, address, pin_code) "
+        "VALUES (new.id, new.name, new.address, new.pin_code); END"
+    ),
+    'parking_lot_fts_ad': (
+        f"CREATE TRIGGER IF NOT EXISTS parking_lot_fts_ad AFTER DELETE ON parking_lot BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address, pin_code) "
+        "VALUES ('delete', old.id, old.name, old.address, old.pin_code); END"
+    ),
+    'parking_lot_fts_au': (
+        f"CREATE TRIGGER IF NOT EXISTS parking_lot_fts_au AFTER UPDATE OF name, address, pin_code ON parking_lot BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address, pin_code) "
+        "VALUES ('delete', old.id, old.name, old.address, old.pin_code); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, address, pin_code) "
+        "VALUES (new.id, new.name, new.address, new.pin_code); END"
+    ),
+}
+
+# Engines (by URL) where the FTS table is known to exist, or known to be unavailable
+_fts_ready = {}
+
+
+def install_lot_search(rebuild=False):
+    """Create the FTS table and its triggers if missing; returns True when FTS5 is usable.
+
+    The index is rebuilt from ``parking_lot`` whenever a trigger had to be
+    (re)created, e.g. on first install or after the lots table was dropped,
+    or when ``rebuild`` is set.
+    """
+    from extensions import db
+
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        _fts_ready[str(engine.url)] = False
+        return False
+    try:
+        with engine.begin() as connection:
+            existing = {row[0] for row in connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'parking_lot_fts%'")
+            )}
+            connection.execute(text(FTS_DDL))
+            for name, ddl in FTS_TRIGGERS.items():
+                connection.execute(text(ddl))
+            if rebuild or FTS_TABLE not in existing or not existing.issuperset(FTS_TRIGGERS):
+                connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except OperationalError:
+        # SQLite built without FTS5
+        _fts_ready[str(engine.url)] = False
+        return False
+    _fts_ready[str(engine.url)] = True
+    return True
+
+
+def _fts_available():
+    from extensions import db
+
+    key = str(db.engine.url)
+    if key not in _fts_ready:
+        if db.engine.dialect.name != 'sqlite':
+            _fts_ready[key] = False
+        else:
+            _fts_ready[key] = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+            ).first() is not None
+    return _fts_ready[key]
+
+
+def _match_expression(search_term, search_type):
+    """FTS5 query matching every word as a prefix, or None if there are no words."""
+    words = re.findall(r'\w+', search_term)
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"*' for word in words)
+    columns = 'pin_code' if search_type == 'pincode' else '{name address}'
+    return f'{columns} : ({terms})'
+
+
+def search_lots(search_term, search_type='area', limit=SEARCH_RESULT_LIMIT):
+    """Parking lots matching ``search_term``, best match first.
+
+    ``search_type`` is ``'area'`` (name and address) or ``'pincode'``.
+    """
+    from extensions import db
+    from models.parking_lot import ParkingLot
+
+    match = _match_expression(search_term, search_type)
+    if match is not None and _fts_available():
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        lot_ids = [row[0] for row in db.session.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+                 f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit"),
+            {'match': match, 'limit': limit}
+        )]
+        lots = {lot.id: lot for lot in ParkingLot.query.filter(ParkingLot.id.in_(lot_ids))} if lot_ids else {}
+        return [lots[lot_id] for lot_id in lot_ids if lot_id in lots]
+
+    # Fallback: substring match, as before FTS5
+    if search_type == 'pincode':
+        condition = ParkingLot.pin_code.ilike(f'%{search_term}%')
+    else:
+        condition = ParkingLot.name.ilike(f'%{search_term}%') | ParkingLot.address.ilike(f'%{search_term}%')
+    return ParkingLot.query.filter(condition).order_by(ParkingLot.name).limit(limit).all()
@@ -0,0 +1,444 @@
+"""
+Runtime metrics in the Prometheus text format, served at ``/metrics``.
+
+Every worker keeps its counters and histograms in memory; recording a
+request is a few dict updates under a lock. A background thread of each
+worker writes its totals to ``worker-<pid>.json`` in the shared metrics
+directory every ``METRICS_FLUSH_SECONDS`` if anything changed (and on
+exit, and before the worker answers a scrape), and a
+scrape adds up the files of all workers on the host, so any worker can
+answer for all of them. Files of workers that exited are folded into
+``retired.json`` so counters never go backwards when gunicorn recycles a
+worker. Availability gauges are read from the shared spot counters at
+scrape time.
+
+What is recorded:
+
+* latency, database time and statement count per request, by endpoint
+* template render time, by template
+* committed bookings and releases, and bookings lost to a concurrent one
+* retries after a lost race (stale allocator suggestions, busy counter
+  reads) and SQLite "database is locked" errors
+* free and total spots per lot and spot type
+"""
+import atexit
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+# Worker files are rewritten at most this often
+FLUSH_SECONDS = 5.0
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'parking_http_request_duration_seconds': (
+        'histogram', 'Time to handle a request, by endpoint, method and status.', LATENCY_BUCKETS),
+    'parking_http_request_db_seconds': (
+        'histogram', 'Database time spent in a request, by endpoint.', LATENCY_BUCKETS),
+    'parking_http_request_queries': (
+        'histogram', 'SQL statements run by a request, by endpoint.', QUERY_BUCKETS),
+    'parking_template_render_seconds': (
+        'histogram', 'Time to render a template, by template.', LATENCY_BUCKETS),
+    'parking_bookings_total': ('counter', 'Bookings committed.', None),
+    'parking_booking_conflicts_total': ('counter', 'Bookings refused because the spot was taken first.', None),
+    'parking_releases_total': ('counter', 'Bookings ended and charged.', None),
+    'parking_lock_retries_total': ('counter', 'Retries after a lost race or a busy lock, by lock.', None),
+    'parking_db_lock_errors_total': ('counter', 'Statements that failed with "database is locked".', None),
+    'parking_lot_free_spots': ('gauge', 'Free spots, by lot and spot type.', None),
+    'parking_lot_total_spots': ('gauge', 'Spots, by lot and spot type.', None),
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def count_on_commit(name, amount=1, **labels):
+    """Add to a counter once the current transaction commits; a rollback drops it."""
+    from extensions import db
+    db.session.info.setdefault('metrics', []).append((name, _labels(labels), amount))
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = FLUSH_SECONDS
+        self.token = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._flusher_pid = None
+        self._dirty = False
+        self._exit_hook = False
+        # (name, labels): value for counters, per-bucket counts plus +Inf and the sum for histograms
+        self._counters = {}
+        self._histograms = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Hook into the app's requests, templates and engine unless ``METRICS`` is off."""
+        app.extensions['metrics'] = self
+        self.enabled = bool(app.config.get('METRICS', True))
+        if not self.enabled:
+            return
+        self.flush_interval = app.config.get('METRICS_FLUSH_SECONDS', self.flush_interval)
+        self.token = app.config.get('METRICS_TOKEN')
+        directory = app.config.get('METRICS_DIR')
+        if not directory:
+            # One directory per database, like the availability counters
+            database = str(app.config.get('SQLALCHEMY_DATABASE_URI', ''))
+            digest = hashlib.sha1(database.encode()).hexdigest()[:10]
+            directory = os.path.join(app.instance_path, f'metrics-{digest}')
+        self.directory = directory
+
+        from flask import before_render_template, template_rendered
+        from extensions import db
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._drop_request)
+        app.add_url_rule('/metrics', 'metrics', self._serve)
+        if not self._exit_hook:
+            # A worker stopped by gunicorn keeps what it recorded since its last flush
+            atexit.register(self._flush_at_exit)
+            self._exit_hook = True
+
+    # -- recording -----------------------------------------------------
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._observe(name, _labels(labels), value)
+
+    def _observe(self, name, labels, value):
+        # Caller holds the lock
+        key = (name, labels)
+        series = self._histograms.get(key)
+        if series is None:
+            series = self._histograms[key] = [0] * (len(METRICS[name][2]) + 1) + [0.0]
+        series[bisect_left(METRICS[name][2], value)] += 1
+        series[-1] += value
+        self._dirty = True
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'started', None) is not None:
+            conn.info['metrics_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('metrics_started', None)
+        if started is not None and getattr(self._local, 'started', None) is not None:
+            self._local.db_seconds += time.perf_counter() - started
+            self._local.queries += 1
+
+    def _handle_error(self, context):
+        if 'database is locked' in str(context.original_exception):
+            self.inc('parking_db_lock_errors_total')
+
+    def _before_render(self, sender, template, context, **extra):
+        rendering = getattr(self._local, 'rendering', None)
+        if rendering is None:
+            rendering = self._local.rendering = []
+        rendering.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        rendering = getattr(self._local, 'rendering', None)
+        if rendering:
+            self.observe('parking_template_render_seconds', time.perf_counter() - rendering.pop(),
+                         template=template.name or '<string>')
+
+    def _start_request(self):
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+        self._local.started = time.perf_counter()
+        self._local.db_seconds = 0.0
+        self._local.queries = 0
+
+    def _finish_request(self, response):
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        local.started = None
+        current = request._get_current_object()
+        # Label tuples built in sorted order, as _labels() would
+        endpoint = (('endpoint', current.endpoint or '<unmatched>'),)
+        with self._lock:
+            self._observe('parking_http_request_duration_seconds',
+                          endpoint + (('method', current.method), ('status', response.status_code)), elapsed)
+            self._observe('parking_http_request_db_seconds', endpoint, local.db_seconds)
+            self._observe('parking_http_request_queries', endpoint, local.queries)
+        return response
+
+    def _drop_request(self, exc=None):
+        # A request that failed before after_request must not leak into the next one
+        self._local.started = None
+        self._local.rendering = []
+
+    def apply_committed(self, changes):
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, labels, amount in changes:
+                key = (name, labels)
+                self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+
+    # -- sharing between workers -----------------------------------------
+
+    def _start_flusher(self):
+        with self._lock:
+            pid = os.getpid()
+            if self._flusher_pid == pid:
+                return
+            if self._pid != pid:
+                # Forked from a process that had recorded: its numbers are in its own file
+                self._pid = pid
+                self._counters, self._histograms = {}, {}
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+    def _snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(series)] for (name, labels), series in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this worker's totals to its file in the metrics directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'worker-{os.getpid()}.json')
+        self._write(path, self._snapshot())
+
+    def _flush_at_exit(self):
+        if self.enabled and self._pid == os.getpid() and (self._counters or self._histograms):
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _write(path, state):
+        # Per thread: the flusher and an exiting or scraped worker may write at once
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(state, handle)
+        os.replace(temporary, path)
+
+    def _locked(self, exclusive):
+        return _DirectoryLock(os.path.join(self.directory, '.lock'), exclusive)
+
+    def _retire_exited_workers(self):
+        """Fold the files of workers that are gone into ``retired.json``."""
+        if fcntl is None:
+            return
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.json')):
+            pid = int(os.path.basename(path)[len('worker-'):-len('.json')])
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                exited.append(path)
+            except PermissionError:
+                pass
+        if not exited:
+            return
+        with self._locked(exclusive=True):
+            # A concurrent scrape may have retired them while we waited for the lock
+            exited = [path for path in exited if os.path.exists(path)]
+            if not exited:
+                return
+            retired = os.path.join(self.directory, 'retired.json')
+            totals = _Totals()
+            for path in [retired] + exited:
+                totals.add_file(path)
+            self._write(retired, totals.as_state())
+            for path in exited:
+                os.remove(path)
+
+    def collect(self):
+        """All workers' series added up, as ``_Totals``."""
+        self.flush()
+        self._retire_exited_workers()
+        totals = _Totals()
+        with self._locked(exclusive=False):
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                totals.add_file(path)
+        return totals
+
+    # -- exposition ------------------------------------------------------
+
+    def render(self):
+        """The Prometheus text exposition of every worker's metrics and the spot gauges."""
+        totals = self.collect()
+        gauges = self._gauges()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for labels, value in sorted(totals.counters.get(name, {}).items()):
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            elif kind == 'histogram':
+                for labels, series in sorted(totals.histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), series):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(series[-1])}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+            else:
+                for labels, value in gauges.get(name, ()):
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _gauges():
+        """Current spot counts from the counters shared by all workers."""
+        from extensions import availability_counters
+        free, total = [], []
+        for lot_id, counts in sorted(availability_counters.inventory().items()):
+            for spot_type, by_type in sorted(counts['by_type'].items()):
+                labels = (('lot_id', lot_id), ('spot_type', spot_type))
+                free.append((labels, by_type['available']))
+                total.append((labels, by_type['total']))
+        return {'parking_lot_free_spots': free, 'parking_lot_total_spots': total}
+
+    def _serve(self):
+        from flask import Response, abort, current_app
+        if not self.token:
+            # Without a token only local debug and test runs may scrape
+            if not (current_app.debug or current_app.testing):
+                abort(404)
+        elif request.headers.get('Authorization') != f'Bearer {self.token}':
+            abort(401)
+        return Response(self.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+
+class _Totals:
+    """Series of several workers added up."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def add_file(self, path):
+        try:
+            with open(path) as handle:
+                state = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            # Gone (retired meanwhile) or never written completely
+            return
+        for name, labels, value in state['counters']:
+            series = self.counters.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            series[key] = series.get(key, 0) + value
+        for name, labels, values in state['histograms']:
+            series = self.histograms.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            if key in series:
+                series[key] = [a + b for a, b in zip(series[key], values)]
+            else:
+                series[key] = values
+
+    def as_state(self):
+        return {
+            'counters': [[name, labels, value] for name, series in self.counters.items()
+                         for labels, value in series.items()],
+            'histograms': [[name, labels, values] for name, series in self.histograms.items()
+                           for labels, values in series.items()],
+        }
+
+
+class _DirectoryLock:
+    """Exclusive lock for retiring worker files, shared for reading them."""
+
+    def __init__(self, path, exclusive):
+        self._path = path
+        self._exclusive = exclusive
+        self._handle = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._handle = open(self._path, 'a')
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX if self._exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if self._handle is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+
+
+@event.listens_for(Session, 'after_commit')
+def _count_committed(session):
+    changes = session.info.pop('metrics', None)
+    if changes:
+        from extensions import metrics
+        metrics.apply_committed(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back(session):
+    session.info.pop('metrics', None)
@@ -0,0 +1,110 @@
+"""
+Keyset (seek) pagination for long lists.
+
+A page is found by where it starts, not by how many rows come before it:
+the next page of ``ORDER BY k1, k2`` is ``WHERE (k1, k2) > (last k1, last
+k2) LIMIT n``, which an index on the sort keys answers without reading the
+rows before it. The thousandth page costs what the first does, and rows
+added or deleted meanwhile never shift a page by a row. The last sort key
+must be unique (the primary key) so the order is total.
+
+Cursors are the sort key values of a page's first or last row, packed into
+an opaque URL-safe string for ``?after=`` / ``?before=``.
+"""
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class CursorError(ValueError):
+    """A cursor that is malformed or was made for another sort order."""
+
+
+def encode_cursor(values):
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """The sort key values in ``cursor``; raises ``CursorError`` unless it holds ``size`` of them."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise CursorError('Invalid cursor')
+        return [datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value for value in payload]
+    except (ValueError, TypeError, KeyError) as exc:
+        raise CursorError('Invalid cursor') from exc
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """``?limit=`` clamped to 1..MAX_PAGE_SIZE."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_page(query, order_by, after=None, before=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """One page of an entity ``query`` sorted by the ``order_by`` columns.
+
+    ``after`` / ``before`` are the ``next_cursor`` / ``prev_cursor`` of the
+    page the caller came from; without either the first page is returned.
+    All columns sort the same way (``descending``) and the last one must be
+    unique. Runs one query of ``limit + 1`` rows.
+    """
+    from extensions import db
+
+    if after and before:
+        raise CursorError('Pass either after or before, not both')
+    backwards = bool(before)
+    cursor = before if backwards else after
+    key = db.tuple_(*order_by)
+    if cursor:
+        values = decode_cursor(cursor, len(order_by))
+        bound = db.tuple_(*[db.literal(value, column.type) for value, column in zip(values, order_by)])
+        # Forwards in an ascending sort means larger keys; every flip reverses that
+        query = query.filter(key < bound if descending != backwards else key > bound)
+    newest_first = descending != backwards
+    query = query.order_by(*[column.desc() if newest_first else column.asc() for column in order_by])
+
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def row_cursor(row):
+        return encode_cursor([getattr(row, column.key) for column in order_by])
+
+    # A page reached from a cursor has rows on the side it came from
+    has_next = more if not backwards else True
+    has_prev = more if backwards else bool(cursor)
+    return Page(
+        rows,
+        next_cursor=row_cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=row_cursor(rows[0]) if rows and has_prev else None,
+    )
@@ -0,0 +1,120 @@
+"""
+Alembic bookkeeping for the app.
+
+Schema changes are Alembic revisions under ``migrations/`` (run them with
+``alembic upgrade head``). A database the app creates from scratch with
+``db.create_all()`` already matches the latest revision, so it is stamped
+with it instead of being migrated. A database created before Alembic was
+added is brought to the first revision, stamped with it and then migrated,
+so the later revisions (indexes included) still run on it.
+"""
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALEMBIC_INI = os.path.join(PROJECT_ROOT, 'alembic.ini')
+# The schema of databases created before Alembic; later revisions build on it
+BASELINE_REVISION = '0001'
+
+
+class SchemaError(RuntimeError):
+    """The database cannot be migrated automatically; the message says what to do."""
+
+
+def alembic_config(connection=None):
+    """Alembic config for this project, optionally running on an open connection."""
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option('script_location', os.path.join(PROJECT_ROOT, 'migrations'))
+    if connection is not None:
+        config.attributes['connection'] = connection
+    return config
+
+
+def stamp_head():
+    """Record the app's database as being at the latest revision."""
+    from alembic import command
+    from extensions import db
+
+    with db.engine.begin() as connection:
+        command.stamp(alembic_config(connection), 'head')
+
+
+def baseline_schema():
+    """Tables of ``BASELINE_REVISION``, reflected from a scratch in-memory database."""
+    from alembic import command
+    from extensions import db
+
+    engine = db.create_engine('sqlite://')
+    try:
+        with engine.begin() as connection:
+            command.upgrade(alembic_config(connection), BASELINE_REVISION)
+        metadata = db.MetaData()
+        metadata.reflect(engine)
+    finally:
+        engine.dispose()
+    metadata.remove(metadata.tables['alembic_version'])
+    return metadata
+
+
+def adopt_unversioned(connection):
+    """Bring a database without Alembic history to ``BASELINE_REVISION``, stamp it and upgrade.
+
+    Missing tables and indexes of that revision are created. Missing columns
+    are not: the ``add_*.py`` scripts add them and fill in their values, so
+    ``SchemaError`` lists them instead and nothing is changed.
+    """
+    from alembic import command
+    from extensions import db
+
+    baseline = baseline_schema()
+    inspector = db.inspect(connection)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in baseline.sorted_tables:
+        if table.name in existing:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            missing += [f'{table.name}.{column.name}' for column in table.columns if column.name not in columns]
+    if missing:
+        raise SchemaError(
+            f"Database has no migration history and lacks column(s) {', '.join(missing)}. "
+            "Run the add_*.py scripts to add them, then run `flask init-db` again."
+        )
+    
+    for table in baseline.sorted_tables:
+        if table.name not in existing:
+            table.create(connection)
+            continue
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
+    config = alembic_config(connection)
+    command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, 'head')
+
+
+def init_database():
+    """Bring the app's database to the latest schema; returns what was done.
+
+    ``'created'``: a new database was created from the models and stamped.
+    ``'upgraded'``: a versioned database was migrated with ``alembic upgrade head``.
+    ``'adopted'``: a database created before Alembic was completed to the
+    first revision, stamped with it and migrated (see ``adopt_unversioned``).
+    """
+    from alembic import command
+    from extensions import db
+    import models  # noqa: F401 - registers every table
+
+    inspector = db.inspect(db.engine)
+    if not inspector.has_table('booking'):
+        db.create_all()
+        stamp_head()
+        return 'created'
+    if inspector.has_table('alembic_version'):
+        with db.engine.begin() as connection:
+            command.upgrade(alembic_config(connection), 'head')
+        return 'upgraded'
+    with db.engine.begin() as connection:
+        adopt_unversioned(connection)
+    return 'adopted'
@@ -0,0 +1,59 @@
+"""
+Default accounts and a sample lot for a fresh installation.
+
+Run with ``flask --app wsgi seed``; it used to run inside ``create_app()``
+on every worker boot. Every record is only created if it is missing, so
+seeding an existing database is safe.
+"""
+
+SAMPLE_LOT_SPOTS = 10
+# Spot types of the sample lot; the other spots are standard
+SAMPLE_SPOT_TYPES = {1: 'disabled', 2: 'electric'}
+
+
+def seed_defaults():
+    """Create the admin, the test user and a sample lot if missing; returns what was created."""
+    from extensions import db
+    from models.admin import Admin
+    from models.user import User
+    from models.parking_lot import ParkingLot
+    from services.lot_import import insert_spots
+
+    created = []
+    if not Admin.query.filter_by(username='admin').first():
+        db.session.add(Admin(username='admin', password='admin123'))
+        created.append('admin user (admin / admin123)')
+
+    # Test user for development
+    if not User.query.filter_by(username='user').first():
+        db.session.add(User(
+            username='user',
+            email='user@example.com',
+            password='user123',
+            first_name='Test',
+            last_name='User',
+            phone='1234567890'
+        ))
+        created.append('test user (user / user123)')
+
+    lot_id = None
+    if not ParkingLot.query.first():
+        lot = ParkingLot(
+            name='Main Street Parking',
+            address='123 Main Street',
+            pin_code='10001',
+            price=2.50,
+            total_spots=SAMPLE_LOT_SPOTS,
+            available_spots=SAMPLE_LOT_SPOTS
+        )
+        db.session.add(lot)
+        db.session.flush()
+        insert_spots(lot.id, SAMPLE_LOT_SPOTS, SAMPLE_SPOT_TYPES)
+        lot_id = lot.id
+        created.append(f'sample parking lot with {SAMPLE_LOT_SPOTS} spots')
+    db.session.commit()
+
+    if lot_id is not None:
+        from extensions import availability_counters
+        availability_counters.reload_lots([lot_id])
+    return created
@@ -0,0 +1,152 @@
+import heapq
+import threading
+
+
+def entrance_distance(spot_number, num_cols=None):
+    """Distance of a spot from the lot entrance.
+
+    Spots are laid out row by row exactly like the admin layout preview, with
+    the entrance next to spot 1. Without a known layout we fall back to the
+    spot number itself so allocation order stays deterministic.
+    """
+    if not num_cols:
+        return spot_number
+    row, col = divmod(spot_number - 1, num_cols)
+    return row + col
+
+
+class LotAllocator:
+    """Free spots of a single lot, one min-heap per spot type."""
+
+    def __init__(self, lot_id, num_cols=None):
+        self.lot_id = lot_id
+        self.num_cols = num_cols
+        self._heaps = {}
+        # spot id -> spot type for every spot currently considered free.
+        # Heap entries that are no longer in here are skipped lazily.
+        self._free = {}
+        # spot type -> free spots the shared counters reported when a reload
+        # found none of that type; no point reloading until they report more
+        self.exhausted = {}
+
+    def push(self, spot_id, spot_number, spot_type):
+        self.exhausted.pop(spot_type, None)
+        if self._free.get(spot_id) == spot_type:
+            return
+        self._free[spot_id] = spot_type
+        entry = (entrance_distance(spot_number, self.num_cols), spot_number, spot_id)
+        heapq.heappush(self._heaps.setdefault(spot_type, []), entry)
+
+    def discard(self, spot_id):
+        self._free.pop(spot_id, None)
+
+    def _prune(self, spot_type):
+        heap = self._heaps.get(spot_type)
+        while heap and self._free.get(heap[0][2]) != spot_type:
+            heapq.heappop(heap)
+        return heap
+
+    def peek(self, spot_type):
+        """Return the id of the closest free spot of this type without taking it."""
+        heap = self._prune(spot_type)
+        return heap[0][2] if heap else None
+
+    def free_count(self, spot_type=None):
+        if spot_type is None:
+            return len(self._free)
+        return sum(1 for t in self._free.values() if t == spot_type)
+
+
+class SpotAllocator:
+    """Per-lot allocator handing out the free spot closest to the entrance.
+
+    The database stays the source of truth: the allocator is only a hint of
+    which spot to try next. Every gunicorn worker keeps its own copy, so a
+    spot handed out here may already have been taken by another worker.
+    Callers must still claim the spot in the database (``ParkingSpot.claim``);
+    an empty heap is reloaded from the database before we give up on a lot,
+    but only once until a spot is released here or the shared availability
+    counters show another worker freed one, so a full lot (or a type it does
+    not have) costs no database query per request.
+    """
+
+    def __init__(self, app=None):
+        self._lots = {}
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['spot_allocator'] = self
+
+    def rebuild(self, lot_id=None):
+        """Reload free spots from the database, for one lot or for all of them."""
+        from extensions import db
+        from models.parking_lot import ParkingLot
+        from models.parking_spot import ParkingSpot
+
+        lot_query = db.session.query(ParkingLot.id, ParkingLot.num_cols)
+        spot_query = db.session.query(
+            ParkingSpot.id,
+            ParkingSpot.spot_number,
+            ParkingSpot.spot_type,
+            ParkingSpot.parking_lot_id
+        ).filter(ParkingSpot.is_available.is_(True))
+        if lot_id is not None:
+            lot_query = lot_query.filter(ParkingLot.id == lot_id)
+            spot_query = spot_query.filter(ParkingSpot.parking_lot_id == lot_id)
+
+        lots = {row.id: LotAllocator(row.id, row.num_cols) for row in lot_query}
+        for row in spot_query:
+            allocator = lots.get(row.parking_lot_id)
+            if allocator:
+                allocator.push(row.id, row.spot_number, row.spot_type)
+
+        with self._lock:
+            if lot_id is None:
+                self._lots = lots
+            elif lot_id in lots:
+                self._lots[lot_id] = lots[lot_id]
+            else:
+                self._lots.pop(lot_id, None)
+
+    def _lot(self, lot_id, spot_type=None):
+        allocator = self._lots.get(lot_id)
+        if allocator is not None and (spot_type is None or allocator.peek(spot_type) is not None):
+            return allocator
+        free = _free_spots(lot_id, spot_type) if spot_type is not None else None
+        if allocator is not None and spot_type in allocator.exhausted and free <= allocator.exhausted[spot_type]:
+            return allocator
+        self.rebuild(lot_id)
+        allocator = self._lots.get(lot_id)
+        if allocator is not None and spot_type is not None and allocator.peek(spot_type) is None:
+            allocator.exhausted[spot_type] = free
+        return allocator
+
+    def best_spot(self, lot_id, spot_type):
+        """Id of the free spot of ``spot_type`` closest to the entrance, or None."""
+        with self._lock:
+            allocator = self._lot(lot_id, spot_type)
+            return allocator.peek(spot_type) if allocator else None
+
+    def discard(self, lot_id, spot_id):
+        """Forget a spot that is no longer free (booked, occupied or in maintenance)."""
+        with self._lock:
+            allocator = self._lots.get(lot_id)
+            if allocator:
+                allocator.discard(spot_id)
+
+    def release(self, spot):
+        """Put a spot that became free back into its lot's heap."""
+        with self._lock:
+            allocator = self._lots.get(spot.parking_lot_id)
+            if allocator:
+                allocator.push(spot.id, spot.spot_number, spot.spot_type)
+
+
+def _free_spots(lot_id, spot_type):
+    """Free spots of one type in a lot, from the availability counters shared by all workers."""
+    from extensions import availability_counters
+    counts = availability_counters.inventory([lot_id]).get(lot_id)
+    type_counts = counts['by_type'].get(spot_type) if counts else None
+    return type_counts['available'] if type_counts else 0
@@ -0,0 +1,260 @@
+"""
+Spot status changes for many spots at once.
+
+The admin batch endpoint changes a list of spots, a range of spot numbers in
+a lot, or a whole lot with a handful of set-based statements in one
+transaction, instead of one request, one ``current_booking()`` query and one
+commit per spot. Each action keeps the rules of its single-spot endpoint:
+
+- ``release``: end the open booking (if any; active or admin marked) of
+  occupied spots, charge it, and free the spot (``release_spot``)
+- ``maintenance``: take free spots out of service; spots with an open
+  booking are refused (``update_spot_status``)
+- ``available``: put spots back in service unless they have an open booking
+
+The spot UPDATEs are conditional on the current state, so a spot booked or
+released concurrently is reported instead of being changed twice.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+
+ACTIONS = ('release', 'maintenance', 'available')
+# Largest number of spots one batch may touch
+MAX_BATCH_SPOTS = 50000
+# Ids per IN (...) list, well below SQLite's bound parameter limit
+ID_CHUNK = 5000
+
+
+class SpotBatchError(ValueError):
+    """The batch request itself is invalid (unknown action, no spots, too many spots)."""
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK):
+        yield ids[start:start + ID_CHUNK]
+
+
+def resolve_spots(spot_ids=None, lot_id=None, spot_numbers=None, spot_type=None):
+    """Rows ``(id, spot_number, spot_type, parking_lot_id, is_available)`` of the targeted spots.
+
+    Either a list of spot ids, or a lot with optional spot number ranges
+    (``"1-100,250"``) and spot type.
+    """
+    from extensions import db
+    from models.parking_spot import ParkingSpot
+    from services.lot_import import parse_spot_ranges, LotImportError
+
+    columns = (ParkingSpot.id, ParkingSpot.spot_number, ParkingSpot.spot_type,
+               ParkingSpot.parking_lot_id, ParkingSpot.is_available)
+    if spot_ids:
+        # A string is iterable too: "78" would otherwise become spots 7 and 8
+        if not isinstance(spot_ids, (list, tuple)):
+            raise SpotBatchError('spot_ids must be a list of spot ids')
+        try:
+            spot_ids = {int(spot_id) for spot_id in spot_ids}
+        except (TypeError, ValueError):
+            raise SpotBatchError('spot_ids must be a list of spot ids')
+        if len(spot_ids) > MAX_BATCH_SPOTS:
+            raise SpotBatchError(f'A batch can change at most {MAX_BATCH_SPOTS} spots')
+        rows = []
+        for chunk in _chunks(spot_ids):
+            rows.extend(db.session.query(*columns).filter(ParkingSpot.id.in_(chunk)))
+        return sorted(rows, key=lambda row: row.id)
+    if lot_id is None:
+        raise SpotBatchError('Give spot_ids, or a lot_id with optional spot_numbers')
+
+    query = db.session.query(*columns).filter(ParkingSpot.parking_lot_id == lot_id)
+    if spot_numbers:
+        try:
+            numbers = parse_spot_ranges(spot_numbers, MAX_BATCH_SPOTS)
+        except LotImportError as error:
+            raise SpotBatchError(str(error))
+        query = query.filter(ParkingSpot.spot_number.in_(numbers))
+    if spot_type:
+        query = query.filter(ParkingSpot.spot_type == spot_type)
+    rows = query.order_by(ParkingSpot.spot_number).limit(MAX_BATCH_SPOTS + 1).all()
+    if len(rows) > MAX_BATCH_SPOTS:
+        raise SpotBatchError(f'A batch can change at most {MAX_BATCH_SPOTS} spots')
+    return rows
+
+
+def _flip(spot_ids, is_available, unless_booked=False):
+    """Set is_available on spots currently in the opposite state; returns the ids changed."""
+    from extensions import db
+    from models.booking import Booking, OPEN_BOOKING_STATUSES
+    from models.parking_spot import ParkingSpot
+
+    changed = set()
+    for chunk in _chunks(spot_ids):
+        conditions = [ParkingSpot.id.in_(chunk), ParkingSpot.is_available.is_(not is_available)]
+        if unless_booked:
+            conditions.append(~db.session.query(Booking.id).filter(
+                Booking.parking_spot_id == ParkingSpot.id, Booking.booking_status.in_(OPEN_BOOKING_STATUSES)
+            ).exists())
+        result = db.session.execute(
+            db.update(ParkingSpot).where(*conditions).values(is_available=is_available)
+            .returning(ParkingSpot.id),
+            execution_options={'synchronize_session': False}
+        )
+        changed.update(spot_id for spot_id, in result)
+    return changed
+
+
+def _active_bookings(spot_ids):
+    """Open bookings (active or admin marked) of the spots with their lot and its hourly price."""
+    from extensions import db
+    from models.booking import Booking, OPEN_BOOKING_STATUSES
+    from models.parking_lot import ParkingLot
+    from models.parking_spot import ParkingSpot
+
+    rows = []
+    for chunk in _chunks(spot_ids):
+        rows.extend(db.session.query(
+            Booking.id, Booking.user_id, Booking.parking_spot_id, Booking.parking_timestamp,
+            ParkingSpot.parking_lot_id, ParkingLot.price
+        ).join(ParkingSpot, Booking.parking_spot_id == ParkingSpot.id)
+         .join(ParkingLot, ParkingSpot.parking_lot_id == ParkingLot.id)
+         .filter(Booking.parking_spot_id.in_(chunk), Booking.booking_status.in_(OPEN_BOOKING_STATUSES)))
+    return rows
+
+
+def _complete_bookings(bookings, now):
+    """Charge and complete bookings in one pass; returns ``{spot_id: (booking_id, cost)}``.
+
+    Costs follow ``Booking.calculate_total_cost``; user stats and lot rollups
+    get one update per user, lot and day instead of one per booking. Like
+    ``Booking.end_booking`` only bookings this call moved from open to
+    completed are charged and counted, so one ended concurrently is skipped.
+    """
+    from extensions import db
+    from models.booking import Booking, OPEN_BOOKING_STATUSES
+    from models.user_stats import record_booking_stats
+    from models.lot_hourly_stats import record_booking_ended
+    from services.metrics import count_on_commit
+
+    leaving = now.replace(tzinfo=None)
+    table = Booking.__table__
+    completed = set()
+    for chunk in _chunks([booking.id for booking in bookings]):
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id.in_(chunk), table.c.booking_status.in_(OPEN_BOOKING_STATUSES))
+            .values(leaving_timestamp=leaving, booking_status='completed')
+            .returning(table.c.id)
+        )
+        completed.update(booking_id for booking_id, in result)
+
+    updates, charged, hourly_rows = [], {}, {}
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for booking in bookings:
+        if booking.id not in completed:
+            continue
+        parked = booking.parking_timestamp.replace(tzinfo=None) if booking.parking_timestamp else leaving
+        hours = max(0.0, (leaving - parked).total_seconds() / 3600)
+        price = booking.price if booking.price is not None else 2.50
+        cost = round(hours * price, 2)
+        updates.append({'b_id': booking.id, 'cost': cost})
+        charged[booking.parking_spot_id] = (booking.id, cost)
+        group = totals[(booking.user_id, booking.parking_lot_id, parked.date())]
+        group[0] += 1
+        group[1] += hours
+        group[2] += cost
+        record_booking_ended(booking.parking_lot_id, parked, leaving, cost, hourly_rows)
+    if updates:
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('b_id')).values(total_cost=db.bindparam('cost')),
+            updates
+        )
+    for (user_id, lot_id, day), (count, hours, cost) in totals.items():
+        record_booking_stats(user_id, lot_id, day, hours, cost, bookings=count)
+    if charged:
+        count_on_commit('parking_releases_total', len(charged))
+    return charged
+
+
+def _record_changes(rows_by_id, changed, delta):
+    """Log availability changes per lot and type and keep available_spots in step."""
+    from models.parking_lot import ParkingLot
+    from models.availability_event import record_availability_change
+
+    per_type = defaultdict(int)
+    for spot_id in changed:
+        row = rows_by_id[spot_id]
+        per_type[(row.parking_lot_id, row.spot_type or 'standard')] += delta
+    per_lot = defaultdict(int)
+    for (lot_id, spot_type), lot_delta in per_type.items():
+        record_availability_change(lot_id, spot_type, lot_delta)
+        per_lot[lot_id] += lot_delta
+    for lot_id, lot_delta in per_lot.items():
+        ParkingLot.adjust_available_spots(lot_id, lot_delta)
+
+
+def apply_spot_batch(action, rows, now=None):
+    """Apply ``action`` to the spot ``rows`` (from ``resolve_spots``) in the current transaction.
+
+    Returns one result per spot: ``{'spot_id', 'spot_number', 'lot_id',
+    'result', ...}`` where result is ``changed``, ``unchanged`` or
+    ``refused`` (with a ``reason``). Released spots carry the completed
+    ``booking_id`` and its ``total_cost``. The caller commits, then calls
+    ``sync_allocator``.
+    """
+    if action not in ACTIONS:
+        raise SpotBatchError(f"action must be one of {', '.join(ACTIONS)}")
+    now = now or datetime.now(timezone.utc)
+    rows_by_id = {row.id: row for row in rows}
+    results = {row.id: {'spot_id': row.id, 'spot_number': row.spot_number, 'lot_id': row.parking_lot_id}
+               for row in rows}
+
+    if action == 'release':
+        occupied = [row.id for row in rows if not row.is_available]
+        changed = _flip(occupied, True)
+        charged = _complete_bookings(_active_bookings(changed), now)
+        _record_changes(rows_by_id, changed, +1)
+        for spot_id, result in results.items():
+            if spot_id in changed:
+                result['result'] = 'changed'
+                if spot_id in charged:
+                    result['booking_id'], result['total_cost'] = charged[spot_id]
+            else:
+                result.update(result='unchanged', reason='already available')
+    elif action == 'maintenance':
+        free = [row.id for row in rows if row.is_available]
+        changed = _flip(free, False)
+        booked = {booking.parking_spot_id for booking in _active_bookings(set(results) - changed)}
+        _record_changes(rows_by_id, changed, -1)
+        for spot_id, result in results.items():
+            if spot_id in changed:
+                result['result'] = 'changed'
+            elif spot_id in booked:
+                result.update(result='refused', reason='spot is occupied')
+            else:
+                result.update(result='unchanged', reason='already unavailable')
+    else:
+        taken = [row.id for row in rows if not row.is_available]
+        changed = _flip(taken, True, unless_booked=True)
+        booked = {booking.parking_spot_id for booking in _active_bookings(set(taken) - changed)}
+        _record_changes(rows_by_id, changed, +1)
+        for spot_id, result in results.items():
+            if spot_id in changed:
+                result['result'] = 'changed'
+            elif spot_id in booked:
+                result.update(result='refused', reason='spot is occupied')
+            else:
+                result.update(result='unchanged', reason='already available')
+    return [results[row.id] for row in rows]
+
+
+def sync_allocator(action, rows, results):
+    """Update this worker's spot allocator after the batch committed."""
+    from extensions import spot_allocator
+
+    rows_by_id = {row.id: row for row in rows}
+    for result in results:
+        if result['result'] != 'changed':
+            continue
+        row = rows_by_id[result['spot_id']]
+        if action == 'maintenance':
+            spot_allocator.discard(row.parking_lot_id, row.id)
+        else:
+            spot_allocator.release(row)
@@ -0,0 +1,216 @@
+"""
+Per-request SQL profiling and N+1 detection (opt-in).
+
+With ``SQL_PROFILER`` enabled every statement a request runs is timed
+through SQLAlchemy's cursor events and grouped by fingerprint: the SQL text
+with its ``IN (?, ?, ...)`` lists collapsed, so the same query with other
+parameters counts as a repeat. A fingerprint repeated at least
+``SQL_PROFILER_N_PLUS_ONE`` times in one request is flagged as a likely
+N+1 loop (a query per row instead of one query for all rows).
+
+Each response gets a ``Server-Timing`` header with the request's database
+time and query count (browser dev tools show it), and per-endpoint totals
+are kept for ``/admin/api/perf``. The totals belong to this worker process
+and reset when it restarts.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+
+# Statements repeated this often in one request are flagged as N+1
+N_PLUS_ONE_THRESHOLD = 5
+# Flagged requests kept for the perf endpoint
+RECENT_FLAGGED = 50
+# Repeated fingerprints remembered per endpoint
+TOP_FINGERPRINTS = 5
+# Distinct statements whose fingerprint is cached
+FINGERPRINT_CACHE_SIZE = 2048
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'(VALUES\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """The statement with whitespace normalised and parameter lists collapsed."""
+    text = _WHITESPACE.sub(' ', statement).strip()
+    text = _IN_LIST.sub('IN (...)', text)
+    return _VALUES_LIST.sub(r'\1, ...', text)
+
+
+class RequestProfile:
+    __slots__ = ('started', 'queries', 'db_seconds', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+
+    def repeated(self, threshold):
+        """``[(fingerprint, count)]`` of statements run at least ``threshold`` times, most first."""
+        return [(text, count) for text, count in self.statements.most_common() if count >= threshold]
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'queries', 'max_queries', 'db_seconds', 'max_db_seconds',
+                 'total_seconds', 'flagged', 'repeated')
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_seconds = 0.0
+        self.max_db_seconds = 0.0
+        self.total_seconds = 0.0
+        self.flagged = 0
+        self.repeated = Counter()
+
+    def as_dict(self, endpoint):
+        requests = self.requests or 1
+        return {
+            'endpoint': endpoint,
+            'requests': self.requests,
+            'avg_queries': round(self.queries / requests, 1),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_seconds * 1000 / requests, 2),
+            'max_db_ms': round(self.max_db_seconds * 1000, 2),
+            'avg_ms': round(self.total_seconds * 1000 / requests, 2),
+            'n_plus_one_requests': self.flagged,
+            'repeated_statements': [
+                {'statement': text, 'max_per_request': count}
+                for text, count in self.repeated.most_common(TOP_FINGERPRINTS)
+            ],
+        }
+
+
+class SqlProfiler:
+    SORT_KEYS = ('avg_db_ms', 'max_db_ms', 'avg_queries', 'max_queries', 'avg_ms', 'n_plus_one_requests', 'requests')
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.threshold = N_PLUS_ONE_THRESHOLD
+        self.header = True
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._recent = deque(maxlen=RECENT_FLAGGED)
+        self._fingerprints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Hook into the app's requests and engine if ``SQL_PROFILER`` is set."""
+        app.extensions['sql_profiler'] = self
+        self.enabled = bool(app.config.get('SQL_PROFILER'))
+        if not self.enabled:
+            return
+        self.threshold = app.config.get('SQL_PROFILER_N_PLUS_ONE', self.threshold)
+        self.header = app.config.get('SQL_PROFILER_HEADER', self.header)
+
+        from sqlalchemy import event
+        from extensions import db
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._drop_request)
+
+    # -- collecting ----------------------------------------------------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'profile', None) is not None:
+            conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return
+        started = conn.info.get('profiler_started')
+        if not started:
+            return
+        profile.db_seconds += time.perf_counter() - started.pop()
+        profile.queries += 1
+        key = self._fingerprints.get(statement)
+        if key is None:
+            key = fingerprint(statement)
+            if len(self._fingerprints) < FINGERPRINT_CACHE_SIZE:
+                self._fingerprints[statement] = key
+        profile.statements[key] += 1
+
+    def _start_request(self):
+        self._local.profile = RequestProfile()
+
+    def _finish_request(self, response):
+        from flask import request
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return response
+        self._local.profile = None
+        elapsed = time.perf_counter() - profile.started
+        repeated = profile.repeated(self.threshold)
+        self._record(request.endpoint or '<unmatched>', request.path, profile, elapsed, repeated)
+        if self.header:
+            db_ms = profile.db_seconds * 1000
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={db_ms:.2f};desc="{profile.queries} queries", app;dur={elapsed * 1000 - db_ms:.2f}'
+            )
+        if repeated:
+            from flask import current_app
+            text, count = repeated[0]
+            current_app.logger.warning('Likely N+1 in %s: statement run %d times: %s', request.path, count, text[:200])
+        return response
+
+    def _drop_request(self, exc=None):
+        # A request that failed before after_request must not leak into the next one
+        self._local.profile = None
+
+    def _record(self, endpoint, path, profile, elapsed, repeated):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.queries += profile.queries
+            stats.max_queries = max(stats.max_queries, profile.queries)
+            stats.db_seconds += profile.db_seconds
+            stats.max_db_seconds = max(stats.max_db_seconds, profile.db_seconds)
+            stats.total_seconds += elapsed
+            if repeated:
+                stats.flagged += 1
+                for text, count in repeated:
+                    stats.repeated[text] = max(stats.repeated[text], count)
+                self._recent.append({
+                    'endpoint': endpoint,
+                    'path': path,
+                    'at': time.time(),
+                    'queries': profile.queries,
+                    'db_ms': round(profile.db_seconds * 1000, 2),
+                    'repeated_statements': [{'statement': text, 'count': count} for text, count in repeated[:TOP_FINGERPRINTS]],
+                })
+
+    # -- reporting -----------------------------------------------------
+
+    def report(self, sort='avg_db_ms', limit=20):
+        """Endpoints worst first by ``sort``, plus the most recent N+1 requests."""
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(self.SORT_KEYS)}")
+        with self._lock:
+            endpoints = [stats.as_dict(endpoint) for endpoint, stats in self._endpoints.items()]
+            recent = list(self._recent)
+        endpoints.sort(key=lambda row: row[sort], reverse=True)
+        return {
+            'enabled': self.enabled,
+            'n_plus_one_threshold': self.threshold,
+            'endpoints': endpoints[:limit],
+            'recent_n_plus_one': recent[::-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._recent.clear()
@@ -0,0 +1,114 @@
+"""
+SQLite connection profile.
+
+Every new SQLite connection gets the same pragmas, so all gunicorn workers
+share one journal mode and wait for each other instead of failing with
+``database is locked``. The ``production`` profile uses WAL (readers and the
+writer no longer block each other), ``synchronous=NORMAL`` (safe with WAL,
+no fsync per commit), a busy timeout, a larger page cache, memory-mapped
+reads and in-memory temp tables. ``SQLITE_PROFILE = 'default'`` keeps
+SQLite's own defaults; ``SQLITE_PRAGMAS`` overrides single settings.
+"""
+from sqlalchemy import event
+
+PROFILES = {
+    'production': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,         # ms a connection waits for a lock before giving up
+        'cache_size': -20000,         # negative: KiB, so 20 MB of page cache per connection
+        'mmap_size': 268435456,       # read up to 256 MB of the file through mmap
+        'temp_store': 'memory',
+    },
+    'default': {},
+}
+
+# Pragmas that only apply to file databases
+FILE_ONLY_PRAGMAS = ('journal_mode', 'mmap_size')
+# SQLite reports these pragmas as numbers
+PRAGMA_NAMES = {
+    'synchronous': {0: 'off', 1: 'normal', 2: 'full', 3: 'extra'},
+    'temp_store': {0: 'default', 1: 'file', 2: 'memory'},
+}
+
+
+def sqlite_pragmas(config):
+    """Pragmas of the configured profile, with ``SQLITE_PRAGMAS`` overrides applied."""
+    name = config.get('SQLITE_PROFILE', 'production')
+    if name not in PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE {name!r}; use one of {', '.join(PROFILES)}")
+    return {**PROFILES[name], **(config.get('SQLITE_PRAGMAS') or {})}
+
+
+def is_file_database(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def sqlite_engine_options(config):
+    """Engine options for a file database: a pool sized to the worker's threads.
+
+    Connections are kept open so each keeps its page cache and pragmas;
+    the pool matches the gunicorn thread count so a busy worker never waits
+    for a connection while SQLite itself could serve it.
+    """
+    pragmas = sqlite_pragmas(config)
+    options = {
+        'pool_size': config.get('SQLITE_POOL_SIZE', 16),
+        'max_overflow': config.get('SQLITE_POOL_OVERFLOW', 4),
+        'pool_timeout': config.get('SQLITE_POOL_TIMEOUT', 30),
+    }
+    if 'busy_timeout' in pragmas:
+        # The driver's own lock timeout (seconds) applies before the first pragma runs
+        options['connect_args'] = {'timeout': pragmas['busy_timeout'] / 1000}
+    return options
+
+
+def configure_sqlite(app):
+    """Set pool options for a SQLite file database; call before ``db.init_app``."""
+    from sqlalchemy.engine import make_url
+
+    if not is_file_database(make_url(app.config['SQLALCHEMY_DATABASE_URI'])):
+        return
+    options = sqlite_engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def install_pragmas(engine, pragmas):
+    """Apply ``pragmas`` to every new connection of ``engine`` (no-op for other databases)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    if not is_file_database(engine.url):
+        pragmas = {key: value for key, value in pragmas.items() if key not in FILE_ONLY_PRAGMAS}
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+
+def effective_settings(engine):
+    """The pragmas a pooled connection actually runs with, plus pool details."""
+    settings = {
+        'database': engine.url.render_as_string(hide_password=True),
+        'pool': {'class': type(engine.pool).__name__},
+    }
+    for attribute in ('size', 'checkedout'):
+        method = getattr(engine.pool, attribute, None)
+        if callable(method):
+            settings['pool'][attribute] = method()
+    if engine.dialect.name != 'sqlite':
+        return settings
+    with engine.connect() as connection:
+        settings['sqlite_version'] = connection.exec_driver_sql('SELECT sqlite_version()').scalar()
+        settings['pragmas'] = {}
+        for name in PROFILES['production']:
+            value = connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            settings['pragmas'][name] = PRAGMA_NAMES.get(name, {}).get(value, value)
+    return settings
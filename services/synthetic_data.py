@@ -0,0 +1,358 @@
+"""
+Deterministic synthetic data for load tests and benchmarks.
+
+``generate_dataset`` fills an empty database with parking lots of varying
+size around a city centre, their spots (with a share of disabled and
+electric spots), users with one or more vehicles, and a booking history
+over the last ``days`` days. Arrivals follow an hourly and weekly curve
+(``ARRIVAL_CURVES``) and stays a duration distribution (``DURATIONS``). Each
+booking is given a spot of its vehicle's type that is free at that moment,
+so spots are never double booked; stays that have not ended by ``end``
+are the active bookings and their spots are occupied.
+
+The same seed, sizes and ``end`` always produce the same rows. Rows are
+written with plain DB-API ``executemany`` calls in one transaction with the
+secondary indexes dropped during the load, and the derived tables (user
+stats, hourly lot rollups, free spot counts) are filled in the same pass,
+so a generated database is ready to use.
+"""
+import heapq
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+PRESETS = {
+    'small': {'lots': 20, 'spots': 2000, 'users': 2000, 'bookings': 20000},
+    'medium': {'lots': 100, 'spots': 10000, 'users': 20000, 'bookings': 200000},
+    'large': {'lots': 500, 'spots': 50000, 'users': 100000, 'bookings': 2000000},
+}
+
+# Relative arrivals per hour of the day (UTC) and per weekday (Monday first)
+ARRIVAL_CURVES = {
+    'commuter': {
+        'hours': (1, 1, 1, 1, 2, 6, 18, 30, 34, 20, 10, 9, 10, 9, 8, 9, 14, 20, 16, 10, 6, 4, 2, 1),
+        'weekdays': (10, 10, 10, 10, 9, 4, 3),
+    },
+    'retail': {
+        'hours': (0, 0, 0, 0, 0, 1, 2, 4, 8, 14, 20, 24, 26, 25, 24, 22, 20, 18, 16, 12, 8, 4, 1, 0),
+        'weekdays': (6, 6, 6, 7, 9, 12, 10),
+    },
+    'flat': {
+        'hours': (1,) * 24,
+        'weekdays': (1,) * 7,
+    },
+}
+# Stay length distributions, hours
+DURATIONS = ('lognormal', 'exponential', 'commuter')
+MIN_STAY_SECONDS = 5 * 60
+MAX_STAY_SECONDS = 24 * 3600
+
+# Rows per executemany call
+WRITE_BATCH = 50000
+# Lots a driver tries before giving up when they are full; the dataset then has fewer bookings
+LOT_ATTEMPTS = 3
+EPOCH = datetime(1970, 1, 1)
+
+AREAS = ('Downtown', 'Midtown', 'Harbour', 'Riverside', 'Old Town', 'University', 'Station', 'Market',
+         'Park Side', 'Hillcrest', 'Westgate', 'Eastfield', 'Northpoint', 'Southbank', 'Airport', 'Stadium')
+LOT_KINDS = ('Parking', 'Garage', 'Car Park', 'Parking Deck', 'Lot')
+STREETS = ('Main', 'High', 'Oak', 'Maple', 'Church', 'Mill', 'Station', 'Park', 'Bridge', 'King', 'Queen',
+           'Market', 'River', 'Elm', 'Cedar', 'Lake', 'Hill', 'Union', 'Water', 'Spring')
+STREET_SUFFIXES = ('Street', 'Road', 'Avenue', 'Lane', 'Boulevard')
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Priya', 'Arjun',
+               'Wei', 'Mei', 'Carlos', 'Sofia', 'Ahmed', 'Fatima', 'Yuki', 'Hiro', 'Olga', 'Ivan')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Patel', 'Sharma', 'Chen', 'Wang', 'Kim', 'Nguyen', 'Silva', 'Khan', 'Sato', 'Ivanov')
+CAR_MODELS = ('Toyota Corolla', 'Honda Civic', 'Ford Focus', 'Volkswagen Golf', 'Hyundai i30', 'Kia Ceed',
+              'Nissan Leaf', 'Tesla Model 3', 'BMW 3 Series', 'Mazda 3', 'Skoda Octavia', 'Renault Clio')
+ELECTRIC_MODELS = ('Nissan Leaf', 'Tesla Model 3', 'Hyundai Kona Electric', 'Volkswagen ID.3', 'Kia EV6')
+COLORS = ('Black', 'White', 'Silver', 'Grey', 'Blue', 'Red', 'Green')
+
+
+class DatasetError(ValueError):
+    """The generator can't run with these options or on this database."""
+
+
+_day_texts = {}
+
+
+def _timestamp(seconds):
+    """Naive UTC datetime text for whole epoch seconds, as SQLAlchemy stores DateTime in SQLite."""
+    day, seconds = divmod(seconds, 86400)
+    text = _day_texts.get(day)
+    if text is None:
+        text = _day_texts[day] = (EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
+    hour, seconds = divmod(seconds, 3600)
+    return f'{text} {hour:02d}:{seconds // 60:02d}:{seconds % 60:02d}.000000'
+
+
+def _split(total, parts, rnd):
+    """``total`` split into ``parts`` positive, unevenly sized shares."""
+    weights = [rnd.lognormvariate(0, 0.6) for _ in range(parts)]
+    scale = (total - parts) / sum(weights)
+    shares = [1 + int(weight * scale) for weight in weights]
+    for index in range(total - sum(shares)):
+        shares[index % parts] += 1
+    return shares
+
+
+def _plate(number):
+    """Unique registration for a vehicle number, e.g. ``AB-1234``."""
+    letters, digits = divmod(number, 10000)
+    text = ''
+    while True:
+        letters, letter = divmod(letters, 26)
+        text = chr(ord('A') + letter) + text
+        if not letters:
+            break
+    return f'{text.rjust(2, "A")}-{digits:04d}'
+
+
+def _stay_seconds(rnd, durations):
+    if durations == 'exponential':
+        hours = rnd.expovariate(1 / 2.0)
+    elif durations == 'commuter':
+        # A workday for some, short errands for the rest
+        hours = rnd.gauss(8.5, 1.0) if rnd.random() < 0.45 else rnd.lognormvariate(0.2, 0.7)
+    else:
+        hours = rnd.lognormvariate(0.6, 0.8)
+    return int(min(MAX_STAY_SECONDS, max(MIN_STAY_SECONDS, hours * 3600)))
+
+
+def _arrival_hours(rnd, start, hours, curve, count):
+    """``count`` sorted arrival times (epoch seconds) spread over ``hours`` hours from ``start``."""
+    profile = ARRIVAL_CURVES[curve]
+    first = EPOCH + timedelta(seconds=start)
+    cumulative, total = [], 0
+    for hour in range(hours):
+        moment = first + timedelta(hours=hour)
+        total += profile['hours'][moment.hour] * profile['weekdays'][moment.weekday()]
+        cumulative.append(total)
+    picked = rnd.choices(range(hours), cum_weights=cumulative, k=count)
+    return sorted(start + hour * 3600 + rnd.randrange(3600) for hour in picked)
+
+
+def _executemany(cursor, sql, rows):
+    """Run ``sql`` for every row in batches of ``WRITE_BATCH``; returns the rows written."""
+    batch, written = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == WRITE_BATCH:
+            cursor.executemany(sql, batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        written += len(batch)
+    return written
+
+
+def generate_dataset(lots, spots, users, bookings, days=90, seed=1, arrivals='commuter', durations='lognormal',
+                     end=None, disabled_share=0.04, electric_share=0.08, vehicles_per_user=1.2,
+                     center=(40.7128, -74.0060), radius_km=15.0, password='password123', progress=None):
+    """Write a synthetic dataset into the app's (empty) database and commit it.
+
+    ``end`` (naive UTC, default: the start of the current hour) is "now" for
+    the data: bookings run up to it and the ones still parked then are
+    active. Users are ``user1``..``userN`` with ``password``. ``progress``
+    is called with a message after each step. Returns row counts and timings.
+    """
+    from werkzeug.security import generate_password_hash
+    from extensions import db, availability_counters, lot_locator
+    from models.user import User
+    from models.parking_lot import ParkingLot
+    from models.parking_spot import ParkingSpot
+    from models.booking import Booking
+    from models.vehicle import Vehicle
+    from models.lot_hourly_stats import hour_start
+
+    if arrivals not in ARRIVAL_CURVES:
+        raise DatasetError(f"arrivals must be one of {', '.join(ARRIVAL_CURVES)}")
+    if durations not in DURATIONS:
+        raise DatasetError(f"durations must be one of {', '.join(DURATIONS)}")
+    if min(lots, users, days) < 1 or spots < lots or bookings < 0:
+        raise DatasetError('Need at least one lot, user and day, and a spot per lot')
+    if disabled_share + electric_share >= 1:
+        raise DatasetError('Disabled and electric spots must leave room for standard ones')
+    for model in (User, ParkingLot, Booking):
+        if db.session.query(model.id).first() is not None:
+            raise DatasetError(f'{model.__tablename__} already has rows; generate into an empty database')
+
+    say = progress or (lambda message: None)
+    rnd = random.Random(seed)
+    end = hour_start(end or datetime.utcnow())
+    end_seconds = int((end - EPOCH).total_seconds())
+    start_seconds = end_seconds - days * 86400
+    started = time.perf_counter()
+    counts = {}
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+
+    # Secondary indexes are rebuilt once after the load instead of updated per row
+    indexes = sorted(Booking.__table__.indexes | ParkingSpot.__table__.indexes | Vehicle.__table__.indexes,
+                     key=lambda index: index.name)
+    connection = db.session.connection()
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+
+    # -- lots and spots --
+    sizes = _split(spots, lots, rnd)
+    lot_rows, prices, free_at = [], {}, {}
+    spot_rows = []
+    spot_id = 0
+    latitude_km = 111.32
+    longitude_km = latitude_km * math.cos(math.radians(center[0]))
+    for lot_id, size in enumerate(sizes, start=1):
+        area = AREAS[(lot_id - 1) % len(AREAS)]
+        distance, angle = radius_km * math.sqrt(rnd.random()), rnd.uniform(0, 2 * math.pi)
+        prices[lot_id] = round(rnd.uniform(1.5, 6.0) * 4) / 4
+        num_cols = rnd.choice((10, 20, 25, 40))
+        lot_rows.append((
+            lot_id, f'{area} {rnd.choice(LOT_KINDS)} {lot_id}',
+            f'{rnd.randint(1, 999)} {rnd.choice(STREETS)} {rnd.choice(STREET_SUFFIXES)}, {area}',
+            str(10001 + AREAS.index(area)), size, _timestamp(start_seconds), prices[lot_id], size,
+            math.ceil(size / num_cols), num_cols,
+            round(center[0] + distance * math.sin(angle) / latitude_km, 6),
+            round(center[1] + distance * math.cos(angle) / longitude_km, 6)
+        ))
+        disabled = round(size * disabled_share)
+        electric = round(size * electric_share)
+        for number in range(1, size + 1):
+            spot_id += 1
+            spot_type = 'disabled' if number <= disabled else 'electric' if number <= disabled + electric else 'standard'
+            spot_rows.append((spot_id, f'L{lot_id}-S{number}', number, lot_id, spot_type))
+            # Min-heap of (free from, spot id) per lot and spot type
+            free_at.setdefault((lot_id, spot_type), []).append((0, spot_id))
+    cursor.executemany(
+        'INSERT INTO parking_lot (id, name, address, pin_code, available_spots, created_on, price, total_spots, '
+        'num_rows, num_cols, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', lot_rows)
+    created_on = _timestamp(start_seconds)
+    _executemany(cursor, 'INSERT INTO parking_spot (id, spot_id, spot_number, parking_lot_id, is_available, '
+                         f"spot_type, created_on) VALUES (?, ?, ?, ?, 1, ?, '{created_on}')", spot_rows)
+    counts['lots'], counts['spots'] = len(lot_rows), len(spot_rows)
+    say(f'{len(lot_rows)} lots with {len(spot_rows)} spots')
+
+    # -- users and vehicles --
+    password_hash = generate_password_hash(password)
+    vehicle_types = ('standard', 'electric', 'disabled')
+    type_weights = (1 - disabled_share - electric_share, electric_share, disabled_share)
+    user_rows, vehicle_rows = [], []
+    for user_id in range(1, users + 1):
+        first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+        registered = start_seconds - rnd.randrange(365 * 86400)
+        user_rows.append((user_id, f'user{user_id}', f'user{user_id}@example.com', password_hash, first, last,
+                          f'555{rnd.randrange(10 ** 7):07d}', _timestamp(registered)))
+        owned = int(vehicles_per_user) + (rnd.random() < vehicles_per_user % 1)
+        for _ in range(max(1, owned)):
+            vehicle_type = rnd.choices(vehicle_types, weights=type_weights)[0]
+            model = rnd.choice(ELECTRIC_MODELS if vehicle_type == 'electric' else CAR_MODELS)
+            vehicle_rows.append((len(vehicle_rows) + 1, user_id, model, _plate(len(vehicle_rows) + 1),
+                                 vehicle_type, rnd.choice(COLORS), _timestamp(registered)))
+    _executemany(cursor, 'INSERT INTO user (id, username, email, password_hash, first_name, last_name, phone, '
+                         'registered_on) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', user_rows)
+    _executemany(cursor, 'INSERT INTO vehicle (id, user_id, model, license_plate, vehicle_type, color, created_on) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', vehicle_rows)
+    counts['users'], counts['vehicles'] = len(user_rows), len(vehicle_rows)
+    del user_rows
+    say(f'{counts["users"]} users with {counts["vehicles"]} vehicles')
+
+    # -- bookings --
+    for heap in free_at.values():
+        heapq.heapify(heap)
+    lot_ids = list(range(1, lots + 1))
+    hours = days * 24
+    # Flat hourly rollups: index (lot_id - 1) * hours + hour
+    started_count = [0] * (lots * hours)
+    ended_count = [0] * (lots * hours)
+    revenue = [0.0] * (lots * hours)
+    occupied = [0.0] * (lots * hours)
+    parked_users, parked_spots = set(), []
+    # When each vehicle is back from its last stay, so a car is never in two places at once
+    busy_until = [0] * len(vehicle_rows)
+
+    def booking_rows():
+        made = 0
+        lot_choices = rnd.choices(lot_ids, weights=sizes, k=bookings * LOT_ATTEMPTS)
+        for number, arrival in enumerate(_arrival_hours(rnd, start_seconds, hours, arrivals, bookings)):
+            vehicle_id, user_id, _, plate, vehicle_type, _, _ = vehicle_rows[rnd.randrange(len(vehicle_rows))]
+            if busy_until[vehicle_id - 1] > arrival:
+                continue
+            for lot_id in lot_choices[number * LOT_ATTEMPTS:(number + 1) * LOT_ATTEMPTS]:
+                heap = free_at.get((lot_id, vehicle_type))
+                if heap and heap[0][0] <= arrival:
+                    break
+            else:
+                # Every lot tried is full for this vehicle type: the driver gives up
+                continue
+            leaving = arrival + _stay_seconds(rnd, durations)
+            active = leaving >= end_seconds
+            if active and user_id in parked_users:
+                continue
+            spot = heapq.heapreplace(heap, (leaving, heap[0][1]))[1]
+            made += 1
+            busy_until[vehicle_id - 1] = leaving
+            slot = (lot_id - 1) * hours + (arrival - start_seconds) // 3600
+            started_count[slot] += 1
+            if active:
+                parked_users.add(user_id)
+                parked_spots.append(spot)
+                parked = _timestamp(arrival)
+                yield made, user_id, spot, vehicle_id, plate, parked, None, None, 'active', parked
+                continue
+            cost = round((leaving - arrival) / 3600 * prices[lot_id], 2)
+            ended_count[(lot_id - 1) * hours + (leaving - start_seconds) // 3600] += 1
+            revenue[(lot_id - 1) * hours + (leaving - start_seconds) // 3600] += cost
+            moment = arrival
+            while moment < leaving:
+                next_hour = moment - (moment - start_seconds) % 3600 + 3600
+                occupied[(lot_id - 1) * hours + (moment - start_seconds) // 3600] += min(leaving, next_hour) - moment
+                moment = next_hour
+            parked = _timestamp(arrival)
+            yield made, user_id, spot, vehicle_id, plate, parked, _timestamp(leaving), cost, 'completed', parked
+
+    _executemany(cursor, 'INSERT INTO booking (id, user_id, parking_spot_id, vehicle_id, vehicle_reg, '
+                         'parking_timestamp, leaving_timestamp, total_cost, booking_status, created_on) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', booking_rows())
+    counts['bookings'] = cursor.execute('SELECT COUNT(*) FROM booking').fetchone()[0]
+    counts['active_bookings'] = len(parked_spots)
+    say(f'{counts["bookings"]} bookings, {counts["active_bookings"]} still parked')
+
+    # -- derived tables --
+    _executemany(cursor, 'UPDATE parking_spot SET is_available = 0 WHERE id = ?', ((spot,) for spot in parked_spots))
+    for index in indexes:
+        index.create(connection)
+    cursor.execute(
+        'UPDATE parking_lot SET available_spots = (SELECT COUNT(*) FROM parking_spot '
+        'WHERE parking_spot.parking_lot_id = parking_lot.id AND parking_spot.is_available = 1)')
+    counts['hourly_rollups'] = _executemany(cursor, 'INSERT INTO lot_hourly_stats (parking_lot_id, hour, bookings_started, bookings_ended, '
+                         'revenue, occupied_seconds) VALUES (?, ?, ?, ?, ?, ?)', (
+        (slot // hours + 1, _timestamp(start_seconds + slot % hours * 3600),
+         started_count[slot], ended_count[slot], revenue[slot], occupied[slot])
+        for slot in range(lots * hours)
+        if started_count[slot] or ended_count[slot] or occupied[slot]
+    ))
+    # Same figures as models.user_stats.rebuild_user_stats, grouped in SQL
+    updated_on = _timestamp(end_seconds)
+    counts['user_daily_stats'] = cursor.execute(
+        'INSERT INTO user_daily_stats (user_id, day, parking_lot_id, bookings, hours, cost) '
+        'SELECT booking.user_id, date(booking.parking_timestamp), parking_spot.parking_lot_id, COUNT(*), '
+        'SUM((julianday(booking.leaving_timestamp) - julianday(booking.parking_timestamp)) * 24), '
+        'SUM(COALESCE(booking.total_cost, 0)) '
+        'FROM booking JOIN parking_spot ON booking.parking_spot_id = parking_spot.id '
+        'WHERE booking.leaving_timestamp IS NOT NULL '
+        'GROUP BY booking.user_id, date(booking.parking_timestamp), parking_spot.parking_lot_id').rowcount
+    counts['user_stats'] = cursor.execute(
+        'INSERT INTO user_stats (user_id, completed_bookings, total_hours, total_spent, updated_on) '
+        f"SELECT user_id, SUM(bookings), SUM(hours), SUM(cost), '{updated_on}' FROM user_daily_stats GROUP BY user_id").rowcount
+    db.session.commit()
+    counts['rows_written'] = sum(counts.values()) - counts['active_bookings']
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    counts['rows_per_second'] = int(counts['rows_written'] / max(counts['seconds'], 1e-9))
+    say(f'Derived tables filled; {counts["rows_written"]} rows in {counts["seconds"]}s')
+
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    availability_counters.rebuild()
+    lot_locator.invalidate()
+    return counts
@@ -65,3 +65,45 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 });
+
+// Live lot availability: keep free spot counts current without reloading
+document.addEventListener('DOMContentLoaded', function() {
+    var selector = '[data-lot-available], [data-lot-type-available], [data-lot-option]';
+    if (!window.EventSource || !document.querySelector(selector)) return;
+
+    function updateLot(lot) {
+        document.querySelectorAll(`[data-lot-available="${lot.lot_id}"]`).forEach(function(el) {
+            el.textContent = lot.available;
+        });
+        Object.keys(lot.by_type).forEach(function(spotType) {
+            document.querySelectorAll(`[data-lot-type-available="${lot.lot_id}:${spotType}"]`).forEach(function(el) {
+                el.textContent = lot.by_type[spotType];
+            });
+        });
+        document.querySelectorAll(`[data-lot-option="${lot.lot_id}"]`).forEach(function(el) {
+            el.textContent = el.textContent.replace(/\(\d+ spots available\)/, `(${lot.available} spots available)`);
+        });
+    }
+
+    function updateLots(event) {
+        JSON.parse(event.data).forEach(updateLot);
+    }
+
+    var source;
+    function connect() {
+        source = new EventSource('/user/api/availability_stream');
+        source.addEventListener('snapshot', updateLots);
+        source.addEventListener('availability', updateLots);
+        source.addEventListener('error', function() {
+            // EventSource gives up on an error status (503 when the server is
+            // out of stream slots); the rendered counts stay, try again later
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, 30000);
+            }
+        });
+    }
+    connect();
+    window.addEventListener('beforeunload', function() {
+        source.close();
+    });
+});
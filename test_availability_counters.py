@@ -0,0 +1,105 @@
+"""
+Behaviour of the availability counters shared by all workers
+(services/availability_counters.py): applying committed changes,
+rebuilding from the database and growing past the initial capacity.
+"""
+import os
+
+from extensions import db, availability_counters
+from models.availability_event import record_availability_change
+from models.booking import Booking
+from models.parking_lot import ParkingLot
+from models.parking_spot import ParkingSpot
+from services.lot_import import insert_spots
+from services.lot_inventory import lot_inventory
+
+
+def _free(lot_id, spot_type='standard'):
+    return availability_counters.inventory([lot_id])[lot_id]['by_type'][spot_type]['available']
+
+
+def _free_spot(lot_id, spot_type='standard'):
+    return ParkingSpot.query.filter_by(parking_lot_id=lot_id, spot_type=spot_type, is_available=True).first()
+
+
+def test_committed_booking_is_applied(lot_id, user_id):
+    before = _free(lot_id)
+    spot = _free_spot(lot_id)
+    assert Booking.reserve(user_id, spot.id, lot_id) is not None
+    assert _free(lot_id) == before, 'changes are applied only once committed'
+    db.session.commit()
+    assert _free(lot_id) == before - 1
+
+
+def test_rolled_back_booking_is_not_applied(lot_id, user_id):
+    before = _free(lot_id)
+    spot = _free_spot(lot_id)
+    Booking.reserve(user_id, spot.id, lot_id)
+    db.session.rollback()
+    assert _free(lot_id) == before
+
+
+def test_free_counts_stay_within_the_lot(lot_id):
+    total = availability_counters.inventory([lot_id])[lot_id]['by_type']['standard']['total']
+    availability_counters.apply([(lot_id, 'standard', 1000, None)])
+    assert _free(lot_id) == total
+    availability_counters.apply([(lot_id, 'standard', -1000, None)])
+    assert _free(lot_id) == 0
+
+
+def test_rebuild_matches_the_database(lot_id):
+    # Changed behind the counters' back, as another tool would
+    db.session.execute(db.update(ParkingSpot).where(ParkingSpot.parking_lot_id == lot_id).values(is_available=False))
+    db.session.commit()
+    assert _free(lot_id) > 0
+    availability_counters.rebuild()
+    counts = availability_counters.inventory([lot_id])[lot_id]
+    assert counts['available'] == 0
+    assert counts['total'] == lot_inventory([lot_id])[lot_id]['total']
+
+
+def test_change_committed_before_a_rebuild_is_not_counted_twice(lot_id):
+    spot = _free_spot(lot_id)
+    before = _free(lot_id)
+    spot.is_available = False
+    record_availability_change(lot_id, 'standard', -1)
+    # Commit without the after_commit hook, as if the worker had not applied it yet
+    changes = db.session.info.pop('availability_changes')
+    db.session.commit()
+    availability_counters.rebuild()
+    assert _free(lot_id) == before - 1
+    availability_counters.apply([(lot, spot_type, delta, change.id) for lot, spot_type, delta, change in changes])
+    assert _free(lot_id) == before - 1
+
+
+def test_grows_past_its_initial_capacity(app, monkeypatch):
+    monkeypatch.setattr(availability_counters, 'capacity', 4)
+    availability_counters._close()
+    os.remove(availability_counters.path)
+    availability_counters.rebuild()
+    version = availability_counters.version()
+
+    lot_ids = []
+    for number in range(10):
+        lot = ParkingLot(f'Lot {number}', 'Somewhere', '10001', total_spots=3, available_spots=3)
+        db.session.add(lot)
+        db.session.flush()
+        insert_spots(lot.id, 3, {1: 'electric'})
+        lot_ids.append(lot.id)
+    db.session.commit()
+
+    inventory = availability_counters.inventory(lot_ids)
+    assert sorted(inventory) == lot_ids
+    assert all(counts['available'] == 3 for counts in inventory.values())
+    assert availability_counters.version() > version
+    assert availability_counters._capacity(availability_counters._map()) > 4
+    client = app.test_client()
+    client.post('/user/login', data={'email': 'user', 'password': 'user123'})
+    assert client.get('/user/search_parking').status_code == 200
+
+
+def test_version_keeps_growing_after_the_table_is_dropped(lot_id):
+    version = availability_counters.version()
+    availability_counters._invalidate(availability_counters._map())
+    assert _free(lot_id) > 0
+    assert availability_counters.version() > version
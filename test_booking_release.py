@@ -0,0 +1,130 @@
+"""
+Booking and release invariants: a booking is charged and added to the
+stats exactly once however it is released, released spots are free again,
+and the lot's available_spots column stays in step with its spots.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models.booking import Booking
+from models.lot_hourly_stats import LotHourlyStats
+from models.parking_lot import ParkingLot
+from models.parking_spot import ParkingSpot
+from models.user_stats import UserStats
+
+
+def _completed_bookings(user_id):
+    stats = db.session.get(UserStats, user_id)
+    return stats.completed_bookings if stats else 0
+
+
+def _ended_in_rollups():
+    return db.session.query(db.func.coalesce(db.func.sum(LotHourlyStats.bookings_ended), 0)).scalar()
+
+
+def _available_spots(lot_id):
+    return db.session.query(ParkingLot.available_spots).filter(ParkingLot.id == lot_id).scalar()
+
+
+def _book(user_id, lot_id, status='active'):
+    spot = ParkingSpot.query.filter_by(parking_lot_id=lot_id, spot_type='standard', is_available=True).first()
+    booking = Booking.reserve(user_id, spot.id, lot_id, booking_status=status)
+    booking.parking_timestamp = datetime.now(timezone.utc) - timedelta(hours=2)
+    db.session.commit()
+    return booking.id, spot.id
+
+
+def _admin_client(app):
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+
+def test_booking_takes_the_spot(user_id, lot_id):
+    before = _available_spots(lot_id)
+    _, spot_id = _book(user_id, lot_id)
+    assert db.session.get(ParkingSpot, spot_id).is_available is False
+    assert _available_spots(lot_id) == before - 1
+
+
+def test_a_taken_spot_cannot_be_booked_again(user_id, lot_id):
+    _, spot_id = _book(user_id, lot_id)
+    assert Booking.reserve(user_id, spot_id, lot_id) is None
+
+
+def test_release_charges_once_and_frees_the_spot(user_id, lot_id):
+    before = _available_spots(lot_id)
+    booking_id, spot_id = _book(user_id, lot_id)
+    booking = db.session.get(Booking, booking_id)
+    assert booking.end_booking()
+    db.session.commit()
+
+    booking = db.session.get(Booking, booking_id)
+    assert booking.booking_status == 'completed'
+    assert booking.total_cost == 5.0
+    assert db.session.get(ParkingSpot, spot_id).is_available is True
+    assert _available_spots(lot_id) == before
+    assert _completed_bookings(user_id) == 1
+    assert _ended_in_rollups() == 1
+
+
+def test_second_release_of_a_stale_booking_changes_nothing(user_id, lot_id):
+    booking_id, _ = _book(user_id, lot_id)
+    first = db.session.get(Booking, booking_id)
+    assert first.end_booking()
+    db.session.commit()
+    available = _available_spots(lot_id)
+
+    # Another request loaded the booking before the first release committed
+    stale = db.session.get(Booking, booking_id)
+    set_committed_value(stale, 'booking_status', 'active')
+    set_committed_value(stale, 'total_cost', None)
+    assert not stale.end_booking()
+    db.session.rollback()
+
+    assert _completed_bookings(user_id) == 1
+    assert _ended_in_rollups() == 1
+    assert _available_spots(lot_id) == available
+
+
+def test_user_release_route(app, user_id, lot_id):
+    booking_id, spot_id = _book(user_id, lot_id)
+    client = app.test_client()
+    client.post('/user/login', data={'email': 'user', 'password': 'user123'})
+    assert client.post('/user/release_parking').status_code == 302
+    assert db.session.get(Booking, booking_id).booking_status == 'completed'
+    assert db.session.get(ParkingSpot, spot_id).is_available is True
+    assert _completed_bookings(user_id) == 1
+
+
+def test_admin_release_closes_an_admin_marked_booking(app, user_id, lot_id):
+    booking_id, spot_id = _book(user_id, lot_id, status='admin_marked')
+    client = _admin_client(app)
+    assert client.post('/admin/release_spot', data={'spot_id': spot_id}).status_code == 302
+    booking = db.session.get(Booking, booking_id)
+    assert booking.booking_status == 'completed'
+    assert booking.leaving_timestamp is not None
+    assert db.session.get(ParkingSpot, spot_id).is_available is True
+
+
+def test_batch_release_counts_each_booking_once(app, user_id, lot_id):
+    released_id, _ = _book(user_id, lot_id)
+    _book(user_id, lot_id)
+    _book(user_id, lot_id, status='admin_marked')
+    assert db.session.get(Booking, released_id).end_booking()
+    db.session.commit()
+
+    response = _admin_client(app).post('/admin/api/spots/batch', json={'action': 'release', 'lot_id': lot_id})
+    assert response.status_code == 200
+    db.session.expire_all()
+    open_bookings = Booking.query.filter(Booking.booking_status.in_(('active', 'admin_marked'))).count()
+    assert open_bookings == 0
+    assert _ended_in_rollups() == 3
+    assert _available_spots(lot_id) == ParkingSpot.query.filter_by(parking_lot_id=lot_id, is_available=True).count()
+
+
+def test_batch_rejects_spot_ids_that_are_not_a_list(app):
+    response = _admin_client(app).post('/admin/api/spots/batch', json={'action': 'release', 'spot_ids': '78'})
+    assert response.status_code == 400